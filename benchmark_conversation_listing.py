@@ -0,0 +1,135 @@
+"""
+Benchmark for conversation listing with message counts.
+
+Seeds a throwaway SQLite database with one user owning many conversations
+(each with a few long assistant answers) and compares the old listing, which
+loaded every message to compute ``len(conversation.messages)``, against
+``Conversation.to_dict_list`` which counts with grouped SQL queries.
+
+Usage:
+    python benchmark_conversation_listing.py --conversations 10000 --messages 6
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from flask import Flask
+from sqlalchemy import event
+
+# Add project root to path so the src package can be imported
+sys.path.append(str(Path(__file__).parent))
+
+from src.extensions import db
+from src.models import User, Conversation, Message
+
+ANSWER = "Replace the filter cartridge and reset the pressure sensor. " * 40
+
+
+def seed(conversations, messages):
+    user = User(username="bench", password="x")
+    db.session.add(user)
+    db.session.flush()
+
+    start = datetime.utcnow() - timedelta(days=30)
+    conv_rows = [{
+        'user_id': user.id,
+        'title': f"Chat {i}",
+        'created_at': start + timedelta(seconds=i),
+        'updated_at': start + timedelta(seconds=i),
+        'is_archived': False,
+    } for i in range(conversations)]
+    db.session.execute(Conversation.__table__.insert(), conv_rows)
+
+    conv_ids = [row[0] for row in db.session.query(Conversation.id).all()]
+    batch = []
+    for conv_id in conv_ids:
+        for j in range(messages):
+            batch.append({
+                'conversation_id': conv_id,
+                'content': ANSWER if j % 2 else f"Question {j}",
+                'is_user': j % 2 == 0,
+                'language': 'en',
+                'created_at': start + timedelta(seconds=j),
+                'tokens': 0,
+            })
+        if len(batch) >= 50000:
+            db.session.execute(Message.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Message.__table__.insert(), batch)
+    db.session.commit()
+    return user.id
+
+
+def legacy_listing(user_id):
+    conversations = Conversation.query.filter_by(user_id=user_id, is_archived=False)\
+        .order_by(Conversation.updated_at.desc()).all()
+    return [{
+        'id': conv.id,
+        'title': conv.title,
+        'created_at': conv.created_at.isoformat(),
+        'updated_at': conv.updated_at.isoformat(),
+        'message_count': len(conv.messages)
+    } for conv in conversations]
+
+
+def grouped_listing(user_id):
+    conversations = Conversation.query.filter_by(user_id=user_id, is_archived=False)\
+        .order_by(Conversation.updated_at.desc()).all()
+    return Conversation.to_dict_list(conversations)
+
+
+def measure(label, fn, user_id):
+    queries = []
+
+    def count_query(*args):
+        queries.append(1)
+
+    # Start every run with an empty identity map so nothing is served from it
+    db.session.expunge_all()
+    event.listen(db.engine, "before_cursor_execute", count_query)
+    start = time.perf_counter()
+    result = fn(user_id)
+    elapsed = time.perf_counter() - start
+    event.remove(db.engine, "before_cursor_execute", count_query)
+
+    db.session.expunge_all()
+    tracemalloc.start()
+    fn(user_id)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"  {label:<8} {elapsed:8.2f}s  peak {peak / 1024 / 1024:8.1f} MB  {len(queries):6d} queries")
+    return elapsed, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark conversation listing')
+    parser.add_argument('--conversations', type=int, default=10000, help='Conversations to seed')
+    parser.add_argument('--messages', type=int, default=6, help='Messages per conversation')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(app)
+
+        with app.app_context():
+            db.create_all()
+            user_id = seed(args.conversations, args.messages)
+            print(f"{args.conversations} conversations x {args.messages} messages")
+
+            legacy, legacy_rows = measure("legacy", legacy_listing, user_id)
+            grouped, grouped_rows = measure("grouped", grouped_listing, user_id)
+            assert legacy_rows == grouped_rows
+            print(f"  speedup  {legacy / grouped:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Benchmark for the per-user conversation stats behind ``/api/stats``.
+
+Seeds a throwaway SQLite database (1M messages by default) and, for one user,
+compares the old five-query implementation with the single aggregate query
+(``Conversation.activity_rows``), a warm ``UserStatsCache`` hit, and the cost
+of folding a newly saved message into a cached entry.
+
+Usage:
+    python benchmark_conversation_stats.py --users 20 --conversations 500 --messages 100
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from flask import Flask
+from sqlalchemy import desc, event, func
+
+# Add project root to path so the src package can be imported
+sys.path.append(str(Path(__file__).parent))
+
+from src.extensions import db
+from src.models import User, Conversation, Message
+from src.user_stats import UserStatsCache
+
+ANSWER = "Replace the filter cartridge and reset the pressure sensor. " * 10
+
+
+def seed(users, conversations, messages):
+    start = datetime.utcnow() - timedelta(days=30)
+    db.session.execute(User.__table__.insert(), [
+        {'username': f"bench{u}", 'password': "x"} for u in range(users)
+    ])
+    user_ids = [row[0] for row in db.session.query(User.id).all()]
+    db.session.execute(Conversation.__table__.insert(), [{
+        'user_id': user_id,
+        'title': f"Chat {i}",
+        'created_at': start,
+        'updated_at': start,
+        'is_archived': i % 10 == 0,
+    } for user_id in user_ids for i in range(conversations)])
+
+    conv_ids = [row[0] for row in db.session.query(Conversation.id).all()]
+    batch = []
+    for conv_id in conv_ids:
+        for j in range(messages):
+            batch.append({
+                'conversation_id': conv_id,
+                'content': ANSWER if j % 2 else f"Question {j}",
+                'is_user': j % 2 == 0,
+                'language': 'en',
+                'created_at': start + timedelta(seconds=conv_id * messages + j),
+                'tokens': 0 if j % 2 == 0 else 120,
+            })
+        if len(batch) >= 50000:
+            db.session.execute(Message.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Message.__table__.insert(), batch)
+    db.session.commit()
+    return user_ids[len(user_ids) // 2]
+
+
+def legacy_stats(user_id):
+    total_conv = db.session.query(func.count(Conversation.id))\
+        .filter(Conversation.user_id == user_id).scalar()
+    active_conv = db.session.query(func.count(Conversation.id))\
+        .filter(Conversation.user_id == user_id, Conversation.is_archived == False).scalar()
+    total_msgs = db.session.query(func.count(Message.id))\
+        .join(Conversation).filter(Conversation.user_id == user_id).scalar()
+    tokens = db.session.query(func.coalesce(func.sum(Message.tokens), 0))\
+        .join(Conversation).filter(Conversation.user_id == user_id).scalar()
+    active_conversations = db.session.query(
+        Conversation.id,
+        Conversation.title,
+        func.count(Message.id).label('message_count'),
+        func.max(Message.created_at).label('last_activity')
+    ).join(Message).filter(
+        Conversation.user_id == user_id,
+        Conversation.is_archived == False
+    ).group_by(Conversation.id).order_by(desc('last_activity')).limit(5).all()
+    return {
+        'total_conversations': total_conv,
+        'active_conversations': active_conv,
+        'archived_conversations': total_conv - active_conv,
+        'total_messages': total_msgs,
+        'total_tokens': tokens,
+        'recent_activity': [{
+            'id': conv.id,
+            'title': conv.title,
+            'message_count': conv.message_count,
+            'last_activity': conv.last_activity.isoformat()
+        } for conv in active_conversations]
+    }
+
+
+def aggregate_stats(user_id):
+    cache = UserStatsCache(max_users=0)
+    return cache.store(user_id, Conversation.activity_rows(user_id), None)
+
+
+def timed(label, fn, repeat, query_counter):
+    query_counter[0] = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f"  {label:<28} {elapsed * 1000:9.3f} ms  {query_counter[0] / repeat:5.1f} queries")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /api/stats computation')
+    parser.add_argument('--users', type=int, default=20, help='Users to seed')
+    parser.add_argument('--conversations', type=int, default=500, help='Conversations per user')
+    parser.add_argument('--messages', type=int, default=100, help='Messages per conversation')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed calls per variant')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(app)
+
+        with app.app_context():
+            db.create_all()
+            total = args.users * args.conversations * args.messages
+            print(f"Seeding {total:,} messages...")
+            user_id = seed(args.users, args.conversations, args.messages)
+
+            query_counter = [0]
+            event.listen(db.engine, 'before_cursor_execute',
+                         lambda *a: query_counter.__setitem__(0, query_counter[0] + 1))
+
+            print(f"Stats for one user ({args.conversations * args.messages:,} messages):")
+            legacy = timed("legacy (5 queries)", lambda: legacy_stats(user_id), args.repeat, query_counter)
+            aggregate = timed("single aggregate query", lambda: aggregate_stats(user_id), args.repeat, query_counter)
+            assert legacy == aggregate, "aggregate stats differ from the legacy implementation"
+
+            cache = UserStatsCache()
+            cache.store(user_id, Conversation.activity_rows(user_id), cache.generation(user_id))
+            timed("cache hit", lambda: cache.get(user_id), args.repeat * 100, query_counter)
+
+            conv_id = aggregate['recent_activity'][0]['id']
+            next_id = db.session.query(func.max(Message.id)).scalar() + 1
+            started = time.perf_counter()
+            for i in range(1000):
+                cache.record_messages(user_id, conv_id, [{
+                    'id': next_id + i, 'tokens': 120, 'created_at': datetime.utcnow()
+                }])
+            per_update = (time.perf_counter() - started) / 1000
+            print(f"  {'incremental update':<28} {per_update * 1000:9.3f} ms  "
+                  f"  0.0 queries")
+            assert cache.get(user_id)['total_messages'] == aggregate['total_messages'] + 1000
+
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
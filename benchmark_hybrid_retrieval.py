@@ -0,0 +1,101 @@
+"""
+Exact-code recall and per-stage latency of the retrieval modes in hybrid_retrieval.
+
+Samples chunks from a saved index, pulls a code-like token out of each (a
+part number, error code or SKU: letters and digits, optionally joined by
+"-", "." or "/") and asks a question about it. A query hits when one of the
+k retrieved chunks contains the code verbatim. Each mode (vector, lexical,
+hybrid) answers the same queries; latencies are the per-stage timings the
+retriever records, so they include embedding the question.
+
+The index is opened like a read-only serving worker (see
+DocumentProcessor.load_serving_index), so build it first with
+`python src/cli.py --build-index`.
+
+Usage:
+    python benchmark_hybrid_retrieval.py --index-folder ./index/ --queries 500 --k 4
+"""
+import argparse
+import os
+import random
+import re
+import sqlite3
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path so the flat modules can be imported
+sys.path.append(str(Path(__file__).parent / "src"))
+
+import chunk_store
+from document_processor import DocumentProcessor
+from hybrid_retrieval import HybridRetriever, RETRIEVAL_MODES, STAGES, DEFAULT_CANDIDATES, DEFAULT_RRF_K
+
+# At least one letter and one digit, e.g. AB-1234, E42, 3HAC-0213/1
+CODE = re.compile(r"\b(?=[\w./-]*\d)(?=[\w./-]*[A-Za-z])[A-Za-z0-9]+(?:[-./][A-Za-z0-9]+)*\b")
+QUESTIONS = [
+    "What does the manual say about {}?",
+    "How do I fix {}?",
+    "Where is {} used?",
+]
+
+
+def sample_queries(folder, count, seed):
+    conn = sqlite3.connect(os.path.join(folder, chunk_store.CHUNK_DB_FILENAME))
+    rows = conn.execute("SELECT text FROM chunks").fetchall()
+    conn.close()
+    rng = random.Random(seed)
+    rng.shuffle(rows)
+    queries = []
+    for (text,) in rows:
+        codes = [code for code in CODE.findall(text) if len(code) >= 4]
+        if codes:
+            code = rng.choice(codes)
+            queries.append((rng.choice(QUESTIONS).format(code), code))
+        if len(queries) == count:
+            break
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare vector, lexical and hybrid retrieval on exact codes')
+    parser.add_argument('--index-folder', default='./index/', help='Saved index folder')
+    parser.add_argument('--config', default='config.json', help='Config with the embedding model')
+    parser.add_argument('--queries', type=int, default=500, help='Chunks to sample codes from')
+    parser.add_argument('--k', type=int, default=4, help='Chunks retrieved per question (the retriever default is 4)')
+    parser.add_argument('--candidates', type=int, default=DEFAULT_CANDIDATES, help='Per-stage depth before fusion')
+    parser.add_argument('--rrf-k', type=int, default=DEFAULT_RRF_K, help='Reciprocal-rank fusion constant')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    processor = DocumentProcessor(config_path=args.config, index_folder=args.index_folder)
+    if not processor.load_serving_index() or processor.vector_store is None:
+        sys.exit(f"No servable index in {args.index_folder}")
+    if processor.vector_store.lexical_index is None:
+        sys.exit(f"{args.index_folder} has no {chunk_store.CHUNK_DB_FILENAME} to search by keyword")
+
+    queries = sample_queries(args.index_folder, args.queries, args.seed)
+    print(f"{processor.vector_store.index.ntotal:,} chunks, {len(queries)} code queries, k={args.k}, "
+          f"candidates={args.candidates}, rrf_k={args.rrf_k}")
+    print(f"  {'mode':<8} {'hit@k':>6} " + " ".join(f"{stage + ' p50/p99 ms':>22}" for stage in STAGES))
+    for mode in RETRIEVAL_MODES:
+        retriever = HybridRetriever(vector_store=processor.vector_store, mode=mode, k=args.k,
+                                    candidates=args.candidates, rrf_k=args.rrf_k)
+        hits = 0
+        timings = {stage: [] for stage in STAGES}
+        for question, code in queries:
+            result = retriever.retrieve(question)
+            hits += any(code in document.page_content for document in result.documents)
+            for stage, ms in result.timings.items():
+                timings[stage].append(ms)
+        columns = [
+            f"{np.percentile(timings[stage], 50):10.2f}/{np.percentile(timings[stage], 99):<11.2f}"
+            if timings[stage] else f"{'-':>22}"
+            for stage in STAGES
+        ]
+        print(f"  {mode:<8} {hits / max(1, len(queries)):6.3f} " + " ".join(columns))
+
+
+if __name__ == "__main__":
+    main()
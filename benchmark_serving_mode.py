@@ -0,0 +1,141 @@
+"""
+Startup time and per-worker memory of the two serving modes.
+
+Starts several worker processes that each open the same index folder and
+runs a batch of searches, then reports each worker's startup time and its
+heap versus file-backed (shareable) memory from /proc/self/smaps_rollup.
+Modes:
+    memory     FAISS.load_local with the chunk texts in a pickled in-memory
+               docstore, as indexes were saved before chunks.sqlite
+    readwrite  FAISS.load_local with chunk texts read from chunks.sqlite
+    readonly   index mapped in place plus the memory-mapped chunk store
+
+Without --index-folder a synthetic index is built first (random vectors,
+1000-character chunks), so the numbers show the storage layout rather than
+embedding quality.
+
+Usage:
+    python benchmark_serving_mode.py --chunks 200000 --workers 4
+    python benchmark_serving_mode.py --index-folder ./index/
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path so the flat modules can be imported
+sys.path.append(str(Path(__file__).parent / "src"))
+
+import chunk_store
+import vector_index
+from langchain_community.embeddings import FakeEmbeddings
+
+
+def build_synthetic_index(folder, chunks, dim, chunk_chars):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((chunks, dim)).astype(np.float32)
+    words = [f"word{i}" for i in range(5000)]
+    texts = [" ".join(rng.choice(words, chunk_chars // 9))[:chunk_chars] for _ in range(chunks)]
+    metadatas = [{"source": f"doc{i // 100}.pdf", "page": i % 100, "offset": 0} for i in range(chunks)]
+    store = vector_index.RerankingFAISS.from_embeddings(
+        zip(texts, vectors.tolist()), FakeEmbeddings(size=dim), metadatas=metadatas
+    )
+    store.save_local(folder, index_name="memory")
+    vector_index.save_vectors(folder, vectors)
+    chunk_store.write_chunk_store(folder, (store.docstore.search(store.index_to_docstore_id[i]) for i in range(chunks)))
+
+    db = chunk_store.SqliteChunkStore(os.path.join(folder, chunk_store.CHUNK_DB_FILENAME))
+    db.add({id_: store.docstore.search(id_) for id_ in store.index_to_docstore_id.values()})
+    db.commit()
+    store.docstore = db
+    store.save_local(folder)
+
+
+def memory_mb():
+    """Heap (anonymous) memory is each worker's own; file-backed pages are shared page cache."""
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return fields["Anonymous"], fields["Rss"] - fields["Anonymous"]
+
+
+def worker(folder, mode, queries, ready, results):
+    started = time.perf_counter()
+    embeddings = FakeEmbeddings(size=queries.shape[1])
+    if mode == "readonly":
+        index = vector_index.read_index(folder, mmap=True)
+        docstore = chunk_store.MmapChunkStore(folder)
+        store = vector_index.RerankingFAISS(embeddings, index, docstore, chunk_store.RowIds(len(docstore)))
+    else:
+        store = vector_index.RerankingFAISS.load_local(
+            folder, embeddings, "memory" if mode == "memory" else "index", allow_dangerous_deserialization=True
+        )
+        if mode == "readwrite":
+            store.docstore = chunk_store.SqliteChunkStore(os.path.join(folder, chunk_store.CHUNK_DB_FILENAME))
+    startup = time.perf_counter() - started
+
+    for query in queries:
+        store.similarity_search_by_vector(query.tolist(), k=4)
+    ready.wait()
+    results.put((mode, startup) + memory_mb())
+    ready.wait()
+
+
+def run(folder, mode, workers, queries):
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(folder, mode, queries, ready, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare how workers load the saved index')
+    parser.add_argument('--index-folder', help='Saved index folder (default: build a synthetic one)')
+    parser.add_argument('--chunks', type=int, default=100_000, help='Synthetic corpus size')
+    parser.add_argument('--dim', type=int, default=384, help='Embedding dimension (all-MiniLM-L6-v2: 384)')
+    parser.add_argument('--chunk-chars', type=int, default=1000, help='Characters per synthetic chunk')
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes per mode')
+    parser.add_argument('--queries', type=int, default=200, help='Searches each worker runs before measuring')
+    args = parser.parse_args()
+
+    folder = args.index_folder
+    if folder is None:
+        folder = tempfile.mkdtemp(prefix="serving_mode_")
+        print(f"Building a synthetic index of {args.chunks:,} chunks in {folder}...")
+        build_synthetic_index(folder, args.chunks, args.dim, args.chunk_chars)
+    try:
+        dim = vector_index.read_index(folder, mmap=True).d
+        queries = np.random.default_rng(1).standard_normal((args.queries, dim)).astype(np.float32)
+        sizes = {name: os.path.getsize(os.path.join(folder, name)) / 1e6 for name in sorted(os.listdir(folder))}
+        print("  " + ", ".join(f"{name} {size:.1f} MB" for name, size in sizes.items()))
+        print(f"  {'mode':<10} {'startup s':>10} {'heap MB':>9} {'mapped MB':>10}   ({args.workers} workers)")
+        modes = ["readwrite", "readonly"]
+        if os.path.exists(os.path.join(folder, "memory.pkl")):
+            modes.insert(0, "memory")
+        for mode in modes:
+            rows = run(folder, mode, args.workers, queries)
+            for _, startup, heap, mapped in rows:
+                print(f"  {mode:<10} {startup:10.3f} {heap:9.1f} {mapped:10.1f}")
+            print(f"  {mode:<10} heap across workers {sum(row[2] for row in rows):.1f} MB")
+    finally:
+        if args.index_folder is None:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Write-contention benchmark for the SQLite database profiles.
+
+Simulates N concurrent chatters, each in its own thread the way Socket.IO
+handlers run under async_mode='threading'. Every chatter repeatedly saves a
+message and bumps its conversation's updated_at, as handle_send_message does,
+then reads its recent history. The default profile is compared with the
+production profile (WAL, synchronous=NORMAL, busy_timeout, mmap, pool sizing).
+
+Usage:
+    python benchmark_sqlite_contention.py --chatters 32 --messages 100
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+
+# Add project root to path so the src package can be imported
+sys.path.append(str(Path(__file__).parent))
+
+from src.extensions import db
+from src.models import User, Conversation, Message
+from src.database import configure_sqlite
+from src.config import Config, ProductionConfig
+
+ANSWER = "Check the pump pressure and replace the worn seal. " * 20
+
+
+def make_app(db_path, profile):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLITE_PRAGMAS'] = profile.SQLITE_PRAGMAS
+    if hasattr(profile, 'SQLALCHEMY_ENGINE_OPTIONS'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = profile.SQLALCHEMY_ENGINE_OPTIONS
+    db.init_app(app)
+    with app.app_context():
+        configure_sqlite(db.engine, app.config['SQLITE_PRAGMAS'])
+        db.create_all()
+    return app
+
+
+def chatter(app, conversation_id, messages, latencies, errors, start_barrier):
+    with app.app_context():
+        start_barrier.wait()
+        for i in range(messages):
+            started = time.perf_counter()
+            try:
+                conversation = db.session.get(Conversation, conversation_id)
+                db.session.add(Message(
+                    conversation_id=conversation_id,
+                    content=ANSWER if i % 2 else f"Question {i}",
+                    is_user=i % 2 == 0
+                ))
+                conversation.updated_at = datetime.utcnow()
+                db.session.commit()
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                db.session.rollback()
+                errors.append(1)
+
+            Message.query.filter_by(conversation_id=conversation_id)\
+                .order_by(Message.created_at.desc()).limit(20).all()
+        db.session.remove()
+
+
+def run_profile(name, profile, chatters, messages):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'), profile)
+        with app.app_context():
+            user = User(username="bench", password="x")
+            db.session.add(user)
+            db.session.flush()
+            conversations = [Conversation(user_id=user.id, title=f"Chat {i}") for i in range(chatters)]
+            db.session.add_all(conversations)
+            db.session.commit()
+            conversation_ids = [conv.id for conv in conversations]
+
+        latencies, errors = [], []
+        barrier = threading.Barrier(chatters + 1)
+        threads = [
+            threading.Thread(target=chatter, args=(app, conv_id, messages, latencies, errors, barrier))
+            for conv_id in conversation_ids
+        ]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        with app.app_context():
+            db.engine.dispose()
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+
+    print(f"  {name:<11} {len(latencies) / elapsed:8.1f} writes/s  "
+          f"p50 {percentile(0.50):7.1f} ms  p99 {percentile(0.99):8.1f} ms  "
+          f"{len(errors):5d} 'database is locked' errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SQLite write contention')
+    parser.add_argument('--chatters', type=int, default=32, help='Concurrent chatter threads')
+    parser.add_argument('--messages', type=int, default=100, help='Messages written per chatter')
+    args = parser.parse_args()
+
+    print(f"{args.chatters} chatters x {args.messages} messages")
+    run_profile("default", Config, args.chatters, args.messages)
+    run_profile("production", ProductionConfig, args.chatters, args.messages)
+
+
+if __name__ == "__main__":
+    main()
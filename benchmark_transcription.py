@@ -0,0 +1,62 @@
+"""
+Real-time factor benchmark for Whisper transcription on CPU.
+
+For each model size, reports the model load time, the in-memory decode
+time and the real-time factor (RTF = transcription time / audio duration;
+below 1.0 is faster than real time). Audio is decoded with
+voice_input.decode_audio exactly as /api/voice does, without temp files.
+
+Usage:
+    python benchmark_transcription.py --audio sample.wav --models tiny base
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add src to path so the flat modules can be imported
+sys.path.append(str(Path(__file__).parent / "src"))
+
+import torch
+from voice_input import SAMPLE_RATE, VoiceProcessor, decode_audio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Whisper real-time factor on CPU')
+    parser.add_argument('--audio', required=True, help='Speech recording to transcribe (any ffmpeg format)')
+    parser.add_argument('--models', nargs='+', default=['tiny', 'base'], help='Whisper model sizes')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed transcriptions per model')
+    parser.add_argument('--threads', type=int, default=None, help='torch intra-op threads (default: all cores)')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    data = Path(args.audio).read_bytes()
+
+    started = time.perf_counter()
+    audio = decode_audio(data)
+    decode_seconds = time.perf_counter() - started
+    duration = len(audio) / SAMPLE_RATE
+    print(f"{os.path.basename(args.audio)}: {duration:.1f}s of audio, decoded in memory in "
+          f"{decode_seconds * 1000:.0f} ms, {torch.get_num_threads()} CPU threads")
+
+    for model_size in args.models:
+        processor = VoiceProcessor(model_size=model_size)
+        processor.load_model()
+        processor.model.to("cpu")
+        processor.transcribe_array(audio[:SAMPLE_RATE])  # warm-up
+
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            text = processor.transcribe_array(audio)
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        print(f"  {model_size:<6} load {processor.load_seconds:5.1f}s  "
+              f"transcribe {best:6.2f}s  RTF {best / duration:5.3f}  "
+              f"\"{text[:60]}{'...' if len(text) > 60 else ''}\"")
+
+
+if __name__ == "__main__":
+    main()
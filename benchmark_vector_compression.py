@@ -0,0 +1,113 @@
+"""
+Memory and recall report for the compressed vector storage modes in vector_index.
+
+Builds each index type / compression pair over the same vectors and reports
+the index size (what every worker holds in its heap), bytes per vector,
+recall@k against exact search straight from the compressed codes, and
+recall@k and latency after exact re-ranking against a memory-mapped
+vectors.npy (shared between workers through the page cache) at several
+re-rank factors.
+
+Usage:
+    python benchmark_vector_compression.py --from-index ./index/
+    python benchmark_vector_compression.py --vectors 100000 --queries 1000 --k 4
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+# Add src to path so the flat modules can be imported
+sys.path.append(str(Path(__file__).parent / "src"))
+
+import vector_index
+from benchmark_vector_index import synthetic_vectors
+
+MODES = [
+    ("flat", "none"), ("flat", "fp16"), ("flat", "sq8"), ("flat", "pq"),
+    ("hnsw", "none"), ("hnsw", "fp16"), ("hnsw", "sq8"), ("hnsw", "pq"),
+    ("ivf_flat", "none"), ("ivf_flat", "sq8"), ("ivf_pq", "pq"),
+]
+
+
+def measure(index, vectors, queries, truth, k, rerank_factor):
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        if rerank_factor:
+            _, found = vector_index.rerank_search(index, vectors, query, k, rerank_factor)
+        else:
+            found = index.search(query[None, :], k)[1][0]
+        latencies.append(time.perf_counter() - started)
+        hits += len(set(found) & set(expected))
+    latencies = np.array(latencies) * 1000
+    return hits / truth.size, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare compressed vector storage modes')
+    parser.add_argument('--vectors', type=int, default=100_000, help='Synthetic corpus size')
+    parser.add_argument('--dim', type=int, default=384, help='Embedding dimension (all-MiniLM-L6-v2: 384)')
+    parser.add_argument('--clusters', type=int, default=200, help='Topics in the synthetic corpus')
+    parser.add_argument('--from-index', help='Use vectors.npy from this index folder instead')
+    parser.add_argument('--queries', type=int, default=1000, help='Held-out query vectors')
+    parser.add_argument('--k', type=int, default=4, help='Neighbours per query (the retriever default is 4)')
+    parser.add_argument('--rerank-factors', type=int, nargs='+', default=[2, 4, 8],
+                        help='Candidates fetched per result before exact re-ranking')
+    parser.add_argument('--workers', type=int, default=4, help='Workers used for the per-box memory column')
+    args = parser.parse_args()
+
+    if args.from_index:
+        vectors = np.asarray(vector_index.load_vectors(args.from_index, mmap=False))
+        rng = np.random.default_rng(1)
+        queries = vectors[rng.choice(len(vectors), args.queries, replace=False)]
+        queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    else:
+        data = synthetic_vectors(args.vectors + args.queries, args.dim, args.clusters)
+        vectors, queries = data[:args.vectors], data[args.vectors:]
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+    # Re-ranking reads from a memory-mapped copy, exactly as a served index does
+    folder = tempfile.mkdtemp(prefix="vector_compression_")
+    vector_index.save_vectors(folder, vectors)
+    mapped = vector_index.load_vectors(folder)
+    vectors_mb = mapped.nbytes / 1e6
+    try:
+        report(vectors, mapped, vectors_mb, queries, args)
+    finally:
+        del mapped
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def report(vectors, mapped, vectors_mb, queries, args):
+
+    print(f"{len(vectors):,} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}; "
+          f"vectors.npy is {vectors_mb:.1f} MB, shared by all workers")
+    exact = vector_index.build_index(vectors, "flat")
+    _, truth = exact.search(queries, args.k)
+
+    print(f"  {'type':<9} {'compression':<11} {'build s':>8} {'MB':>8} {'B/vec':>6} {f'{args.workers} workers MB':>16} "
+          f"{'rerank':>7} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for index_type, compression in MODES:
+        started = time.perf_counter()
+        index = vector_index.build_index(vectors, index_type, {"compression": compression})
+        build_seconds = time.perf_counter() - started
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+        per_vector = size_mb * 1e6 / len(vectors)
+
+        factors = [0] + (args.rerank_factors if vector_index.is_lossy(index) else [])
+        for factor in factors:
+            recall, p50, p99 = measure(index, mapped, queries, truth, args.k, factor)
+            print(f"  {index_type:<9} {compression:<11} {build_seconds:8.1f} {size_mb:8.1f} {per_vector:6.0f} "
+                  f"{size_mb * args.workers:16.1f} {f'x{factor}' if factor else '-':>7} "
+                  f"{recall:9.3f} {p50:8.3f} {p99:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
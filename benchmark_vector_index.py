@@ -0,0 +1,97 @@
+"""
+Recall and latency benchmark for the vector index types in vector_index.
+
+Builds every index type over the same vectors and compares each against
+exact (flat) search: recall@k is the fraction of the true k nearest
+neighbours returned, latency is measured one query at a time as
+ask_question issues them. IVF types are swept over nprobe and HNSW over
+efSearch. Vectors are clustered synthetic unit vectors by default, or
+loaded from an index folder's vectors.npy.
+
+Usage:
+    python benchmark_vector_index.py --vectors 100000 --queries 1000 --k 4
+    python benchmark_vector_index.py --from-index ./index/
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+# Add src to path so the flat modules can be imported
+sys.path.append(str(Path(__file__).parent / "src"))
+
+import vector_index
+
+
+def synthetic_vectors(n, dim, clusters, seed=0):
+    """Unit vectors drawn around random topic centres, roughly like sentence embeddings."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def measure(index, queries, truth, k):
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        _, found = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - started)
+        hits += len(set(found[0]) & set(expected))
+    latencies = np.array(latencies) * 1000
+    return hits / truth.size, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark FAISS index types against exact search')
+    parser.add_argument('--vectors', type=int, default=100_000, help='Synthetic corpus size')
+    parser.add_argument('--dim', type=int, default=384, help='Embedding dimension (all-MiniLM-L6-v2: 384)')
+    parser.add_argument('--clusters', type=int, default=200, help='Topics in the synthetic corpus')
+    parser.add_argument('--from-index', help='Use vectors.npy from this index folder instead')
+    parser.add_argument('--queries', type=int, default=1000, help='Held-out query vectors')
+    parser.add_argument('--k', type=int, default=4, help='Neighbours per query (the retriever default is 4)')
+    parser.add_argument('--types', nargs='+', default=list(vector_index.INDEX_TYPES), help='Index types')
+    args = parser.parse_args()
+
+    if args.from_index:
+        vectors = np.asarray(vector_index.load_vectors(args.from_index, mmap=False))
+        rng = np.random.default_rng(1)
+        queries = vectors[rng.choice(len(vectors), args.queries, replace=False)]
+        queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+    else:
+        data = synthetic_vectors(args.vectors + args.queries, args.dim, args.clusters)
+        vectors, queries = data[:args.vectors], data[args.vectors:]
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+    print(f"{len(vectors):,} vectors x {vectors.shape[1]} dims, {len(queries)} queries, k={args.k}, "
+          f"auto selects '{vector_index.choose_index_type(len(vectors))}'")
+    exact = vector_index.build_index(vectors, "flat")
+    _, truth = exact.search(queries, args.k)
+
+    sweeps = {"ivf_flat": ("nprobe", [1, 4, 16, 64]),
+              "ivf_pq": ("nprobe", [1, 4, 16, 64]),
+              "hnsw": ("ef_search", [16, 32, 64, 128, 256])}
+    print(f"  {'type':<9} {'param':<14} {'build s':>8} {'MB':>8} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for index_type in args.types:
+        started = time.perf_counter()
+        index = vector_index.build_index(vectors, index_type)
+        build_seconds = time.perf_counter() - started
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+
+        name, values = sweeps.get(index_type, (None, [None]))
+        for value in values:
+            if name:
+                vector_index.configure_search(index, **{name: value})
+            recall, p50, p99 = measure(index, queries, truth, args.k)
+            label = f"{name}={value}" if name else "exact"
+            print(f"  {index_type:<9} {label:<14} {build_seconds:8.1f} {size_mb:8.1f} "
+                  f"{recall:9.3f} {p50:8.3f} {p99:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Build the precomputed follow-up suggestion sets (src/suggestion_sets.json).
+
+Suggestions are served from this file with no translation calls at request
+time. Run this after adding a language or a template to
+suggestions.SUGGESTION_TEMPLATES; only missing entries are translated unless
+--overwrite is given, so reviewed translations are kept.
+
+Usage:
+    python build_suggestions.py --languages es fr de it pt ru zh ja ko
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add src to path so the flat modules can be imported
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from suggestions import DEFAULT_SUGGESTION_SETS, SUGGESTION_TEMPLATES, build_suggestion_sets
+from translations import get_translation_service
+
+UI_LANGUAGES = ["es", "fr", "de", "it", "pt", "ru", "zh", "ja", "ko"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute translated suggestion sets')
+    parser.add_argument('--languages', nargs='+', default=UI_LANGUAGES, help='Target language codes')
+    parser.add_argument('--output', default=DEFAULT_SUGGESTION_SETS, help='Suggestion sets file')
+    parser.add_argument('--overwrite', action='store_true', help='Retranslate entries that already exist')
+    args = parser.parse_args()
+
+    output = Path(args.output)
+    sets = json.loads(output.read_text(encoding='utf-8')) if output.exists() else {}
+
+    todo = [
+        language for language in args.languages
+        if args.overwrite or set(SUGGESTION_TEMPLATES) - set(sets.get(language, {}))
+    ]
+    translated = build_suggestion_sets(get_translation_service(), todo)
+    for language, texts in translated.items():
+        existing = sets.setdefault(language, {})
+        for suggestion_id, text in texts.items():
+            if args.overwrite or suggestion_id not in existing:
+                existing[suggestion_id] = text
+        print(f"{language}: {len(texts)} suggestions")
+
+    output.write_text(json.dumps(sets, ensure_ascii=False, indent=4) + "\n", encoding='utf-8')
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
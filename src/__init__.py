@@ -51,6 +51,15 @@ def create_app(config_name=None):
     db.init_app(app)
     login_manager.init_app(app)
     
+    # Apply the profile's SQLite PRAGMAs (WAL, busy timeout, ...) to new connections
+    from .database import configure_sqlite
+    with app.app_context():
+        configure_sqlite(db.engine, app.config.get('SQLITE_PRAGMAS'))
+    
+    # Optional write-behind queue for chat messages
+    from .message_writer import init_message_writer
+    init_message_writer(app)
+    
     # Import routes after extensions are initialized to avoid circular imports
     from .routes import api_bp, root_bp
     
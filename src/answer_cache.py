@@ -0,0 +1,114 @@
+# answer_cache.py
+
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_ENTRIES = 256
+
+
+class SemanticAnswerCache:
+    """
+    Cache of generated answers keyed by question embedding and retrieved chunks.
+
+    A lookup hits when a cached question's embedding is within ``threshold``
+    cosine similarity of the new one *and* retrieval returned exactly the same
+    chunk ids, so the LLM would have been given the same context. Entries
+    expire after ``ttl`` seconds and the least recently used entry is evicted
+    once ``max_entries`` is reached.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                 ttl: float = DEFAULT_TTL_SECONDS, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max(0, int(max_entries))
+        self.hits = 0
+        self.misses = 0
+        self.index_signature = None
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._keys = itertools.count()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def _expire(self, now: float) -> None:
+        expired = [key for key, entry in self._entries.items() if now - entry['created_at'] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+
+    def check_index(self, signature: Any) -> None:
+        """Drop every entry if the document index has changed since the last call."""
+        with self._lock:
+            if signature != self.index_signature:
+                self._entries.clear()
+                self.index_signature = signature
+
+    def lookup(self, vector: Sequence[float], chunk_ids: Sequence[str]) -> Optional[str]:
+        """
+        Return a cached answer for a near-duplicate question, if any.
+
+        Args:
+            vector: Embedding of the question as sent to retrieval
+            chunk_ids: Ids of the chunks retrieved for it, in rank order
+
+        Returns:
+            str: The cached answer, or None on a miss
+        """
+        chunk_ids = tuple(chunk_ids)
+        query = self._unit(vector)
+        with self._lock:
+            self._expire(time.monotonic())
+            best_key, best_score = None, self.threshold
+            for key, entry in self._entries.items():
+                if entry['chunk_ids'] != chunk_ids:
+                    continue
+                score = float(np.dot(entry['vector'], query))
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key]['answer']
+
+    def store(self, vector: Sequence[float], chunk_ids: Sequence[str], answer: str) -> None:
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[next(self._keys)] = {
+                'vector': self._unit(vector),
+                'chunk_ids': tuple(chunk_ids),
+                'answer': answer,
+                'created_at': time.monotonic(),
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -16,6 +16,8 @@ from reportlab.lib.units import inch
 from io import BytesIO
 from models import db, User, Conversation, Message
 from conversation_manager import ConversationManager
+import search_index
+from pagination import paginate, encode_cursor, decode_cursor, InvalidCursor
 from werkzeug.security import generate_password_hash, check_password_hash
 from typing import Dict, Any, Optional, List, Tuple
 
@@ -128,31 +130,26 @@ def get_conversations() -> Tuple[Dict[str, Any], int]:
         # Get query parameters
         archived = request.args.get('archived', 'false').lower() == 'true'
         limit = min(int(request.args.get('limit', '50')), 100)  # Max 100 conversations per page
-        offset = max(int(request.args.get('offset', '0')), 0)
+        cursor = request.args.get('cursor')
         
         # Get conversations from manager
-        conversations = conversation_manager.get_user_conversations(
+        conversations, next_cursor = conversation_manager.get_user_conversations(
             user_id=current_user.id,
             archived=archived,
             limit=limit,
-            offset=offset
+            cursor=cursor
         )
         
-        # Get total count for pagination
-        total = Conversation.query.filter_by(
-            user_id=current_user.id, 
-            is_archived=archived
-        ).count()
-        
         return jsonify({
             'data': conversations,
             'meta': {
-                'total': total,
                 'limit': limit,
-                'offset': offset,
-                'has_more': (offset + len(conversations)) < total
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
             }
         })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e), 'code': 'INVALID_CURSOR'}), 400
     except Exception as e:
         current_app.logger.error(f"Error getting conversations: {str(e)}")
         return jsonify({'error': 'Failed to retrieve conversations', 'code': 'RETRIEVAL_FAILED'}), 500
@@ -195,18 +192,15 @@ def get_conversation(conversation_id: int) -> Tuple[Dict[str, Any], int]:
         
         # Get messages with pagination
         limit = min(int(request.args.get('limit', '50')), 100)  # Max 100 messages per request
-        offset = max(int(request.args.get('offset', '0')), 0)
+        cursor = request.args.get('cursor')
         
-        messages = conversation_manager.get_conversation_messages(
+        messages, next_cursor = conversation_manager.get_conversation_messages(
             conversation_id=conversation_id,
             user_id=current_user.id,
             limit=limit,
-            offset=offset
+            cursor=cursor
         )
         
-        # Get total message count for pagination
-        total_messages = Message.query.filter_by(conversation_id=conversation_id).count()
-        
         return jsonify({
             'id': conversation['id'],
             'title': conversation['title'],
@@ -215,12 +209,14 @@ def get_conversation(conversation_id: int) -> Tuple[Dict[str, Any], int]:
             'is_archived': conversation.get('is_archived', False),
             'messages': messages,
             'meta': {
-                'total_messages': total_messages,
+                'total_messages': conversation['message_count'],
                 'limit': limit,
-                'offset': offset,
-                'has_more': (offset + len(messages)) < total_messages
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
             }
         })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e), 'code': 'INVALID_CURSOR'}), 400
     except Exception as e:
         current_app.logger.error(f"Error getting conversation: {str(e)}")
         return jsonify({'error': 'Failed to retrieve conversation', 'code': 'RETRIEVAL_FAILED'}), 500
@@ -487,29 +483,47 @@ def search_messages() -> Tuple[Dict[str, Any], int]:
     
     try:
         limit = min(int(request.args.get('limit', '20')), 50)  # Max 50 results
-        offset = max(int(request.args.get('offset', '0')), 0)
+        cursor = request.args.get('cursor')
         
-        # Search in message content
-        messages = Message.query.join(Conversation).filter(
-            Conversation.user_id == current_user.id,
-            Message.content.ilike(f'%{query}%')
-        ).order_by(Message.created_at.desc())\
-         .offset(offset).limit(limit).all()
+        # Ranked full-text search, falling back to a LIKE scan without FTS5.
+        # Cursors hold (rank, id) for ranked results and (created_at, id) otherwise.
+        after = decode_cursor(cursor, 2) if cursor else None
+        hits = search_index.search_messages(db.session, current_user.id, query, limit + 1, after)
+        if hits is not None:
+            next_cursor = None
+            if len(hits) > limit:
+                hits = hits[:limit]
+                last_id, _, last_rank = hits[-1]
+                next_cursor = encode_cursor([last_rank, last_id])
+            by_id = {msg.id: msg for msg in Message.query.filter(Message.id.in_([hit[0] for hit in hits])).all()}
+            ranked = [(by_id[msg_id], snippet, rank) for msg_id, snippet, rank in hits if msg_id in by_id]
+        else:
+            messages, next_cursor = paginate(
+                Message.query.join(Conversation).filter(
+                    Conversation.user_id == current_user.id,
+                    Message.content.ilike(f'%{query}%')
+                ),
+                (Message.created_at, Message.id), limit, cursor
+            )
+            ranked = [(msg, None, None) for msg in messages]
         
-        # Get total count for pagination
-        total = Message.query.join(Conversation).filter(
-            Conversation.user_id == current_user.id,
-            Message.content.ilike(f'%{query}%')
-        ).count()
+        # Totals are only computed for the first page and are capped for FTS
+        total, total_is_estimate = None, False
+        if not cursor:
+            counted = search_index.count_matches(db.session, current_user.id, query)
+            if counted is not None:
+                total, total_is_estimate = counted
         
         # Format results
         results = []
-        for msg in messages:
+        for msg, snippet, rank in ranked:
             results.append({
                 'id': msg.id,
                 'conversation_id': msg.conversation_id,
                 'conversation_title': msg.conversation.title,
                 'content': msg.content,
+                'snippet': snippet,
+                'rank': rank,
                 'is_user': msg.is_user,
                 'created_at': msg.created_at.isoformat(),
                 'language': msg.language
@@ -520,11 +534,14 @@ def search_messages() -> Tuple[Dict[str, Any], int]:
             'results': results,
             'meta': {
                 'total': total,
+                'total_is_estimate': total_is_estimate,
                 'limit': limit,
-                'offset': offset,
-                'has_more': (offset + len(results)) < total
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
             }
         })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e), 'code': 'INVALID_CURSOR'}), 400
     except Exception as e:
         current_app.logger.error(f"Search error: {str(e)}")
         return jsonify({'error': 'Search failed', 'code': 'SEARCH_FAILED'}), 500
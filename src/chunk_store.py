@@ -0,0 +1,350 @@
+# chunk_store.py
+
+import json
+import mmap
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+CHUNKS_FILENAME = "chunks.bin"
+OFFSETS_FILENAME = "chunks.offsets.npy"
+CHUNK_DB_FILENAME = "chunks.sqlite"
+FTS_TABLE = "chunks_fts"
+
+_CREATE_STATEMENTS = [
+    "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+]
+
+# External-content BM25 index over chunks.text, kept in sync by triggers
+_FTS_STATEMENTS = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text,
+        content='chunks',
+        content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON chunks BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.rowid, new.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON chunks BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.rowid, old.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF text ON chunks BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.rowid, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.rowid, new.text);
+    END""",
+]
+
+# Words too common in questions to be worth a lexical match on their own
+_STOPWORDS = frozenset("""
+    a about an and any are as at be been but by can could do does did for from had has have how i if in
+    into is it its me my no not of on or our should so than that the their them then there these they
+    this those to was we were what when where which who whom why will with would you your
+""".split())
+
+# A run of word characters, optionally joined by the punctuation used in part
+# numbers and error codes (AB-1234, E.42/7, X_200:3)
+_TERM = re.compile(r"\w+(?:[-./:_#]\w+)*")
+
+
+def write_chunk_store(folder: str, documents: Iterable[Document]) -> int:
+    """
+    Write chunk texts, in FAISS row order, to a blob file plus an offsets array.
+
+    Each chunk is one compact JSON record ``[id, text, metadata]``; row ``i``
+    spans ``offsets[i]:offsets[i + 1]`` of the blob. Both files are written
+    to temporary names and swapped in, so processes that already mapped the
+    old files keep reading a consistent copy.
+
+    Returns:
+        int: Number of chunks written
+    """
+    path = os.path.join(folder, CHUNKS_FILENAME)
+    offsets_path = os.path.join(folder, OFFSETS_FILENAME)
+    offsets = [0]
+    with open(path + ".tmp", 'wb') as f:
+        for document in documents:
+            record = [document.id, document.page_content, document.metadata]
+            size = f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            offsets.append(offsets[-1] + size)
+    np.save(offsets_path + ".tmp.npy", np.asarray(offsets, dtype=np.int64))
+    os.replace(path + ".tmp", path)
+    os.replace(offsets_path + ".tmp.npy", offsets_path)
+    return len(offsets) - 1
+
+
+def lexical_match_query(text: str) -> Optional[str]:
+    """
+    Turn free text into a safe FTS5 MATCH expression for chunk retrieval.
+
+    Every term is quoted, so FTS5 operators in user input are plain text. A
+    compound token such as ``AB-1234`` becomes a phrase, so its parts must
+    appear together, and terms are OR-ed: BM25 ranks the chunks matching the
+    most (and rarest) terms first. Stopwords and single letters are dropped.
+
+    Returns:
+        str: The MATCH expression, or None if the text has no searchable terms
+    """
+    terms = []
+    for token in _TERM.findall(text.lower()):
+        words = [word for word in re.split(r"[\W_]+", token) if word]
+        if not words or (len(words) == 1 and (words[0] in _STOPWORDS or len(words[0]) == 1)):
+            continue
+        term = '"' + " ".join(words) + '"'
+        if term not in terms:
+            terms.append(term)
+    return " OR ".join(terms) if terms else None
+
+
+def has_chunk_store(folder: str) -> bool:
+    return all(os.path.exists(os.path.join(folder, name)) for name in (CHUNKS_FILENAME, OFFSETS_FILENAME))
+
+
+def remove_chunk_store(folder: str) -> None:
+    for name in (CHUNKS_FILENAME, OFFSETS_FILENAME):
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class MmapChunkStore(Docstore):
+    """
+    Read-only LangChain docstore over a memory-mapped chunk file.
+
+    Docstore ids are FAISS row numbers (see RowIds), so a lookup is one
+    slice of the mapped blob and a JSON decode; no ``Document`` exists until
+    a search asks for it. The pages are shared between every process that
+    maps the same file.
+    """
+
+    def __init__(self, folder: str):
+        with open(os.path.join(folder, CHUNKS_FILENAME), 'rb') as f:
+            # mmap refuses empty files
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        self._offsets = np.load(os.path.join(folder, OFFSETS_FILENAME), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def search(self, search: Union[int, str]) -> Union[str, Document]:
+        row = int(search)
+        if not 0 <= row < len(self):
+            return f"ID {search} not found."
+        chunk_id, text, metadata = json.loads(self._blob[int(self._offsets[row]):int(self._offsets[row + 1])])
+        return Document(id=chunk_id, page_content=text, metadata=metadata)
+
+
+class RowIds(Mapping):
+    """``index_to_docstore_id`` for a MmapChunkStore: FAISS row ``i`` is docstore id ``i``."""
+
+    def __init__(self, size: int):
+        self._size = size
+
+    def __getitem__(self, row: int) -> int:
+        row = int(row)
+        if not 0 <= row < self._size:
+            raise KeyError(row)
+        return row
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self._size))
+
+    def __len__(self) -> int:
+        return self._size
+
+
+class SqliteChunkStore(Docstore, AddableMixin):
+    """
+    LangChain docstore that keeps chunk texts in SQLite instead of in memory.
+
+    The editable index uses it so FAISS only holds the row -> chunk id
+    mapping; a search reads just its hits, by primary key. Pickling keeps
+    only the path and read_only flag, so ``index.pkl`` carries no chunk text.
+
+    Changes stay in an open transaction until commit(), which also stamps
+    the database with a new generation. The caller records that generation
+    next to the saved index, so a database that was committed without its
+    index being saved (or the reverse) is detected on the next load.
+
+    The texts are also indexed for BM25 keyword search (see lexical_search)
+    when SQLite has FTS5. The database is in WAL mode, so ``read_only``
+    stores opened by serving workers keep reading the last commit while an
+    indexing run writes.
+    """
+
+    def __init__(self, path: str, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self.lexical = False
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"path": self.path, "read_only": self.read_only}
+
+    def __setstate__(self, state):
+        # Pickles from before read_only existed were always read-write
+        self.__init__(state["path"], state.get("read_only", False))
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened on first use, so unpickling never creates a database
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            if self.read_only:
+                conn.execute("PRAGMA query_only = ON")
+            else:
+                conn.execute("PRAGMA journal_mode = WAL")
+                for statement in _CREATE_STATEMENTS:
+                    conn.execute(statement)
+            self.lexical = self._ensure_lexical_index(conn)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _ensure_lexical_index(self, conn: sqlite3.Connection) -> bool:
+        """Create the FTS table and its triggers, indexing existing chunks once."""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+        ).fetchone() is not None
+        if self.read_only or exists:
+            return exists
+        if not conn.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')").fetchone()[0]:
+            return False
+        for statement in _FTS_STATEMENTS:
+            conn.execute(statement)
+        conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        return True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        rows = [
+            (id_, document.page_content, json.dumps(document.metadata, ensure_ascii=False, separators=(",", ":")))
+            for id_, document in texts.items()
+        ]
+        with self._lock:
+            try:
+                self._connection().executemany("INSERT INTO chunks (id, text, metadata) VALUES (?, ?, ?)", rows)
+            except sqlite3.IntegrityError as e:
+                raise ValueError(f"Tried to add ids that already exist: {e}") from e
+
+    def delete(self, ids: List) -> None:
+        with self._lock:
+            self._connection().executemany("DELETE FROM chunks WHERE id = ?", ((id_,) for id_ in ids))
+
+    def search(self, search: str) -> Union[str, Document]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT text, metadata FROM chunks WHERE id = ?", (search,)
+            ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def documents_by_row(self, row_ids: Mapping, batch_size: int = 1024) -> Iterator[Document]:
+        """
+        Yield the chunks of ``row_ids`` (FAISS row -> chunk id) in row order.
+
+        The mapping is loaded into a temporary table and joined to the chunks
+        with a single ordered SELECT, which is read ``batch_size`` rows at a
+        time instead of looking every chunk up by id.
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS chunk_rows (row INTEGER PRIMARY KEY, id TEXT NOT NULL)")
+            conn.execute("DELETE FROM temp.chunk_rows")
+            conn.executemany("INSERT INTO temp.chunk_rows (row, id) VALUES (?, ?)", row_ids.items())
+            cursor = conn.execute("""
+                SELECT r.row, r.id, c.text, c.metadata
+                FROM temp.chunk_rows r
+                LEFT JOIN chunks c ON c.id = r.id
+                ORDER BY r.row
+            """)
+        try:
+            while True:
+                with self._lock:
+                    rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row, id_, text, metadata in rows:
+                    if text is None:
+                        raise ValueError(f"Chunk {id_} of row {row} is missing from the chunk database")
+                    yield Document(id=id_, page_content=text, metadata=json.loads(metadata))
+        finally:
+            with self._lock:
+                cursor.close()
+                conn.execute("DROP TABLE IF EXISTS temp.chunk_rows")
+
+    def lexical_search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """
+        Rank chunks against ``query`` with BM25.
+
+        Returns:
+            list: Up to ``k`` ``(document, score)`` pairs, best first (higher
+            scores are better); empty if the query has no searchable terms
+            or full-text search is unavailable
+        """
+        match = lexical_match_query(query)
+        with self._lock:
+            conn = self._connection()
+            if match is None or not self.lexical:
+                return []
+            rows = conn.execute(f"""
+                SELECT c.id, c.text, c.metadata, bm25({FTS_TABLE}) AS rank
+                FROM {FTS_TABLE}
+                JOIN chunks c ON c.rowid = {FTS_TABLE}.rowid
+                WHERE {FTS_TABLE} MATCH ?
+                ORDER BY rank
+                LIMIT ?
+            """, (match, k)).fetchall()
+        # bm25() is lower-is-better; flip it so scores read like similarities
+        return [
+            (Document(id=id_, page_content=text, metadata=json.loads(metadata)), -rank)
+            for id_, text, metadata, rank in rows
+        ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection().execute("DELETE FROM chunks")
+
+    @property
+    def generation(self) -> Optional[str]:
+        with self._lock:
+            row = self._connection().execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return row[0] if row else None
+
+    def commit(self) -> str:
+        """
+        Commit pending changes under a new generation.
+
+        Returns:
+            str: The generation to record with the saved index
+        """
+        generation = uuid.uuid4().hex
+        with self._lock:
+            conn = self._connection()
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)", (generation,))
+            conn.commit()
+        return generation
+
+    def rollback(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.rollback()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -14,6 +14,8 @@ def main():
     parser = argparse.ArgumentParser(description='PDF Chatbot CLI')
     parser.add_argument('--config', type=str, default='config.json', help='Path to config file')
     parser.add_argument('--docs_folder', type=str, help='Path to documents folder (overrides config)')
+    parser.add_argument('--build-index', action='store_true',
+                        help='Index the documents folder for read-only serving, then exit')
     args = parser.parse_args()
 
     # Load configuration
@@ -34,9 +36,15 @@ def main():
 
     # Process documents
     print(f"Processing documents from {docs_folder}...")
-    processor = DocumentProcessor(docs_folder)
+    processor = DocumentProcessor(docs_folder, config_path)
+    if args.build_index:
+        # Workers with serving_mode "readonly" map what this run saves
+        processor.serving_mode = "readwrite"
     processor.process_documents()
     vector_store = processor.get_vector_store()
+    if args.build_index:
+        print(f"Index saved to {processor.index_folder}.")
+        return
 
     if not vector_store:
         print("No document content was processed. Please add documents to the folder and try again.")
@@ -55,11 +63,12 @@ def main():
         if question.lower() in ['exit', 'quit', 'q']:
             break
         
-        answer = chatbot.ask_question(question)
+        documents = []
+        answer = chatbot.ask_question(question, documents=documents)
         print(f"\nChatbot: {answer}")
         
-        # Show suggestions
-        suggestions = chatbot.get_smart_suggestions(question, answer)
+        # Show suggestions, ranked against the chunks the answer used
+        suggestions = chatbot.get_smart_suggestions(question, answer, documents=documents)
         print("\nSuggested follow-up questions:")
         for i, suggestion in enumerate(suggestions, 1):
             print(f"{i}. {suggestion}")
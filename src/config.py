@@ -28,6 +28,25 @@ class Config:
     print(f"🔗 Database URI: {SQLALCHEMY_DATABASE_URI}")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # PRAGMAs run on every new SQLite connection (see database.configure_sqlite)
+    SQLITE_PRAGMAS = {}
+    
+    # Write-behind message persistence (see message_writer)
+    MESSAGE_WRITE_BEHIND = os.environ.get('MESSAGE_WRITE_BEHIND', '0') == '1'
+    MESSAGE_WRITER_FLUSH_MS = int(os.environ.get('MESSAGE_WRITER_FLUSH_MS', '5'))
+    MESSAGE_WRITER_MAX_BATCH = 256
+    
+    # Per-user /api/stats cache (see user_stats)
+    USER_STATS_CACHE_TTL = 300
+    USER_STATS_CACHE_SIZE = 1024
+    
+    # Voice input (see voice_input.setup_voice_routes)
+    WHISPER_MODEL = os.environ.get('WHISPER_MODEL', 'base')
+    WHISPER_PRELOAD = os.environ.get('WHISPER_PRELOAD', '0') == '1'
+    TRANSCRIPTION_WORKERS = int(os.environ.get('TRANSCRIPTION_WORKERS', '1'))
+    TRANSCRIPTION_QUEUE_SIZE = 8
+    TRANSCRIPTION_TIMEOUT = 120
+    
     # Upload settings
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', str(BASE_DIR / 'uploads'))
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
@@ -77,6 +96,27 @@ class ProductionConfig(Config):
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Strict'
+    
+    # SQLite tuned for concurrent chat writes under async_mode='threading'.
+    # WAL lets readers proceed while one writer commits, synchronous=NORMAL is
+    # durable across application crashes in WAL mode, and busy_timeout makes
+    # writers wait for the lock instead of failing with "database is locked".
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '10000')),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+        'temp_store': 'MEMORY',
+    }
+    
+    # Socket.IO handlers, ask background tasks and LLM pool workers are all
+    # threads, each holding a connection while it works
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', '16')),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', '16')),
+        'pool_timeout': 30,
+        'pool_pre_ping': True,
+    }
 
 
 # Configuration dictionary
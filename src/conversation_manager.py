@@ -1,7 +1,11 @@
 from datetime import datetime
 from typing import List, Dict, Any, Optional, Tuple
-from sqlalchemy import desc, func, or_
+from sqlalchemy import desc, or_
 from models import db, Conversation, Message, User
+import search_index
+from pagination import paginate
+from message_writer import save_message
+from user_stats import get_user_stats
 
 class ConversationManager:
     """
@@ -30,7 +34,7 @@ class ConversationManager:
         
         try:
             db.session.commit()
-            return conversation.to_dict()
+            return conversation.to_dict(message_count=0)
         except Exception as e:
             db.session.rollback()
             raise e
@@ -41,6 +45,9 @@ class ConversationManager:
         """
         Add a message to a conversation.
         
+        The message is written through message_writer, so it shares a
+        transaction with other messages when write-behind is enabled.
+        
         Args:
             conversation_id: The ID of the conversation
             content: The message content
@@ -55,45 +62,32 @@ class ConversationManager:
         if not conversation:
             return None
             
-        message = Message(
-            conversation_id=conversation_id,
-            content=content,
-            is_user=is_user,
-            language=language,
-            tokens=tokens
-        )
-        
-        # Update conversation's updated_at timestamp
-        conversation.updated_at = datetime.utcnow()
-        
-        db.session.add(message)
-        
-        try:
-            db.session.commit()
-            return message.to_dict()
-        except Exception as e:
-            db.session.rollback()
-            raise e
+        # Also updates the conversation's updated_at timestamp
+        return save_message(conversation_id, content, is_user, language, tokens)
     
     @staticmethod
     def get_user_conversations(user_id: int, archived: bool = False, 
-                             limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+                             limit: int = 50, cursor: str = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
         """
-        Get all conversations for a user, ordered by most recently updated.
+        Get a page of conversations for a user, ordered by most recently updated.
         
         Args:
             user_id: The ID of the user
             archived: Whether to include archived conversations (default: False)
             limit: Maximum number of conversations to return (default: 50)
-            offset: Number of conversations to skip (default: 0)
+            cursor: Cursor returned with the previous page (default: first page)
             
         Returns:
-            list: List of conversation dictionaries
+            tuple: (list of conversation dictionaries, cursor for the next page or None)
+            
+        Raises:
+            InvalidCursor: If the cursor is malformed
         """
         query = Conversation.query.filter_by(user_id=user_id, is_archived=archived)
-        conversations = query.order_by(desc(Conversation.updated_at))\
-                            .offset(offset).limit(limit).all()
-        return [conv.to_dict() for conv in conversations]
+        conversations, next_cursor = paginate(
+            query, (Conversation.updated_at, Conversation.id), limit, cursor
+        )
+        return Conversation.to_dict_list(conversations), next_cursor
     
     @staticmethod
     def get_conversation(conversation_id: int, user_id: int = None) -> Optional[Dict[str, Any]]:
@@ -118,18 +112,21 @@ class ConversationManager:
     
     @staticmethod
     def get_conversation_messages(conversation_id: int, user_id: int = None, 
-                                limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+                                limit: int = 100, cursor: str = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
         """
-        Get messages for a conversation with pagination.
+        Get a page of messages for a conversation in chronological order.
         
         Args:
             conversation_id: The ID of the conversation
             user_id: Optional user ID to verify ownership
             limit: Maximum number of messages to return (default: 100)
-            offset: Number of messages to skip (default: 0)
+            cursor: Cursor returned with the previous page (default: first page)
             
         Returns:
-            list: List of message dictionaries
+            tuple: (list of message dictionaries, cursor for the next page or None)
+            
+        Raises:
+            InvalidCursor: If the cursor is malformed
         """
         # Verify the conversation exists and user has access
         query = Message.query.filter_by(conversation_id=conversation_id)
@@ -137,9 +134,10 @@ class ConversationManager:
         if user_id is not None:
             query = query.join(Conversation).filter(Conversation.user_id == user_id)
             
-        messages = query.order_by(Message.created_at.asc())\
-                       .offset(offset).limit(limit).all()
-        return [msg.to_dict() for msg in messages]
+        messages, next_cursor = paginate(
+            query, (Message.created_at, Message.id), limit, cursor, descending=False
+        )
+        return [msg.to_dict() for msg in messages], next_cursor
     
     @staticmethod
     def update_conversation(conversation_id: int, user_id: int, 
@@ -214,6 +212,18 @@ class ConversationManager:
         """
         search = f"%{query}%"
         
+        # Message matches come from the full-text index when it is available
+        matching_ids = search_index.matching_conversation_ids(db.session, user_id, query)
+        if matching_ids is not None:
+            conversations = Conversation.query.filter(
+                Conversation.user_id == user_id,
+                or_(
+                    Conversation.title.ilike(search),
+                    Conversation.id.in_(matching_ids)
+                )
+            ).order_by(desc(Conversation.updated_at)).limit(limit).all()
+            return Conversation.to_dict_list(conversations)
+        
         # Find conversations with matching title or messages
         conversations = db.session.query(Conversation).join(Message).filter(
             Conversation.user_id == user_id,
@@ -223,61 +233,27 @@ class ConversationManager:
             )
         ).distinct().order_by(desc(Conversation.updated_at)).limit(limit).all()
         
-        return [conv.to_dict() for conv in conversations]
+        return Conversation.to_dict_list(conversations)
     
     @staticmethod
     def get_conversation_stats(user_id: int) -> Dict[str, Any]:
         """
         Get statistics about a user's conversations and messages.
         
+        Served from the per-user stats cache (see user_stats); a miss runs a
+        single aggregate query.
+        
         Args:
             user_id: The ID of the user
             
         Returns:
             dict: Various statistics about the user's conversations
         """
-        # Total conversations
-        total_conv = db.session.query(func.count(Conversation.id))\
-                             .filter(Conversation.user_id == user_id).scalar()
-        
-        # Active conversations (not archived)
-        active_conv = db.session.query(func.count(Conversation.id))\
-                              .filter(Conversation.user_id == user_id, 
-                                     Conversation.is_archived == False).scalar()
-        
-        # Total messages
-        total_msgs = db.session.query(func.count(Message.id))\
-                             .join(Conversation)\
-                             .filter(Conversation.user_id == user_id).scalar()
-        
-        # Tokens used (approximate)
-        tokens = db.session.query(func.coalesce(func.sum(Message.tokens), 0))\
-                         .join(Conversation)\
-                         .filter(Conversation.user_id == user_id).scalar()
-        
-        # Most active conversations
-        active_conversations = db.session.query(
-            Conversation.id,
-            Conversation.title,
-            func.count(Message.id).label('message_count'),
-            func.max(Message.created_at).label('last_activity')
-        ).join(Message).filter(
-            Conversation.user_id == user_id,
-            Conversation.is_archived == False
-        ).group_by(Conversation.id).order_by(
-            desc('last_activity')
-        ).limit(5).all()
+        cache = get_user_stats()
+        stats = cache.get(user_id)
+        if stats is not None:
+            return stats
         
-        return {
-            'total_conversations': total_conv,
-            'active_conversations': active_conv,
-            'archived_conversations': total_conv - active_conv,
-            'total_messages': total_msgs,
-            'total_tokens': tokens,
-            'recent_activity': [{
-                'id': conv.id,
-                'title': conv.title,
-                'message_count': conv.message_count,
-                'last_activity': conv.last_activity.isoformat()
-            } for conv in active_conversations]
-        }
+        generation = cache.generation(user_id)
+        rows = Conversation.activity_rows(user_id)
+        return cache.store(user_id, rows, generation)
@@ -2,6 +2,7 @@ import os
 import sqlite3
 from pathlib import Path
 from flask import current_app
+from sqlalchemy import event
 from . import db
 from .config import Config
 
@@ -35,6 +36,25 @@ def create_sqlite_db(db_path):
         print(f"❌ Error in create_sqlite_db: {str(e)}")
         return False
 
+def configure_sqlite(engine, pragmas):
+    """
+    Run ``pragmas`` (name -> value) on every new connection of a SQLite engine.
+    
+    Returns:
+        bool: True if a connect hook was installed
+    """
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return False
+    
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    
+    return True
+
 def init_database():
     """Initialize the database and create tables."""
     from .extensions import db
@@ -73,6 +93,18 @@ def init_database():
             db.create_all()
             print("✅ Database tables created successfully")
             
+            # create_all() skips indexes added to tables that already exist
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=db.engine, checkfirst=True)
+            
+            # Full-text index over message content (falls back to LIKE if unavailable)
+            from .search_index import ensure_message_index
+            if ensure_message_index(db.engine):
+                print("✅ Message search index ready")
+            else:
+                print("⚠️ FTS5 not available, message search will use LIKE")
+            
             # Verify tables were created
             from sqlalchemy import inspect
             inspector = inspect(db.engine)
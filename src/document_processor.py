@@ -1,98 +1,782 @@
 # document_processor.py
 
 import os
+import json
+import hashlib
+import uuid
+import time
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pypdf import PdfReader  # Using pypdf instead of PyMuPDF
 import docx
 import csv
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import SentenceTransformerEmbeddings
-from langchain_community.vectorstores import FAISS
+try:
+    from .embedding_registry import get_embeddings
+except ImportError:
+    from embedding_registry import get_embeddings
+try:
+    from . import vector_index
+    from . import chunk_store
+except ImportError:
+    import vector_index
+    import chunk_store
+
+MANIFEST_FILENAME = "manifest.json"
+CHUNK_TABLE_FILENAME = "chunk_metadata.json"
+MANIFEST_VERSION = 2
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt', '.csv')
+TXT_READ_SIZE = 64 * 1024
+# Segments are joined into blocks of this many chunks' worth of text before splitting.
+SPLIT_BLOCK_CHUNKS = 32
+# "readwrite" keeps the index in line with docs_folder; "readonly" only maps
+# the files an indexing run saved (see DocumentProcessor.load_serving_index)
+SERVING_MODES = ("readwrite", "readonly")
+
+def _locate_chunks(text_splitter, block, block_starts, doc_starts, pages):
+    """
+    Split ``block`` and map each chunk back to its page and document offset.
+    
+    Returns:
+        list: (chunk, page, document offset, position in block) tuples
+    """
+    overlap = getattr(text_splitter, "_chunk_overlap", 0)
+    located = []
+    previous = -1
+    cursor = 0
+    for chunk in text_splitter.split_text(block):
+        # The next chunk overlaps the previous one by at most ``overlap`` characters,
+        # so searching from there avoids matching repeated text too early.
+        position = block.find(chunk, cursor)
+        if position < 0:
+            position = block.find(chunk, previous + 1)
+        if position < 0:
+            position = max(cursor, 0)
+        part = bisect_right(block_starts, position) - 1
+        located.append((chunk, pages[part], doc_starts[part] + position - block_starts[part], position))
+        previous = position
+        cursor = position + max(1, len(chunk) - overlap)
+    return located
+
+def split_segments(text_splitter, segments, block_size):
+    """
+    Split a stream of ``(page, text)`` segments (pages, paragraphs, rows) into chunks.
+    
+    Segments are buffered until roughly ``block_size`` characters are pending,
+    so the full document is never held as one string and no text is built by
+    repeated concatenation. The text from the start of each block's last chunk
+    onwards is carried into the next block, so chunks at block edges are not
+    cut short where a block happens to end.
+    
+    Yields:
+        tuple: (chunk, page the chunk starts on, character offset of the chunk
+        in the extracted document text), in document order
+    """
+    parts = []
+    block_starts = []
+    doc_starts = []
+    pages = []
+    buffered = 0
+    stream_offset = 0
+    for page, segment in segments:
+        if not segment:
+            continue
+        parts.append(segment)
+        # Block text is contiguous, so a boundary is only needed where the page changes.
+        if not pages or page != pages[-1]:
+            block_starts.append(buffered)
+            doc_starts.append(stream_offset)
+            pages.append(page)
+        buffered += len(segment)
+        stream_offset += len(segment)
+        if buffered < block_size:
+            continue
+        
+        block = "".join(parts)
+        located = _locate_chunks(text_splitter, block, block_starts, doc_starts, pages)
+        if not located:
+            parts, block_starts, doc_starts, pages, buffered = [], [], [], [], 0
+            continue
+        for chunk, chunk_page, offset, _ in located[:-1]:
+            yield chunk, chunk_page, offset
+        
+        # Keep the raw text (separators included) and the segment boundaries
+        # from the last chunk onwards.
+        _, tail_page, tail_offset, tail_position = located[-1]
+        carried = [
+            (start - tail_position, doc_start, part_page)
+            for start, doc_start, part_page in zip(block_starts, doc_starts, pages)
+            if start > tail_position
+        ]
+        parts = [block[tail_position:]]
+        block_starts = [0] + [start for start, _, _ in carried]
+        doc_starts = [tail_offset] + [doc_start for _, doc_start, _ in carried]
+        pages = [tail_page] + [part_page for _, _, part_page in carried]
+        buffered = len(parts[0])
+    if parts:
+        for chunk, chunk_page, offset, _ in _locate_chunks(text_splitter, "".join(parts), block_starts, doc_starts, pages):
+            yield chunk, chunk_page, offset
+
+def _extract_and_split(file_path, chunk_size, chunk_overlap):
+    """
+    Extract and chunk a single file.
+    
+    Runs inside extraction worker processes, so it only takes picklable
+    arguments and builds its own text splitter.
+    
+    Returns:
+        tuple: (file_path, [(chunk, page, offset), ...], seconds spent)
+    """
+    start = time.perf_counter()
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+    )
+    segments = DocumentProcessor._extract_segments(file_path)
+    chunks = list(split_segments(text_splitter, segments, chunk_size * SPLIT_BLOCK_CHUNKS))
+    return file_path, chunks, time.perf_counter() - start
+
+class ChunkTable:
+    """
+    Compact provenance side table: vector store id -> (source, page, offset).
+    
+    Source paths are interned into a list so each row stores a small integer
+    instead of repeating the filename. Rows are grouped by source, which makes
+    per-file invalidation a dictionary lookup rather than a docstore scan.
+    """
+    
+    def __init__(self):
+        self.sources = []
+        self._source_index = {}
+        self.rows = {}
+        self._ids_by_source = {}
+    
+    def __len__(self):
+        return len(self.rows)
+    
+    def add(self, ids, source, pages, offsets):
+        source_index = self._source_index.get(source)
+        if source_index is None:
+            source_index = len(self.sources)
+            self.sources.append(source)
+            self._source_index[source] = source_index
+        for id_, page, offset in zip(ids, pages, offsets):
+            self.rows[id_] = (source_index, page, offset)
+        self._ids_by_source.setdefault(source, []).extend(ids)
+    
+    def get(self, id_):
+        """Return ``{'source', 'page', 'offset'}`` for a vector id, or None."""
+        row = self.rows.get(id_)
+        if row is None:
+            return None
+        source_index, page, offset = row
+        return {"source": self.sources[source_index], "page": page, "offset": offset}
+    
+    def ids_for_source(self, source):
+        return list(self._ids_by_source.get(source, ()))
+    
+    def remove_source(self, source):
+        """Drop every row for ``source`` and return the removed ids."""
+        ids = self._ids_by_source.pop(source, [])
+        for id_ in ids:
+            self.rows.pop(id_, None)
+        return ids
+    
+    def to_dict(self):
+        live = {source: i for i, source in enumerate(s for s in self.sources if s in self._ids_by_source)}
+        return {
+            "sources": list(live),
+            "rows": {
+                id_: [live[self.sources[source_index]], page, offset]
+                for id_, (source_index, page, offset) in self.rows.items()
+            },
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        table = cls()
+        table.sources = list(data.get("sources", []))
+        table._source_index = {source: i for i, source in enumerate(table.sources)}
+        for id_, (source_index, page, offset) in data.get("rows", {}).items():
+            table.rows[id_] = (source_index, page, offset)
+            table._ids_by_source.setdefault(table.sources[source_index], []).append(id_)
+        return table
+
+class EmbeddingStage:
+    """
+    Embed chunks in fixed-size batches and append them to a FAISS index.
+    
+    Chunks are buffered until ``batch_size`` of them are pending, then encoded
+    with a single ``embed_documents`` call and added with ``add_embeddings``.
+    Peak memory is bounded by one batch instead of the whole corpus, and the
+    caller can keep feeding chunks as extraction produces them. A new store
+    keeps chunk texts in ``docstore`` when one is given, or in memory.
+    """
+    
+    def __init__(self, embeddings, batch_size=256, vector_store=None, docstore=None):
+        self.embeddings = embeddings
+        self.batch_size = max(1, int(batch_size))
+        self.vector_store = vector_store
+        self.docstore = docstore
+        self.chunks_embedded = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self._texts = []
+        self._metadatas = []
+        self._ids = []
+    
+    def add(self, texts, metadatas=None, ids=None):
+        """
+        Queue chunks for embedding, flushing every full batch.
+        
+        Returns:
+            list: The vector store ids assigned to ``texts``
+        """
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        self._texts.extend(texts)
+        self._metadatas.extend(metadatas or ({} for _ in texts))
+        self._ids.extend(ids)
+        while len(self._texts) >= self.batch_size:
+            self._embed_batch(self.batch_size)
+        return ids
+    
+    def flush(self):
+        """Embed whatever is still buffered and return the vector store."""
+        if self._texts:
+            self._embed_batch(len(self._texts))
+        return self.vector_store
+    
+    def _embed_batch(self, size):
+        texts, self._texts = self._texts[:size], self._texts[size:]
+        metadatas, self._metadatas = self._metadatas[:size], self._metadatas[size:]
+        ids, self._ids = self._ids[:size], self._ids[size:]
+        
+        start = time.perf_counter()
+        vectors = self.embeddings.embed_documents(texts)
+        if self.vector_store is None and self.docstore is not None:
+            self.vector_store = vector_index.empty_store(self.embeddings, len(vectors[0]), self.docstore)
+        if self.vector_store is None:
+            self.vector_store = vector_index.RerankingFAISS.from_embeddings(
+                zip(texts, vectors), self.embeddings, metadatas=metadatas, ids=ids
+            )
+        else:
+            self.vector_store.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+        self.seconds += time.perf_counter() - start
+        self.chunks_embedded += len(texts)
+        self.batches += 1
 
 class DocumentProcessor:
-    def __init__(self, docs_folder="./docs/", config_path="config.json"):
+    def __init__(self, docs_folder="./docs/", config_path="config.json", index_folder=None):
+        self.config = self._load_config(config_path)
         self.docs_folder = docs_folder
+        self.index_folder = index_folder or self.config.get("index_folder", "./index/")
+        self.chunk_size = self.config.get("chunk_size", 1000)
+        self.chunk_overlap = self.config.get("chunk_overlap", 200)
+        self.embedding_model = self.config.get("embedding_model", "all-MiniLM-L6-v2")
+        self.extraction_workers = self.config.get("extraction_workers") or os.cpu_count() or 1
+        self.embedding_batch_size = self.config.get("embedding_batch_size", 256)
+        # Extracted files waiting to be embedded; bounds memory when embedding is the bottleneck.
+        self.max_pending_files = self.config.get("max_pending_files") or 2 * self.extraction_workers
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
             length_function=len,
         )
-        self.embeddings = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+        self.embeddings = get_embeddings(self.embedding_model)
+        # "auto" picks flat / HNSW / IVF-PQ by vector count (see vector_index)
+        self.index_type = self.config.get("index_type", vector_index.AUTO)
+        self.index_params = vector_index.index_params(self.config)
+        self.serving_mode = self.config.get("serving_mode", "readwrite")
+        if self.serving_mode not in SERVING_MODES:
+            raise ValueError(f"Unknown serving_mode '{self.serving_mode}', expected one of {SERVING_MODES}")
         self.vector_store = None
-        
-    def _extract_text_from_pdf(self, file_path):
-        text = ""
+        self.manifest = self._empty_manifest()
+        self.chunk_table = ChunkTable()
+        self.chunk_db = None
+    
+    def _load_config(self, config_path):
+        if not config_path or not os.path.exists(config_path):
+            return {}
+        with open(config_path, 'r') as f:
+            return json.load(f)
+    
+    def _empty_manifest(self):
+        return {
+            "version": MANIFEST_VERSION,
+            "embedding_model": self.embedding_model,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "files": {},
+        }
+    
+    @staticmethod
+    def _extract_segments_from_pdf(file_path):
         try:
             reader = PdfReader(file_path)
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
+            for page_number, page in enumerate(reader.pages, start=1):
+                yield page_number, (page.extract_text() or "") + "\n"
         except Exception as e:
             print(f"Error extracting text from PDF {file_path}: {e}")
-        return text
     
-    def _extract_text_from_docx(self, file_path):
-        text = ""
+    @staticmethod
+    def _extract_segments_from_docx(file_path):
         try:
             doc = docx.Document(file_path)
             for para in doc.paragraphs:
-                text += para.text + "\n"
+                yield None, para.text + "\n"
         except Exception as e:
             print(f"Error extracting text from DOCX {file_path}: {e}")
-        return text
     
-    def _extract_text_from_txt(self, file_path):
-        text = ""
+    @staticmethod
+    def _extract_segments_from_txt(file_path):
         try:
             with open(file_path, 'r', encoding='utf-8') as file:
-                text = file.read()
+                for block in iter(lambda: file.read(TXT_READ_SIZE), ""):
+                    yield None, block
         except Exception as e:
             print(f"Error extracting text from TXT {file_path}: {e}")
-        return text
     
-    def _extract_text_from_csv(self, file_path):
-        text = ""
+    @staticmethod
+    def _extract_segments_from_csv(file_path):
         try:
             with open(file_path, 'r', encoding='utf-8') as file:
                 csv_reader = csv.reader(file)
                 for row in csv_reader:
-                    text += " | ".join(row) + "\n"
+                    yield None, " | ".join(row) + "\n"
         except Exception as e:
             print(f"Error extracting text from CSV {file_path}: {e}")
-        return text
     
-    def process_documents(self):
-        all_chunks = []
-        if not os.path.exists(self.docs_folder):
-            print(f"Documents folder '{self.docs_folder}' does not exist.")
+    @staticmethod
+    def _extract_segments(file_path):
+        """
+        Dispatch to the segment generator matching the file's extension.
+        
+        Segments are ``(page, text)`` pairs; ``page`` is the 1-based page number
+        for paginated formats and None otherwise.
+        """
+        lower = file_path.lower()
+        if lower.endswith('.pdf'):
+            return DocumentProcessor._extract_segments_from_pdf(file_path)
+        elif lower.endswith('.docx'):
+            return DocumentProcessor._extract_segments_from_docx(file_path)
+        elif lower.endswith('.txt'):
+            return DocumentProcessor._extract_segments_from_txt(file_path)
+        elif lower.endswith('.csv'):
+            return DocumentProcessor._extract_segments_from_csv(file_path)
+        return iter(())
+    
+    @staticmethod
+    def _file_sha256(file_path):
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def _manifest_path(self):
+        return os.path.join(self.index_folder, MANIFEST_FILENAME)
+    
+    def _read_manifest(self):
+        """
+        Read the saved manifest, or None if it is missing or was written with a
+        different embedding model or chunking settings, since its vectors would
+        not be comparable.
+        """
+        manifest_path = self._manifest_path()
+        if not os.path.exists(manifest_path):
+            return None
+        
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except Exception as e:
+            print(f"Error reading index manifest {manifest_path}: {e}")
+            return None
+        
+        expected = self._empty_manifest()
+        for key in ("version", "embedding_model", "chunk_size", "chunk_overlap"):
+            if manifest.get(key) != expected[key]:
+                print(f"Saved index is stale ({key} changed), rebuilding from scratch.")
+                return None
+        return manifest
+    
+    def _chunk_db(self):
+        """The SQLite store holding chunk texts for the editable index, opened on first use."""
+        if self.chunk_db is None:
+            os.makedirs(self.index_folder, exist_ok=True)
+            self.chunk_db = chunk_store.SqliteChunkStore(os.path.join(self.index_folder, chunk_store.CHUNK_DB_FILENAME))
+        return self.chunk_db
+    
+    def _move_chunks_to_db(self):
+        """Copy chunk texts from an index saved with an in-memory docstore into the chunk database."""
+        docstore, row_ids = self.vector_store.docstore, self.vector_store.index_to_docstore_id
+        db = self._chunk_db()
+        db.clear()
+        db.add({id_: docstore.search(id_) for id_ in row_ids.values()})
+        self.vector_store.docstore = db
+        print(f"Moved {len(row_ids)} chunk texts into {chunk_store.CHUNK_DB_FILENAME}.")
+    
+    def load_index(self):
+        """
+        Load a previously saved FAISS index and its manifest from ``index_folder``.
+        
+        The saved index is discarded when it was built with a different embedding
+        model or chunking settings, since its vectors would not be comparable.
+        
+        Returns:
+            bool: True if a compatible index was loaded
+        """
+        manifest = self._read_manifest()
+        if manifest is None:
+            return False
+        
+        chunk_table_path = os.path.join(self.index_folder, CHUNK_TABLE_FILENAME)
+        try:
+            with open(chunk_table_path, 'r', encoding='utf-8') as f:
+                chunk_table = ChunkTable.from_dict(json.load(f))
+        except Exception as e:
+            print(f"Error reading chunk metadata {chunk_table_path}: {e}")
+            return False
+        
+        if len(chunk_table):
+            try:
+                # The index files are written by save_index below, so they are trusted.
+                self.vector_store = vector_index.RerankingFAISS.load_local(
+                    self.index_folder,
+                    self.embeddings,
+                    allow_dangerous_deserialization=True,
+                )
+                vector_index.configure_search(
+                    self.vector_store.index, self.index_params["nprobe"], self.index_params["ef_search"]
+                )
+                vectors = vector_index.load_vectors(self.index_folder)
+                if not vector_index.is_exact(self.vector_store.index) and vectors is None:
+                    print(f"Approximate index has no {vector_index.VECTORS_FILENAME}, rebuilding from scratch.")
+                    self.vector_store = None
+                    return False
+                vector_index.attach_rerank_vectors(
+                    self.vector_store, vectors, self.index_params["rerank_factor"]
+                )
+                if isinstance(self.vector_store.docstore, chunk_store.SqliteChunkStore):
+                    # The pickled store only remembers a path; use this folder's database
+                    self.vector_store.docstore = self._chunk_db()
+                    if self.chunk_db.generation != manifest.get("chunk_db_generation"):
+                        print(f"{chunk_store.CHUNK_DB_FILENAME} does not match the saved index, rebuilding from scratch.")
+                        self.vector_store = None
+                        return False
+            except Exception as e:
+                print(f"Error loading FAISS index from {self.index_folder}: {e}")
+                self.vector_store = None
+                return False
+        
+        self.manifest = manifest
+        self.chunk_table = chunk_table
+        print(f"Loaded saved index with {len(manifest['files'])} files from {self.index_folder}")
+        return True
+    
+    def load_serving_index(self):
+        """
+        Open the saved index read-only, for worker processes that only serve queries.
+        
+        The FAISS index is read with ``IO_FLAG_MMAP`` and chunk texts come from
+        the memory-mapped chunk store written by save_index, so every worker
+        shares the same page cache instead of building a private index and
+        docstore, and startup does no parsing or embedding. Nothing in
+        ``docs_folder`` is read and nothing is written back. Keyword search
+        opens chunks.sqlite read-only.
+        
+        Returns:
+            bool: True if a compatible index was opened
+        """
+        manifest = self._read_manifest()
+        if manifest is None:
+            return False
+        
+        self.vector_store = None
+        if any(entry.get("chunks") for entry in manifest["files"].values()):
+            try:
+                index = vector_index.read_index(self.index_folder, mmap=True)
+                vector_index.configure_search(index, self.index_params["nprobe"], self.index_params["ef_search"])
+                store = chunk_store.MmapChunkStore(self.index_folder)
+                if len(store) != index.ntotal:
+                    print(f"Chunk store holds {len(store)} chunks, index has {index.ntotal}; "
+                          f"rebuild the index before serving it.")
+                    return False
+                self.vector_store = vector_index.RerankingFAISS(
+                    self.embeddings, index, store, chunk_store.RowIds(len(store))
+                )
+                vector_index.attach_rerank_vectors(
+                    self.vector_store, vector_index.load_vectors(self.index_folder), self.index_params["rerank_factor"]
+                )
+                db_path = os.path.join(self.index_folder, chunk_store.CHUNK_DB_FILENAME)
+                if os.path.exists(db_path):
+                    # Keyword search reads the indexing run's last commit
+                    self.vector_store.lexical_index = chunk_store.SqliteChunkStore(db_path, read_only=True)
+            except Exception as e:
+                print(f"Error opening read-only index in {self.index_folder}: {e}")
+                self.vector_store = None
+                return False
+        
+        # Chunk metadata travels with each chunk, so the chunk table is not loaded
+        self.manifest = manifest
+        print(f"Serving read-only index with {len(manifest['files'])} files from {self.index_folder}")
+        return True
+    
+    def _make_editable(self):
+        """
+        Swap an approximate index for an exact one rebuilt from vectors.npy.
+        
+        HNSW cannot delete vectors and compressed indexes cannot give back the
+        originals, so edits are always applied to a flat index; save_index
+        builds the approximate index again afterwards.
+        """
+        if self.vector_store is None or vector_index.is_exact(self.vector_store.index):
             return
+        vector_index.use_exact_index(self.vector_store, vector_index.load_vectors(self.index_folder))
+    
+    def _index_needs_rebuild(self):
+        """True if the configured index type or compression no longer matches the loaded index."""
+        if self.vector_store is None:
+            return False
+        return not vector_index.index_matches(self.vector_store.index, self.index_type, self.index_params)
+    
+    def save_index(self):
+        """
+        Persist the FAISS index, chunk metadata and manifest to ``index_folder``.
+        
+        The exact vectors are written to vectors.npy first, then the index is
+        rebuilt as the configured type, so later edits and type changes never
+        need the chunks to be re-embedded. A compressed index re-ranks its
+        results against the memory-mapped vectors.npy. Chunk texts are also
+        written, in index order, to the chunk store read by load_serving_index.
+        
+        Chunk database changes are committed before the index is written and
+        the manifest records the committed generation, so load_index can tell
+        whether the two were saved together.
+        """
+        os.makedirs(self.index_folder, exist_ok=True)
+        if self.vector_store is None:
+            self._chunk_db().clear()
+        self.manifest["chunk_db_generation"] = self._chunk_db().commit()
+        if self.vector_store is not None:
+            # An untouched approximate index is already in sync with vectors.npy
+            if vector_index.is_exact(self.vector_store.index) or self._index_needs_rebuild():
+                self._make_editable()
+                vector_index.save_vectors(self.index_folder, vector_index.exact_vectors(self.vector_store.index))
+                self.manifest["index_type"] = vector_index.apply_index_type(
+                    self.vector_store, self.index_type, self.index_params,
+                    vector_index.load_vectors(self.index_folder)
+                )
+                self.manifest["index_compression"] = vector_index.compression_of(self.vector_store.index)
+            self.vector_store.save_local(self.index_folder)
+            docstore, row_ids = self.vector_store.docstore, self.vector_store.index_to_docstore_id
+            if isinstance(docstore, chunk_store.SqliteChunkStore):
+                documents = docstore.documents_by_row(row_ids)
+            else:
+                documents = (docstore.search(row_ids[row]) for row in range(self.vector_store.index.ntotal))
+            chunk_store.write_chunk_store(self.index_folder, documents)
+        else:
+            self.manifest.pop("index_type", None)
+            self.manifest.pop("index_compression", None)
+            for name in ("index.faiss", "index.pkl", vector_index.VECTORS_FILENAME):
+                stale = os.path.join(self.index_folder, name)
+                if os.path.exists(stale):
+                    os.remove(stale)
+            chunk_store.remove_chunk_store(self.index_folder)
+        
+        self._write_json(os.path.join(self.index_folder, CHUNK_TABLE_FILENAME), self.chunk_table.to_dict())
+        # Write the manifest last so a crash mid-save never leaves a manifest
+        # that describes vectors which were not written.
+        self._write_json(self._manifest_path(), self.manifest, indent=2)
+    
+    @staticmethod
+    def _write_json(path, data, indent=None):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=indent)
+        os.replace(tmp_path, path)
+    
+    def get_chunk_metadata(self, chunk_id):
+        """Return the source file, page and offset recorded for a vector id."""
+        return self.chunk_table.get(chunk_id)
+    
+    def _scan_docs_folder(self):
+        """
+        Compare the documents folder against the manifest.
+        
+        Size and mtime are checked first; the content hash is only computed when
+        they differ, so unchanged files cost a single ``stat`` call.
+        
+        Returns:
+            tuple: (changed, removed, touched) where ``changed`` maps filename to
+            its new manifest entry, ``removed`` lists filenames no longer on disk
+            and ``touched`` counts unmodified files whose stat fields were refreshed
+        """
+        known = self.manifest["files"]
+        changed = {}
+        seen = set()
+        touched = 0
         
-        for filename in os.listdir(self.docs_folder):
+        for filename in sorted(os.listdir(self.docs_folder)):
             file_path = os.path.join(self.docs_folder, filename)
-            
             if not os.path.isfile(file_path):
                 continue
-                
-            print(f"Processing {file_path}...")
-            text = ""
-            
-            if filename.lower().endswith('.pdf'):
-                text = self._extract_text_from_pdf(file_path)
-            elif filename.lower().endswith('.docx'):
-                text = self._extract_text_from_docx(file_path)
-            elif filename.lower().endswith('.txt'):
-                text = self._extract_text_from_txt(file_path)
-            elif filename.lower().endswith('.csv'):
-                text = self._extract_text_from_csv(file_path)
-            else:
+            if not filename.lower().endswith(SUPPORTED_EXTENSIONS):
                 print(f"Unsupported file format: {filename}")
                 continue
             
-            if text:
-                chunks = self.text_splitter.split_text(text)
-                all_chunks.extend(chunks)
+            seen.add(filename)
+            stat = os.stat(file_path)
+            entry = known.get(filename)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                continue
+            
+            sha256 = self._file_sha256(file_path)
+            if entry and entry["sha256"] == sha256:
+                # Touched but not modified: refresh the stat fields only.
+                entry["mtime"] = stat.st_mtime
+                entry["size"] = stat.st_size
+                touched += 1
+                continue
+            
+            changed[filename] = {
+                "sha256": sha256,
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+                "chunks": 0,
+            }
         
-        if all_chunks:
-            self.vector_store = FAISS.from_texts(all_chunks, self.embeddings)
-            print("Documents processed and embeddings generated. FAISS index created.")
+        removed = [filename for filename in known if filename not in seen]
+        return changed, removed, touched
+    
+    def _remove_source(self, filename):
+        chunk_ids = self.chunk_table.remove_source(filename)
+        if not chunk_ids or self.vector_store is None:
+            return
+        self.vector_store.delete(chunk_ids)
+        if self.vector_store.index.ntotal == 0:
+            self.vector_store = None
+    
+    def _extract_files(self, file_paths):
+        """
+        Extract and chunk files, yielding results in completion order.
+        
+        Extraction is CPU-bound, so files are spread over a process pool of
+        ``extraction_workers`` processes; the caller embeds each file's chunks
+        as soon as it arrives while the remaining files are still being read.
+        At most ``max_pending_files`` files are submitted ahead of the consumer,
+        so a slow embedding stage holds extraction back instead of letting
+        finished chunks pile up in memory.
+        
+        Yields:
+            tuple: (file_path, [(chunk, page, offset), ...], extraction seconds)
+        """
+        workers = min(self.extraction_workers, len(file_paths))
+        if workers <= 1:
+            for file_path in file_paths:
+                print(f"Processing {file_path}...")
+                yield _extract_and_split(file_path, self.chunk_size, self.chunk_overlap)
+            return
+        
+        print(f"Extracting {len(file_paths)} files with {workers} worker processes...")
+        pending_limit = max(workers, self.max_pending_files)
+        remaining = iter(file_paths)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for file_path in remaining:
+                pending.add(executor.submit(_extract_and_split, file_path, self.chunk_size, self.chunk_overlap))
+                if len(pending) >= pending_limit:
+                    break
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+                    next_path = next(remaining, None)
+                    if next_path is not None:
+                        pending.add(executor.submit(_extract_and_split, next_path, self.chunk_size, self.chunk_overlap))
+    
+    def process_documents(self):
+        """
+        Bring the index in line with ``docs_folder``.
+        
+        A saved index is loaded first; only files that were added or changed since
+        it was written are extracted and embedded, and chunks belonging to changed
+        or deleted files are dropped from the index.
+        
+        In "readonly" serving mode the saved index is only opened (see
+        load_serving_index); building it is left to an indexing run.
+        """
+        if self.serving_mode == "readonly":
+            if not self.load_serving_index():
+                self.vector_store = None
+                print(f"No usable index in {self.index_folder} to serve; "
+                      f"build it first with `python src/cli.py --build-index`.")
+            return
+        
+        if not os.path.exists(self.docs_folder):
+            print(f"Documents folder '{self.docs_folder}' does not exist.")
+            return
+        
+        if not self.load_index():
+            self.vector_store = None
+            self.manifest = self._empty_manifest()
+            self.chunk_table = ChunkTable()
+            self._chunk_db().rollback()
+            self._chunk_db().clear()
+        
+        changed, removed, touched = self._scan_docs_folder()
+        rebuild = self._index_needs_rebuild()
+        # Indexes saved before the chunk stores existed get them written now
+        missing_store = self.vector_store is not None and not chunk_store.has_chunk_store(self.index_folder)
+        in_memory = self.vector_store is not None and \
+            not isinstance(self.vector_store.docstore, chunk_store.SqliteChunkStore)
+        if in_memory:
+            self._move_chunks_to_db()
+        dirty = bool(changed or removed or touched or rebuild or missing_store or in_memory)
+        if changed or removed:
+            self._make_editable()
+        
+        for filename in removed:
+            print(f"Removing {filename} from index...")
+            self.manifest["files"].pop(filename)
+            self._remove_source(filename)
+        
+        for filename in changed:
+            if self.manifest["files"].pop(filename, None):
+                self._remove_source(filename)
+        
+        stage = EmbeddingStage(self.embeddings, self.embedding_batch_size, self.vector_store, self._chunk_db())
+        paths = {os.path.join(self.docs_folder, filename): filename for filename in changed}
+        for file_path, chunks, extract_seconds in self._extract_files(list(paths)):
+            filename = paths[file_path]
+            entry = changed[filename]
+            if chunks:
+                texts, pages, offsets = zip(*chunks)
+                metadatas = [
+                    {"source": filename, "page": page, "offset": offset}
+                    for page, offset in zip(pages, offsets)
+                ]
+                ids = stage.add(list(texts), metadatas)
+                self.chunk_table.add(ids, filename, pages, offsets)
+                entry["chunks"] = len(ids)
+            print(f"Processed {filename}: {len(chunks)} chunks, extract {extract_seconds:.2f}s")
+            # Files without text are recorded too, so they are not re-read on every start.
+            self.manifest["files"][filename] = entry
+        self.vector_store = stage.flush()
+        if stage.batches:
+            print(f"Embedded {stage.chunks_embedded} chunks in {stage.batches} batches "
+                  f"of up to {stage.batch_size} ({stage.seconds:.2f}s)")
+        
+        if dirty:
+            self.save_index()
+        
+        if self.vector_store:
+            self.vector_store.lexical_index = self.chunk_db
+            if changed or removed:
+                print(f"Indexed {len(changed)} new or changed files, removed {len(removed)}. FAISS index saved.")
+            else:
+                print("Documents unchanged since last run. Loaded FAISS index from disk.")
         else:
             print("No document content to process.")
     
@@ -104,7 +788,7 @@ if __name__ == "__main__":
     os.makedirs("docs", exist_ok=True)
     with open("docs/dummy.txt", "w") as f:
         f.write("This is a dummy text file content for testing purposes.")
-
+    
     processor = DocumentProcessor()
     processor.process_documents()
     vector_store = processor.get_vector_store()
@@ -112,4 +796,3 @@ if __name__ == "__main__":
         print("Vector store is ready.")
     else:
         print("Vector store is empty.")
-
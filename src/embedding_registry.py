@@ -0,0 +1,190 @@
+# embedding_registry.py
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_QUERY_CACHE_SIZE = 1024
+
+_registry: Dict[str, "SharedEmbeddings"] = {}
+_registry_lock = threading.Lock()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache of query text -> embedding vector with hit/miss counters.
+
+    Keys are normalized by collapsing whitespace, so a repeated question that
+    differs only in spacing shares one entry. Case is kept: ``embedding_model``
+    may name a cased model, for which "SKU" and "sku" embed differently.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_QUERY_CACHE_SIZE):
+        self.maxsize = max(0, int(maxsize))
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.split())
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: str, vector: List[float]) -> None:
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class SharedEmbeddings(Embeddings):
+    """
+    Process-wide, lazily loaded sentence-transformer embeddings.
+
+    The underlying model is only loaded on the first embed call, so code paths
+    that merely need an ``Embeddings`` object (e.g. loading a saved FAISS index)
+    do not pay the model load cost. Query embeddings go through an LRU cache,
+    so repeated questions skip the encoder entirely.
+    """
+
+    def __init__(self, model_name: str, query_cache_size: int = DEFAULT_QUERY_CACHE_SIZE):
+        self.model_name = model_name
+        self.query_cache = QueryEmbeddingCache(query_cache_size)
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from langchain_community.embeddings import SentenceTransformerEmbeddings
+
+                    print(f"Loading embedding model {self.model_name}...")
+                    self._model = SentenceTransformerEmbeddings(model_name=self.model_name)
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = QueryEmbeddingCache.normalize(text)
+        vector = self.query_cache.get(key)
+        if vector is None:
+            # The key is only for lookups; embed the question as written
+            vector = self.model.embed_query(text)
+            self.query_cache.put(key, vector)
+        return vector
+
+    def unload(self) -> None:
+        """Drop the loaded model; cached query vectors are invalidated with it."""
+        with self._load_lock:
+            self._model = None
+            self.query_cache.clear()
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the model's parameters and buffers (0 if not loaded)."""
+        if self._model is None:
+            return 0
+        client = getattr(self._model, "client", None)
+        if client is None or not hasattr(client, "parameters"):
+            return 0
+        tensors = list(client.parameters()) + list(client.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def _load_config(config_path: str = "config.json") -> Dict[str, Any]:
+    if config_path and os.path.exists(config_path):
+        with open(config_path, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def default_model_name(config_path: str = "config.json") -> str:
+    """Return ``embedding_model`` from the config file, or the built-in default."""
+    return _load_config(config_path).get("embedding_model") or DEFAULT_EMBEDDING_MODEL
+
+
+def get_embeddings(model_name: Optional[str] = None) -> SharedEmbeddings:
+    """
+    Return the shared embeddings instance for ``model_name``.
+
+    Every caller asking for the same model gets the same object, so the model
+    is loaded at most once per process. Each model has its own query cache
+    (sized by ``query_cache_size`` in config.json), so switching models never
+    serves vectors produced by a different encoder.
+
+    Args:
+        model_name: Sentence-transformers model name (default: the
+            ``embedding_model`` setting in config.json)
+
+    Returns:
+        SharedEmbeddings: The process-wide instance for that model
+    """
+    model_name = model_name or default_model_name()
+    embeddings = _registry.get(model_name)
+    if embeddings is None:
+        with _registry_lock:
+            embeddings = _registry.get(model_name)
+            if embeddings is None:
+                cache_size = _load_config().get("query_cache_size", DEFAULT_QUERY_CACHE_SIZE)
+                embeddings = SharedEmbeddings(model_name, cache_size)
+                _registry[model_name] = embeddings
+    return embeddings
+
+
+def embedding_memory_usage() -> Dict[str, Dict[str, Any]]:
+    """
+    Report the registered embedding models and their memory use.
+
+    Returns:
+        dict: ``{model_name: {'loaded': bool, 'bytes': int, 'query_cache': dict}}``
+    """
+    with _registry_lock:
+        entries = list(_registry.items())
+    return {
+        name: {
+            'loaded': embeddings.loaded,
+            'bytes': embeddings.memory_bytes(),
+            'query_cache': embeddings.query_cache.stats(),
+        }
+        for name, embeddings in entries
+    }
@@ -0,0 +1,200 @@
+# hybrid_retrieval.py
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import field_validator
+
+try:
+    from .worker_pool import get_pool, PoolSaturatedError
+except ImportError:
+    from worker_pool import get_pool, PoolSaturatedError
+
+RETRIEVAL_MODES = ("hybrid", "vector", "lexical")
+DEFAULT_RETRIEVAL_MODE = "hybrid"
+DEFAULT_K = 4
+DEFAULT_CANDIDATES = 20
+# The constant from the original RRF paper; larger values flatten the rank curve
+DEFAULT_RRF_K = 60
+STAGES = ("embed", "vector", "lexical", "fusion", "total")
+
+logger = logging.getLogger(__name__)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Document]],
+                           rrf_k: int = DEFAULT_RRF_K) -> List[Tuple[Document, float]]:
+    """
+    Merge ranked result lists with reciprocal-rank fusion.
+
+    A chunk scores ``sum(1 / (rrf_k + rank))`` over the lists it appears in
+    (ranks start at 1), so only positions matter and BM25 scores never have
+    to be compared with L2 distances. Chunks are matched by id; ties keep the
+    order of the first list.
+
+    Returns:
+        list: ``(document, score)`` pairs, best first
+    """
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            key = document.id or document.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, document)
+    order = sorted(scores, key=lambda key: -scores[key])
+    return [(documents[key], scores[key]) for key in order]
+
+
+class RetrievalResult(NamedTuple):
+    documents: List[Document]
+    vector: List[float]
+    # Stage -> milliseconds; lexical runs alongside embed + vector, so the
+    # stages add up to more than the total
+    timings: Dict[str, float]
+
+
+class RetrievalStats:
+    """Thread-safe running totals of per-stage retrieval timings."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queries = 0
+        self._lexical_only = 0
+        self._inline_lexical = 0
+        self._total_ms = {stage: 0.0 for stage in STAGES}
+        self._max_ms = {stage: 0.0 for stage in STAGES}
+
+    def record(self, timings: Dict[str, float], lexical_only: int, inline_lexical: bool) -> None:
+        with self._lock:
+            self._queries += 1
+            self._lexical_only += lexical_only
+            self._inline_lexical += int(inline_lexical)
+            for stage, ms in timings.items():
+                self._total_ms[stage] += ms
+                self._max_ms[stage] = max(self._max_ms[stage], ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            queries = self._queries
+            return {
+                'queries': queries,
+                # Results that only the keyword search found
+                'lexical_only_results': self._lexical_only,
+                'inline_lexical': self._inline_lexical,
+                'avg_ms': {stage: self._total_ms[stage] / queries if queries else 0.0 for stage in STAGES},
+                'max_ms': dict(self._max_ms),
+            }
+
+
+_stats = RetrievalStats()
+
+
+def retrieval_stats() -> Dict[str, Any]:
+    """Report the per-stage timings of every retrieval in this process."""
+    return _stats.snapshot()
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever that fuses FAISS similarity search with BM25 keyword search.
+
+    MiniLM embeddings blur exact strings such as part numbers, error codes
+    and SKUs, which the chunk database's FTS5 index matches directly (see
+    SqliteChunkStore.lexical_search). The keyword search is submitted to the
+    shared "retrieval" pool and runs while the question is embedded and
+    searched in FAISS; both lists, ``candidates`` deep, are merged with
+    reciprocal-rank fusion and the best ``k`` chunks returned.
+
+    The keyword index is the vector store's ``lexical_index``. Without one,
+    or in "vector" mode, this is plain vector search; "lexical" mode skips
+    the FAISS search but still embeds the question for the answer cache.
+    """
+
+    vector_store: Any
+    mode: str = DEFAULT_RETRIEVAL_MODE
+    k: int = DEFAULT_K
+    candidates: int = DEFAULT_CANDIDATES
+    rrf_k: int = DEFAULT_RRF_K
+    pool_workers: int = 4
+    pool_queue: int = 32
+
+    @field_validator("mode")
+    @classmethod
+    def _check_mode(cls, mode: str) -> str:
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval_mode {mode!r}; expected one of {', '.join(RETRIEVAL_MODES)}")
+        return mode
+
+    @property
+    def lexical_index(self):
+        return getattr(self.vector_store, "lexical_index", None)
+
+    def _lexical_search(self, lexical_index, query: str, k: int) -> Tuple[List[Document], float]:
+        started = time.perf_counter()
+        documents = [document for document, _ in lexical_index.lexical_search(query, k)]
+        return documents, (time.perf_counter() - started) * 1000
+
+    def retrieve(self, query: str) -> RetrievalResult:
+        """
+        Embed ``query`` and retrieve its chunks, timing every stage.
+
+        Returns:
+            RetrievalResult: The chunks, the query embedding (for the answer
+            cache) and the stage timings in milliseconds
+        """
+        started = time.perf_counter()
+        lexical_index = self.lexical_index if self.mode != "vector" else None
+        mode = self.mode if lexical_index is not None else "vector"
+        depth = self.candidates if mode == "hybrid" else self.k
+
+        future = None
+        if mode != "vector":
+            try:
+                future = get_pool("retrieval", self.pool_workers, self.pool_queue).submit(
+                    self._lexical_search, lexical_index, query, depth
+                )
+            except PoolSaturatedError:
+                pass
+
+        timings: Dict[str, float] = {}
+        mark = time.perf_counter()
+        vector = self.vector_store.embeddings.embed_query(query)
+        timings["embed"] = (time.perf_counter() - mark) * 1000
+
+        vector_docs: List[Document] = []
+        if mode != "lexical":
+            mark = time.perf_counter()
+            vector_docs = self.vector_store.similarity_search_by_vector(vector, k=depth)
+            timings["vector"] = (time.perf_counter() - mark) * 1000
+
+        lexical_docs: List[Document] = []
+        if mode != "vector":
+            try:
+                # A saturated pool only costs the overlap; the search still runs
+                lexical_docs, timings["lexical"] = future.result() if future is not None else \
+                    self._lexical_search(lexical_index, query, depth)
+            except Exception as e:
+                logger.warning(f"[WARNING] Keyword search failed, using vector results only: {str(e)}")
+
+        mark = time.perf_counter()
+        if mode == "hybrid":
+            documents = [document for document, _ in reciprocal_rank_fusion([vector_docs, lexical_docs], self.rrf_k)]
+        else:
+            documents = vector_docs or lexical_docs
+        documents = documents[:self.k]
+        timings["fusion"] = (time.perf_counter() - mark) * 1000
+        timings["total"] = (time.perf_counter() - started) * 1000
+
+        vector_ids = {document.id for document in vector_docs}
+        lexical_only = sum(document.id not in vector_ids for document in documents) if mode == "hybrid" else 0
+        _stats.record(timings, lexical_only, mode != "vector" and future is None)
+        return RetrievalResult(documents, vector, timings)
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.retrieve(query).documents
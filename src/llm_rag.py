@@ -1,21 +1,53 @@
 # llm_rag.py
 
 import json
+import logging
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 from openai import OpenAI
 from langchain.chains import RetrievalQA, ConversationChain
 from langchain.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
 from langchain.memory import ConversationBufferMemory
-from translations import translate_text
+from translations import get_translation_service
+from suggestions import SuggestionCatalog, get_ranker, DEFAULT_RANKER, DEFAULT_SUGGESTION_SETS, SUGGESTION_COUNT
+from answer_cache import SemanticAnswerCache
+try:
+    from .worker_pool import get_pool, cancelled, DeadlineExceeded, PoolSaturatedError
+except ImportError:
+    from worker_pool import get_pool, cancelled, DeadlineExceeded, PoolSaturatedError
+try:
+    from .hybrid_retrieval import HybridRetriever, DEFAULT_RETRIEVAL_MODE, DEFAULT_K, DEFAULT_CANDIDATES, DEFAULT_RRF_K
+except ImportError:
+    from hybrid_retrieval import HybridRetriever, DEFAULT_RETRIEVAL_MODE, DEFAULT_K, DEFAULT_CANDIDATES, DEFAULT_RRF_K
+
+logger = logging.getLogger(__name__)
 
 class ChatbotLLM:
+    OUT_OF_SCOPE_ANSWER = "Sorry, I couldn't find relevant information in the documents to answer your question. Could you please rephrase or ask something else?"
+    BUSY_ANSWER = "I'm sorry, I'm handling too many questions right now. Please try again in a moment."
+
     def __init__(self, vector_store, config_path="config.json"):
         self.vector_store = vector_store
         self.config = self._load_config(config_path)
+        self.answer_timeout = self.config.get("llm_timeout", 30)
+        self.llm_pool = get_pool(
+            "llm",
+            max_workers=self.config.get("llm_workers", 4),
+            max_queue=self.config.get("llm_queue_size", 16)
+        )
         self.llm = self._initialize_llm()
         self.qa_chain = self._initialize_qa_chain()
+        self.answer_cache = SemanticAnswerCache(
+            threshold=self.config.get("answer_cache_threshold", 0.95),
+            ttl=self.config.get("answer_cache_ttl", 3600),
+            max_entries=self.config.get("answer_cache_size", 256)
+        )
+        self.translator = get_translation_service()
+        self.suggestion_catalog = SuggestionCatalog.load(
+            self.config.get("suggestion_sets") or DEFAULT_SUGGESTION_SETS
+        )
+        self.suggestion_ranker = get_ranker(self.config.get("suggestion_ranker", DEFAULT_RANKER))
 
     def _load_config(self, config_path):
         with open(config_path, 'r') as f:
@@ -37,7 +69,8 @@ class ChatbotLLM:
         return ChatOpenAI(
             model=self.config["llm_model_path"],
             temperature=0.7,
-            max_tokens=1000
+            max_tokens=1000,
+            timeout=self.config.get("llm_timeout", 30)
         )
 
     def _initialize_qa_chain(self):
@@ -52,20 +85,102 @@ class ChatbotLLM:
 Question: {question}
 Helpful Answer:"""
         QA_CHAIN_PROMPT = PromptTemplate.from_template(template)
+        self.qa_prompt = QA_CHAIN_PROMPT
+
+        # Vector search fused with BM25 keyword search over the chunk database
+        self.retriever = HybridRetriever(
+            vector_store=self.vector_store,
+            mode=self.config.get("retrieval_mode", DEFAULT_RETRIEVAL_MODE),
+            k=self.config.get("retrieval_k", DEFAULT_K),
+            candidates=self.config.get("retrieval_candidates", DEFAULT_CANDIDATES),
+            rrf_k=self.config.get("retrieval_rrf_k", DEFAULT_RRF_K)
+        )
 
         qa_chain = RetrievalQA.from_chain_type(
             llm=self.llm,
             chain_type="stuff",
-            retriever=self.vector_store.as_retriever(),
+            retriever=self.retriever,
             return_source_documents=True,
             chain_type_kwargs={"prompt": QA_CHAIN_PROMPT}
         )
         return qa_chain
 
-    def ask_question(self, question: str, language: str = 'en', conversation_history: Optional[List[Dict[str, Any]]] = None) -> str:
-        import logging
-        logger = logging.getLogger(__name__)
-        
+    def set_vector_store(self, vector_store):
+        """Swap in a rebuilt document index; cached answers are dropped with the old one."""
+        self.vector_store = vector_store
+        self.qa_chain = self._initialize_qa_chain()
+        self.answer_cache.clear()
+
+    def _index_signature(self):
+        # Changes whenever chunks are added to or removed from the live index.
+        return (id(self.vector_store), self.vector_store.index.ntotal)
+
+    def _format_question(self, question: str, language: str = 'en',
+                         conversation_history: Optional[List[Dict[str, Any]]] = None) -> str:
+        """Translate the question to English and prefix the recent conversation history."""
+        logger.info("[DEBUG] Processing question translation...")
+        # Translate non-English questions to English for better retrieval
+        if language != 'en':
+            translated_question = self.translator.translate(question, 'en')
+            logger.info(f"[DEBUG] Translated question to English: {translated_question}")
+        else:
+            translated_question = question
+            logger.info("[DEBUG] No translation needed, using original question")
+
+        # Add conversation history to context if available
+        context = ""
+        if conversation_history:
+            logger.info(f"[DEBUG] Adding conversation history. Found {len(conversation_history)} messages")
+            for msg in conversation_history[-5:]:  # Use last 5 messages as context
+                role = "User" if msg.get('is_user') else "Assistant"
+                context += f"{role}: {msg.get('content', '')}\n"
+            logger.debug(f"[DEBUG] Context with history: {context}")
+        else:
+            logger.info("[DEBUG] No conversation history provided")
+
+        # Format the question with context
+        formatted_question = f"{context}\nQuestion: {translated_question}" if context else translated_question
+        logger.debug(f"[DEBUG] Formatted question: {formatted_question}")
+        return formatted_question
+
+    def _retrieve(self, formatted_question: str):
+        """
+        Embed the question once, retrieve its chunks and consult the answer cache.
+
+        Returns:
+            tuple: ``(vector, docs, chunk_ids, cached_answer)``; ``cached_answer``
+            is None on a cache miss
+        """
+        docs, vector, timings = self.retriever.retrieve(formatted_question)
+        logger.info("[DEBUG] Retrieval timings: " + ", ".join(f"{stage} {ms:.1f}ms" for stage, ms in timings.items()))
+        chunk_ids = [doc.id for doc in docs]
+
+        self.answer_cache.check_index(self._index_signature())
+        return vector, docs, chunk_ids, self.answer_cache.lookup(vector, chunk_ids)
+
+    def _answer(self, formatted_question: str) -> Dict[str, Any]:
+        """
+        Retrieve context and generate an answer, reusing a cached one when possible.
+
+        Retrieval runs once with the (cached) query embedding; the semantic
+        answer cache is consulted with that embedding and the retrieved chunk
+        ids before the LLM is called.
+        """
+        vector, docs, chunk_ids, answer = self._retrieve(formatted_question)
+        if answer is not None:
+            logger.info("[DEBUG] Answer cache hit")
+            return {"result": answer, "source_documents": docs}
+
+        answer = self.qa_chain.combine_documents_chain.invoke(
+            {"input_documents": docs, "question": formatted_question}
+        )["output_text"]
+        self.answer_cache.store(vector, chunk_ids, answer)
+        return {"result": answer, "source_documents": docs}
+
+    def ask_question(self, question: str, language: str = 'en', conversation_history: Optional[List[Dict[str, Any]]] = None,
+                     documents: Optional[List[Any]] = None) -> str:
+        # The chunks retrieved for the answer are appended to ``documents``
+        # when given, so they can be passed on to get_smart_suggestions
         logger.info(f"[DEBUG] Starting ask_question with question: {question}")
         
         if not self.qa_chain:
@@ -74,66 +189,42 @@ Helpful Answer:"""
             return error_msg
 
         try:
-            logger.info("[DEBUG] Processing question translation...")
-            # Translate non-English questions to English for better retrieval
-            if language != 'en':
-                translated_question = translate_text(question, 'en')
-                logger.info(f"[DEBUG] Translated question to English: {translated_question}")
-            else:
-                translated_question = question
-                logger.info("[DEBUG] No translation needed, using original question")
-
-            # Add conversation history to context if available
-            context = ""
-            if conversation_history:
-                logger.info(f"[DEBUG] Adding conversation history. Found {len(conversation_history)} messages")
-                for msg in conversation_history[-5:]:  # Use last 5 messages as context
-                    role = "User" if msg.get('is_user') else "Assistant"
-                    context += f"{role}: {msg.get('content', '')}\n"
-                logger.debug(f"[DEBUG] Context with history: {context}")
-            else:
-                logger.info("[DEBUG] No conversation history provided")
-
-            # Format the question with context
-            formatted_question = f"{context}\nQuestion: {translated_question}" if context else translated_question
-            logger.debug(f"[DEBUG] Formatted question: {formatted_question}")
+            formatted_question = self._format_question(question, language, conversation_history)
 
             logger.info("[DEBUG] Calling qa_chain...")
             # Get the answer with a timeout
             try:
-                from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
-                import functools
-                
-                # Define a wrapper function to run qa_chain with timeout
-                def run_qa_chain():
-                    return self.qa_chain({"query": formatted_question})
-                
-                # Run with timeout
-                with ThreadPoolExecutor(max_workers=1) as executor:
-                    future = executor.submit(run_qa_chain)
-                    try:
-                        result = future.result(timeout=30)  # 30 second timeout
-                        logger.info("[DEBUG] Successfully got response from qa_chain")
-                    except FutureTimeoutError:
-                        logger.error("[ERROR] qa_chain timed out after 30 seconds")
-                        return "I'm sorry, the request timed out. Please try again with a different question."
-                    except Exception as e:
-                        logger.error(f"[ERROR] Error in qa_chain: {str(e)}", exc_info=True)
-                        return f"I encountered an error while processing your request: {str(e)}"
+                # Run on the shared, bounded LLM pool; the deadline covers queueing too
+                try:
+                    result = self.llm_pool.run(self._answer, formatted_question, timeout=self.answer_timeout)
+                    logger.info("[DEBUG] Successfully got response from qa_chain")
+                except DeadlineExceeded:
+                    logger.error(f"[ERROR] qa_chain timed out after {self.answer_timeout} seconds")
+                    return "I'm sorry, the request timed out. Please try again with a different question."
+                except PoolSaturatedError:
+                    logger.error("[ERROR] LLM pool is saturated, rejecting question")
+                    return self.BUSY_ANSWER
+                except Exception as e:
+                    logger.error(f"[ERROR] Error in qa_chain: {str(e)}", exc_info=True)
+                    return f"I encountered an error while processing your request: {str(e)}"
                 
                 answer = result.get("result", "")
                 logger.info(f"[DEBUG] Raw answer from qa_chain: {answer[:100]}...")  # Log first 100 chars
+                if documents is not None:
+                    documents.extend(result.get("source_documents", []))
+                sources = [self.format_source(doc) for doc in result.get("source_documents", [])]
+                logger.info(f"[DEBUG] Sources: {', '.join(sources) or 'none'}")
                 
                 # Translate the answer back to the user's language if needed
                 if language != 'en':
                     logger.info("[DEBUG] Translating answer...")
-                    answer = translate_text(answer, language)
+                    answer = self.translator.translate(answer, language)
                     logger.debug(f"[DEBUG] Translated answer: {answer[:100]}...")
 
                 # Fallback for out-of-scope queries
-                if not answer or any(phrase in answer.lower() for phrase in ["don't know", "not covered", "no information"]):
+                if self.is_out_of_scope(answer):
                     logger.warning("[WARNING] No relevant information found for the question")
-                    return "Sorry, I couldn't find relevant information in the documents to answer your question. Could you please rephrase or ask something else?"
+                    return self.OUT_OF_SCOPE_ANSWER
 
                 logger.info("[DEBUG] Successfully processed question")
                 return answer
@@ -146,55 +237,115 @@ Helpful Answer:"""
             logger.error(f"[CRITICAL] Unhandled error in ask_question: {str(e)}", exc_info=True)
             return "I encountered an unexpected error. The administrator has been notified."
 
-    def get_smart_suggestions(self, previous_question: str, context: str, language: str = 'en') -> List[str]:
+    def stream_answer(self, question: str, language: str = 'en',
+                      conversation_history: Optional[List[Dict[str, Any]]] = None,
+                      documents: Optional[List[Any]] = None) -> Iterator[str]:
+        """
+        Generate an answer incrementally, yielding text as the LLM produces it.
+
+        Retrieval and the answer cache work exactly as in ``ask_question``; a
+        cached answer is yielded in one piece. English answers are streamed
+        token by token. Other languages are translated as a whole, so they
+        arrive as a single piece once generation has finished. Callers
+        should pass the concatenated text through ``is_out_of_scope`` before
+        storing it. When run on the LLM pool, generation stops early once the
+        task is cancelled.
+
+        Args:
+            question: The user's question
+            language: The language to answer in (default: 'en')
+            conversation_history: Recent messages used as extra context
+            documents: If given, the retrieved chunks are appended to it,
+                ready to pass to ``get_smart_suggestions``
+
+        Yields:
+            str: Successive pieces of the answer
+        """
+        formatted_question = self._format_question(question, language, conversation_history)
+        vector, docs, chunk_ids, answer = self._retrieve(formatted_question)
+        if documents is not None:
+            documents.extend(docs)
+        logger.info(f"[DEBUG] Sources: {', '.join(self.format_source(doc) for doc in docs) or 'none'}")
+
+        if answer is None:
+            prompt = self.qa_prompt.format(
+                context="\n\n".join(doc.page_content for doc in docs),
+                question=formatted_question
+            )
+            parts = []
+            for chunk in self.llm.stream(prompt):
+                if cancelled():
+                    logger.warning("[WARNING] Streaming cancelled, discarding partial answer")
+                    return
+                if not chunk.content:
+                    continue
+                parts.append(chunk.content)
+                if language == 'en':
+                    yield chunk.content
+            answer = "".join(parts)
+            self.answer_cache.store(vector, chunk_ids, answer)
+        elif language == 'en':
+            logger.info("[DEBUG] Answer cache hit")
+            yield answer
+
+        if language != 'en':
+            yield self.translator.translate(answer, language)
+
+    @staticmethod
+    def is_out_of_scope(answer: str) -> bool:
+        """True if the model could not answer from the documents."""
+        return not answer or any(phrase in answer.lower() for phrase in ["don't know", "not covered", "no information"])
+
+    @staticmethod
+    def format_source(document) -> str:
+        """Render a retrieved chunk's provenance as ``file p.N @offset``."""
+        metadata = document.metadata or {}
+        citation = metadata.get("source", "unknown")
+        if metadata.get("page") is not None:
+            citation += f" p.{metadata['page']}"
+        if metadata.get("offset") is not None:
+            citation += f" @{metadata['offset']}"
+        return citation
+
+    def get_smart_suggestions(self, previous_question: str, context: str, language: str = 'en',
+                              documents: Optional[List[Any]] = None) -> List[str]:
         """
         Generate smart follow-up questions based on the previous question and context.
         
+        Suggestions are ranked against the chunks retrieved for the question
+        and looked up in the precomputed suggestion sets, so no translation
+        calls are made.
+        
         Args:
             previous_question: The user's previous question
             context: The context or answer provided
             language: The preferred language for the suggestions
+            documents: Chunks retrieved for the question; fetched again
+                (with the cached query embedding) when omitted
             
         Returns:
             List of suggested follow-up questions
         """
-        suggestions = []
-        
-        # Simple rule-based suggestions
-        if "how" in previous_question.lower():
-            suggestions = [
-                "Can you explain in more detail?",
-                "What are the key points?",
-                "Can you give me an example?"
-            ]
-        elif "what" in previous_question.lower():
-            suggestions = [
-                "What else should I know about this?",
-                "How does this work?",
-                "Can you provide more context?"
-            ]
-        else:
-            suggestions = [
-                "Tell me more about this topic.",
-                "What are the main points?",
-                "Can you explain in simpler terms?"
-            ]
-        
-        # Translate suggestions if needed
-        if language != 'en':
-            suggestions = [translate_text(s, language) for s in suggestions]
-            
-        return suggestions[:3]  # Return max 3 suggestions
+        if documents is None:
+            try:
+                documents = self.retriever.retrieve(previous_question).documents
+            except Exception as e:
+                logger.warning(f"[WARNING] Could not retrieve chunks for suggestions: {str(e)}")
+                documents = []
+
+        ranked = self.suggestion_ranker.rank(previous_question, context, documents)
+        return [self.suggestion_catalog.text(suggestion_id, language)
+                for suggestion_id in ranked[:SUGGESTION_COUNT]]
 
 if __name__ == "__main__":
     # This is a placeholder for testing. In a real scenario, you would pass a populated vector_store.
     # For demonstration, we'll create a dummy vector_store.
-    from langchain_community.embeddings import SentenceTransformerEmbeddings
     from langchain_community.vectorstores import FAISS
+    from embedding_registry import get_embeddings
 
     # Create a dummy vector store
     texts = ["The quick brown fox jumps over the lazy dog.", "Artificial intelligence is a rapidly developing field."]
-    embeddings = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+    embeddings = get_embeddings()
     dummy_vector_store = FAISS.from_texts(texts, embeddings)
 
     # Initialize ChatbotLLM with the dummy vector store
@@ -202,7 +353,8 @@ if __name__ == "__main__":
 
     # Example usage
     question = "What is AI?"
-    answer = chatbot.ask_question(question)
+    documents = []
+    answer = chatbot.ask_question(question, documents=documents)
     print(f"Question: {question}")
     print(f"Answer: {answer}")
 
@@ -211,7 +363,7 @@ if __name__ == "__main__":
     print(f"Question: {question}")
     print(f"Answer: {answer}")
 
-    suggestions = chatbot.get_smart_suggestions("What is AI?", "Some context about AI.")
+    suggestions = chatbot.get_smart_suggestions("What is AI?", "Some context about AI.", documents=documents)
     print(f"Suggestions: {suggestions}")
 
 
@@ -0,0 +1,283 @@
+"""
+Write-behind persistence for chat messages.
+
+Saving a message means one INSERT plus touching ``conversations.updated_at``,
+and with one commit per message every chat line pays for its own fsync. When
+``MESSAGE_WRITE_BEHIND`` is enabled, ``save_message`` hands the row to a
+single background writer thread instead. The thread groups everything that
+arrives within ``MESSAGE_WRITER_FLUSH_MS`` into one transaction and resolves
+each caller's Future with the saved message, including its id. Messages are
+written in submission order, and the queue is drained when the process exits.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import select, update
+
+try:
+    from .user_stats import get_user_stats
+except ImportError:
+    from user_stats import get_user_stats
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_KEY = 'message_writer'
+
+_STOP = object()
+
+
+def _tables(db):
+    return db.metadata.tables['messages'], db.metadata.tables['conversations']
+
+
+def _write_rows(connection, db, rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[int, int]]:
+    """
+    Insert ``rows`` in order and touch their conversations.
+
+    Returns:
+        tuple: ``(saved_messages, owners)`` where ``owners`` maps each touched
+        conversation id to its user id
+    """
+    messages, conversations = _tables(db)
+    saved = []
+    for row in rows:
+        result = connection.execute(messages.insert().values(**row))
+        saved.append({'id': result.inserted_primary_key[0], **row})
+
+    touched: Dict[int, datetime] = {}
+    for row in rows:
+        touched[row['conversation_id']] = row['created_at']
+    for conversation_id, updated_at in touched.items():
+        connection.execute(
+            update(conversations).where(conversations.c.id == conversation_id).values(updated_at=updated_at)
+        )
+    owners = dict(connection.execute(
+        select(conversations.c.id, conversations.c.user_id).where(conversations.c.id.in_(list(touched)))
+    ).all())
+    return saved, owners
+
+
+def _record_stats(app, saved: List[Dict[str, Any]], owners: Dict[int, int]) -> None:
+    """
+    Fold committed messages into the per-user stats cache.
+
+    The messages are already committed, so a failure here must not fail the
+    save: it is logged and the owners' entries are dropped instead, to be
+    recomputed on next use.
+    """
+    by_conversation: Dict[int, List[Dict[str, Any]]] = {}
+    for message in saved:
+        by_conversation.setdefault(message['conversation_id'], []).append(message)
+    try:
+        cache = get_user_stats(app)
+        for conversation_id, conversation_messages in by_conversation.items():
+            if conversation_id in owners:
+                cache.record_messages(owners[conversation_id], conversation_id, conversation_messages)
+    except Exception as e:
+        logger.error(f"Failed to update the stats cache for {len(saved)} messages: {str(e)}", exc_info=True)
+        try:
+            for user_id in set(owners.values()):
+                cache.invalidate(user_id)
+        except Exception:
+            pass
+
+
+def _as_dict(saved: Dict[str, Any]) -> Dict[str, Any]:
+    # Same shape as Message.to_dict()
+    return {**saved, 'created_at': saved['created_at'].isoformat()}
+
+
+class MessageWriter:
+    """
+    Background thread that persists chat messages in small batched transactions.
+
+    Args:
+        app: Flask application whose database is written to
+        flush_interval: Seconds to keep collecting messages after the first one
+            of a batch arrives
+        max_batch: Largest number of messages written in one transaction
+    """
+
+    def __init__(self, app, flush_interval: float = 0.005, max_batch: int = 256):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.batches = 0
+        self.messages_written = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='message-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, conversation_id: int, content: str, is_user: bool = True,
+               language: str = 'en', tokens: int = 0) -> Future:
+        """
+        Queue a message for writing.
+
+        Returns:
+            Future: Resolves to the saved message as a dictionary
+
+        Raises:
+            RuntimeError: If the writer has been closed
+        """
+        future: Future = Future()
+        row = {
+            'conversation_id': conversation_id,
+            'content': content,
+            'is_user': is_user,
+            'language': language,
+            'tokens': tokens,
+            'created_at': datetime.utcnow(),
+        }
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("Message writer is closed")
+            self._queue.put((row, future))
+        return future
+
+    def _collect(self, first) -> list:
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = self._collect(item)
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                # The thread must survive, and nobody may be left waiting on a Future
+                logger.error(f"Message writer failed on a batch of {len(batch)} messages: {str(e)}", exc_info=True)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _write_batch(self, batch) -> None:
+        rows = [row for row, _ in batch]
+        try:
+            with self.app.app_context():
+                db = current_app.extensions['sqlalchemy']
+                with db.engine.begin() as connection:
+                    saved, owners = _write_rows(connection, db, rows)
+        except Exception as e:
+            # Retry one by one so a single bad row does not fail its neighbours
+            logger.warning(f"Batch of {len(rows)} messages failed, retrying individually: {str(e)}")
+            self._write_individually(batch)
+            return
+
+        _record_stats(self.app, saved, owners)
+        self.batches += 1
+        self.messages_written += len(saved)
+        for (_, future), message in zip(batch, saved):
+            future.set_result(_as_dict(message))
+
+    def _write_individually(self, batch) -> None:
+        with self.app.app_context():
+            db = current_app.extensions['sqlalchemy']
+            for row, future in batch:
+                try:
+                    with db.engine.begin() as connection:
+                        saved, owners = _write_rows(connection, db, [row])
+                except Exception as e:
+                    logger.error(f"Failed to write message for conversation {row['conversation_id']}: {str(e)}")
+                    future.set_exception(e)
+                    continue
+                _record_stats(self.app, saved, owners)
+                message = saved[0]
+                self.batches += 1
+                self.messages_written += 1
+                future.set_result(_as_dict(message))
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Stop accepting messages and wait until everything queued is written."""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queued': self._queue.qsize(),
+            'batches': self.batches,
+            'messages_written': self.messages_written,
+            'avg_batch': self.messages_written / self.batches if self.batches else 0.0,
+        }
+
+
+def init_message_writer(app) -> Optional[MessageWriter]:
+    """Start the app's write-behind writer if ``MESSAGE_WRITE_BEHIND`` is enabled."""
+    if not app.config.get('MESSAGE_WRITE_BEHIND'):
+        return None
+    writer = MessageWriter(
+        app,
+        flush_interval=app.config.get('MESSAGE_WRITER_FLUSH_MS', 5) / 1000.0,
+        max_batch=app.config.get('MESSAGE_WRITER_MAX_BATCH', 256)
+    )
+    app.extensions[EXTENSION_KEY] = writer
+    return writer
+
+
+def get_message_writer(app=None) -> Optional[MessageWriter]:
+    app = app or current_app
+    return app.extensions.get(EXTENSION_KEY)
+
+
+def save_message(conversation_id: int, content: str, is_user: bool = True,
+                 language: str = 'en', tokens: int = 0) -> Dict[str, Any]:
+    """
+    Save a message and bump its conversation's ``updated_at``.
+
+    Goes through the write-behind writer when it is enabled and blocks until
+    the batch holding the message is committed; otherwise the message is
+    committed right away on the current session.
+
+    Returns:
+        dict: The saved message, shaped like ``Message.to_dict()``
+    """
+    writer = get_message_writer()
+    if writer is not None:
+        return writer.submit(conversation_id, content, is_user, language, tokens).result(
+            timeout=current_app.config.get('MESSAGE_WRITER_TIMEOUT', 30)
+        )
+
+    db = current_app.extensions['sqlalchemy']
+    row = {
+        'conversation_id': conversation_id,
+        'content': content,
+        'is_user': is_user,
+        'language': language,
+        'tokens': tokens,
+        'created_at': datetime.utcnow(),
+    }
+    try:
+        saved, owners = _write_rows(db.session.connection(), db, [row])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    _record_stats(current_app._get_current_object(), saved, owners)
+    return _as_dict(saved[0])
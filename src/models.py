@@ -1,7 +1,11 @@
 from datetime import datetime
+from flask import has_app_context
 from flask_login import UserMixin
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
 from werkzeug.security import generate_password_hash, check_password_hash
 from .extensions import db
+from .user_stats import get_user_stats
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -35,6 +39,10 @@ class User(UserMixin, db.Model):
 
 class Conversation(db.Model):
     __tablename__ = 'conversations'
+    __table_args__ = (
+        # Keyset pagination of a user's conversation list
+        db.Index('ix_conversations_user_archived_updated', 'user_id', 'is_archived', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
@@ -42,23 +50,94 @@ class Conversation(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     is_archived = db.Column(db.Boolean, default=False, index=True)
-    messages = db.relationship('Message', backref='conversation', lazy=True, cascade='all, delete-orphan', order_by='Message.created_at.asc()')
+    messages = db.relationship('Message', backref='conversation', lazy='dynamic', cascade='all, delete-orphan', order_by='Message.created_at.asc()')
     
-    def to_dict(self):
+    COUNT_BATCH_SIZE = 500
+    
+    def to_dict(self, message_count=None):
+        """
+        Serialize the conversation.
+        
+        Args:
+            message_count: Precomputed number of messages (see message_counts);
+                when omitted it is fetched with a COUNT query
+        """
+        if message_count is None:
+            message_count = Conversation.message_counts([self.id]).get(self.id, 0)
         return {
             'id': self.id,
             'title': self.title,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
-            'message_count': len(self.messages)
+            'message_count': message_count
         }
     
+    @staticmethod
+    def message_counts(conversation_ids):
+        """
+        Count messages for many conversations with grouped queries.
+        
+        Counts come from the conversation_id index; ids are sent in batches of
+        COUNT_BATCH_SIZE to stay below SQLite's bound-parameter limit.
+        
+        Returns:
+            dict: conversation id -> message count; conversations without
+            messages are absent
+        """
+        conversation_ids = list(conversation_ids)
+        counts = {}
+        for start in range(0, len(conversation_ids), Conversation.COUNT_BATCH_SIZE):
+            batch = conversation_ids[start:start + Conversation.COUNT_BATCH_SIZE]
+            rows = db.session.query(Message.conversation_id, db.func.count(Message.id))\
+                .filter(Message.conversation_id.in_(batch))\
+                .group_by(Message.conversation_id).all()
+            counts.update(rows)
+        return counts
+    
+    @staticmethod
+    def activity_rows(user_id):
+        """
+        Per-conversation message totals for one user, in a single query.
+        
+        Conversations are outer joined to their messages and grouped by id,
+        which walks the conversation_id index in order without a temporary
+        B-tree; conversations without messages get a count of 0 and NULL
+        totals.
+        
+        Returns:
+            list: Rows with id, title, is_archived, message_count, tokens,
+            last_activity and last_message_id
+        """
+        return db.session.query(
+            Conversation.id,
+            Conversation.title,
+            Conversation.is_archived,
+            db.func.count(Message.id).label('message_count'),
+            db.func.coalesce(db.func.sum(Message.tokens), 0).label('tokens'),
+            db.func.max(Message.created_at).label('last_activity'),
+            db.func.max(Message.id).label('last_message_id')
+        ).outerjoin(
+            Message, Message.conversation_id == Conversation.id
+        ).filter(
+            Conversation.user_id == user_id
+        ).group_by(Conversation.id).all()
+    
+    @staticmethod
+    def to_dict_list(conversations):
+        """Serialize a page of conversations with a single message-count query."""
+        counts = Conversation.message_counts([conv.id for conv in conversations])
+        return [conv.to_dict(message_count=counts.get(conv.id, 0)) for conv in conversations]
+    
     def __repr__(self):
         return f'<Conversation {self.id} - {self.title}>'
 
 
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        # Keyset pagination of a conversation's messages
+        db.Index('ix_messages_conversation_created', 'conversation_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), nullable=False, index=True)
@@ -81,3 +160,42 @@ class Message(db.Model):
     
     def __repr__(self):
         return f'<Message {self.id} - {self.content[:50]}>'
+
+
+# Conversation inserts, edits and deletes, and message edits and deletes, drop
+# the owner's cached stats once the change is committed (message inserts are
+# folded in by message_writer)
+STATS_CHANGED_USERS = 'stats_changed_users'
+
+def _mark_stats_changed(target, user_id):
+    session = object_session(target)
+    if session is not None and user_id is not None:
+        session.info.setdefault(STATS_CHANGED_USERS, set()).add(user_id)
+
+@event.listens_for(Conversation, 'after_insert')
+@event.listens_for(Conversation, 'after_update')
+@event.listens_for(Conversation, 'after_delete')
+def _track_stats_change(mapper, connection, target):
+    _mark_stats_changed(target, target.user_id)
+
+@event.listens_for(Message, 'after_update')
+@event.listens_for(Message, 'after_delete')
+def _track_message_stats_change(mapper, connection, target):
+    # Look the owner up on the flush's connection; lazy-loading
+    # target.conversation is not allowed inside a flush
+    user_id = connection.execute(
+        select(Conversation.user_id).where(Conversation.id == target.conversation_id)
+    ).scalar()
+    _mark_stats_changed(target, user_id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_stats(session):
+    user_ids = session.info.pop(STATS_CHANGED_USERS, None)
+    if user_ids and has_app_context():
+        cache = get_user_stats()
+        for user_id in user_ids:
+            cache.invalidate(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_stats_changes(session):
+    session.info.pop(STATS_CHANGED_USERS, None)
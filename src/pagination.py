@@ -0,0 +1,93 @@
+"""
+Opaque keyset (cursor) pagination helpers.
+
+A cursor encodes the sort key of the last row of a page, e.g.
+``(updated_at, id)``; the next page is every row strictly after that key in
+the sort order. Unlike OFFSET, the database seeks straight to the key through
+an index, so deep pages cost the same as the first one. ``has_more`` comes
+from fetching one extra row instead of a separate COUNT query.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor that was not produced by encode_cursor."""
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and 'dt' in value:
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode a row's sort key as an opaque, URL-safe cursor string."""
+    payload = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Args:
+        cursor: The cursor string sent by the client
+        size: Number of sort-key values the cursor must hold
+
+    Raises:
+        InvalidCursor: If the cursor is malformed or has the wrong shape
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError("unexpected cursor shape")
+        return [_decode_value(value) for value in values]
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}") from e
+
+
+def paginate(query, columns: Sequence, limit: int, cursor: Optional[str] = None,
+             descending: bool = True) -> Tuple[list, Optional[str]]:
+    """
+    Fetch one page of ``query`` ordered by ``columns``.
+
+    Args:
+        query: SQLAlchemy query returning model instances
+        columns: Model columns forming a unique sort key, e.g.
+            ``(Conversation.updated_at, Conversation.id)``
+        limit: Page size
+        cursor: Cursor returned with the previous page, or None for the first
+        descending: Sort newest first (default) or oldest first
+
+    Returns:
+        tuple: ``(rows, next_cursor)``; ``next_cursor`` is None on the last page
+
+    Raises:
+        InvalidCursor: If ``cursor`` cannot be decoded
+    """
+    key = tuple_(*columns)
+    if cursor:
+        values = decode_cursor(cursor, len(columns))
+        query = query.filter(key < tuple_(*values) if descending else key > tuple_(*values))
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in columns])
+    return rows, next_cursor
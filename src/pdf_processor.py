@@ -3,47 +3,59 @@
 import os
 import fitz  # PyMuPDF
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import SentenceTransformerEmbeddings
-from langchain_community.vectorstores import FAISS
+try:
+    from .embedding_registry import get_embeddings
+except ImportError:
+    from embedding_registry import get_embeddings
+try:
+    from .document_processor import EmbeddingStage, split_segments, SPLIT_BLOCK_CHUNKS
+    from . import vector_index
+except ImportError:
+    from document_processor import EmbeddingStage, split_segments, SPLIT_BLOCK_CHUNKS
+    import vector_index
 
 class PDFProcessor:
-    def __init__(self, pdf_folder="./pdf_docs/"):
+    def __init__(self, pdf_folder="./pdf_docs/", embedding_batch_size=256,
+                 index_type=vector_index.AUTO, index_params=None):
         self.pdf_folder = pdf_folder
+        self.embedding_batch_size = embedding_batch_size
+        self.index_type = index_type
+        self.index_params = index_params
+        self.chunk_size = 1000
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
+            chunk_size=self.chunk_size,
             chunk_overlap=200,
             length_function=len,
         )
-        self.embeddings = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+        self.embeddings = get_embeddings()
         self.vector_store = None
 
-    def _extract_text_from_pdf(self, pdf_path):
-        text = ""
+    def _extract_pages_from_pdf(self, pdf_path):
         try:
-            document = fitz.open(pdf_path)
-            for page_num in range(len(document)):
-                page = document.load_page(page_num)
-                text += page.get_text()
+            with fitz.open(pdf_path) as document:
+                for page_num in range(len(document)):
+                    page = document.load_page(page_num)
+                    yield page_num + 1, page.get_text()
         except Exception as e:
             print(f"Error extracting text from {pdf_path}: {e}")
-        return text
 
     def process_pdfs(self):
-        all_chunks = []
         if not os.path.exists(self.pdf_folder):
             print(f"PDF folder '{self.pdf_folder}' does not exist.")
             return
 
+        stage = EmbeddingStage(self.embeddings, self.embedding_batch_size)
         for filename in os.listdir(self.pdf_folder):
             if filename.endswith(".pdf"):
                 pdf_path = os.path.join(self.pdf_folder, filename)
                 print(f"Processing {pdf_path}...")
-                text = self._extract_text_from_pdf(pdf_path)
-                chunks = self.text_splitter.split_text(text)
-                all_chunks.extend(chunks)
+                pages = self._extract_pages_from_pdf(pdf_path)
+                for chunk, page, offset in split_segments(self.text_splitter, pages, self.chunk_size * SPLIT_BLOCK_CHUNKS):
+                    stage.add([chunk], [{"source": filename, "page": page, "offset": offset}])
         
-        if all_chunks:
-            self.vector_store = FAISS.from_texts(all_chunks, self.embeddings)
+        self.vector_store = stage.flush()
+        if self.vector_store:
+            vector_index.apply_index_type(self.vector_store, self.index_type, self.index_params)
             print("PDFs processed and embeddings generated. FAISS index created.")
         else:
             print("No PDF content to process.")
@@ -6,6 +6,11 @@ import os
 import json
 from datetime import datetime
 from .models import User, Conversation, Message, db
+from .embedding_registry import embedding_memory_usage
+from .worker_pool import pool_stats
+from .hybrid_retrieval import retrieval_stats
+from .message_writer import get_message_writer
+from .user_stats import get_user_stats
 
 # Create blueprints with unique names to prevent duplicate registration
 api_bp = Blueprint('api_bp', __name__)
@@ -179,13 +184,7 @@ def get_chat_history():
     conversations = Conversation.query.filter_by(user_id=current_user.id, is_archived=False)\
         .order_by(Conversation.updated_at.desc()).all()
     
-    return jsonify([{
-        'id': conv.id,
-        'title': conv.title,
-        'created_at': conv.created_at.isoformat(),
-        'updated_at': conv.updated_at.isoformat(),
-        'message_count': len(conv.messages)
-    } for conv in conversations])
+    return jsonify(Conversation.to_dict_list(conversations))
 
 @api_bp.route('/chat/new', methods=['POST'])
 @login_required
@@ -307,12 +306,18 @@ def list_users():
 # System Routes
 @api_bp.route('/system/status')
 def system_status():
+    writer = get_message_writer()
     return jsonify({
         'status': 'ok',
         'time': datetime.utcnow().isoformat(),
         'users': User.query.count(),
         'conversations': Conversation.query.count(),
-        'messages': Message.query.count()
+        'messages': Message.query.count(),
+        'embedding_models': embedding_memory_usage(),
+        'worker_pools': pool_stats(),
+        'retrieval': retrieval_stats(),
+        'message_writer': writer.stats() if writer else None,
+        'user_stats_cache': get_user_stats().stats()
     })
 
 # Test Chatbot Endpoint
@@ -0,0 +1,199 @@
+"""
+SQLite FTS5 full-text index over message content.
+
+The ``messages_fts`` table is an external-content FTS5 index over
+``messages.content``: it stores only the inverted index, and triggers keep it
+in sync on insert, update and delete. Every search helper returns None when
+the index is unavailable (non-SQLite database, SQLite built without FTS5, or a
+query with no searchable terms) so callers can fall back to LIKE.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+FTS_TABLE = 'messages_fts'
+
+# Matches beyond this are not counted; totals at the cap are reported as estimates
+TOTAL_COUNT_CAP = 1000
+
+SNIPPET_TOKENS = 12
+
+_CREATE_STATEMENTS = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        content,
+        content='messages',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON messages BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON messages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+    END""",
+]
+
+# Engine URL -> whether the FTS table exists there
+_enabled: Dict[str, bool] = {}
+
+
+def ensure_message_index(engine) -> bool:
+    """
+    Create the FTS table and its sync triggers if they do not exist yet.
+
+    Existing messages are indexed once, when the table is first created.
+
+    Returns:
+        bool: True if full-text search is available on this engine
+    """
+    if engine.dialect.name != 'sqlite':
+        _enabled[str(engine.url)] = False
+        return False
+
+    with engine.begin() as conn:
+        if not conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar():
+            _enabled[str(engine.url)] = False
+            return False
+
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': FTS_TABLE}
+        ).first() is not None
+        for statement in _CREATE_STATEMENTS:
+            conn.execute(text(statement))
+        if not exists:
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+    _enabled[str(engine.url)] = True
+    return True
+
+
+def is_enabled(session) -> bool:
+    engine = session.get_bind()
+    key = str(engine.url)
+    if key not in _enabled:
+        if engine.dialect.name != 'sqlite':
+            _enabled[key] = False
+        else:
+            _enabled[key] = session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': FTS_TABLE}
+            ).first() is not None
+    return _enabled[key]
+
+
+def build_match_query(query: str) -> Optional[str]:
+    """
+    Turn free text into a safe FTS5 MATCH expression.
+
+    Every word is quoted, so FTS5 operators in user input are treated as plain
+    text. All words must match, and the last one also matches as a prefix to
+    support search-as-you-type.
+
+    Returns:
+        str: The MATCH expression, or None if the query has no searchable words
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_messages(session, user_id: int, query: str, limit: int = 20,
+                    after: Optional[Tuple[float, int]] = None) -> Optional[List[Tuple[int, str, float]]]:
+    """
+    Rank a user's messages against ``query`` with BM25.
+
+    Args:
+        session: SQLAlchemy session
+        user_id: Owner of the conversations to search
+        query: Free-text query
+        limit: Maximum number of hits to return
+        after: ``(rank, message_id)`` of the last hit of the previous page
+
+    Returns:
+        list: ``(message_id, snippet, rank)`` hits ordered best first, or None
+        if full-text search is unavailable
+    """
+    match = build_match_query(query)
+    if match is None or not is_enabled(session):
+        return None
+
+    # Ranking in a subquery lets the keyset condition filter on the computed
+    # rank; SQLite does not allow bm25() in a WHERE clause.
+    params = {'match': match, 'user_id': user_id, 'limit': limit}
+    keyset = ''
+    if after is not None:
+        keyset = 'WHERE (rank, id) > (:rank_after, :id_after)'
+        params['rank_after'], params['id_after'] = after
+    hits = session.execute(text(f"""
+        SELECT id, snippet, rank FROM (
+            SELECT m.id AS id,
+                   snippet({FTS_TABLE}, 0, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}) AS snippet,
+                   bm25({FTS_TABLE}) AS rank
+            FROM {FTS_TABLE}
+            JOIN messages m ON m.id = {FTS_TABLE}.rowid
+            JOIN conversations c ON c.id = m.conversation_id
+            WHERE {FTS_TABLE} MATCH :match AND c.user_id = :user_id
+        )
+        {keyset}
+        ORDER BY rank, id
+        LIMIT :limit
+    """), params).all()
+    return [tuple(hit) for hit in hits]
+
+
+def count_matches(session, user_id: int, query: str) -> Optional[Tuple[int, bool]]:
+    """
+    Count a user's messages matching ``query``, stopping at TOTAL_COUNT_CAP.
+
+    Returns:
+        tuple: ``(total, total_is_estimate)``, or None if full-text search is
+        unavailable
+    """
+    match = build_match_query(query)
+    if match is None or not is_enabled(session):
+        return None
+
+    total = session.execute(text(f"""
+        SELECT count(*) FROM (
+            SELECT 1
+            FROM {FTS_TABLE}
+            JOIN messages m ON m.id = {FTS_TABLE}.rowid
+            JOIN conversations c ON c.id = m.conversation_id
+            WHERE {FTS_TABLE} MATCH :match AND c.user_id = :user_id
+            LIMIT :cap
+        )
+    """), {'match': match, 'user_id': user_id, 'cap': TOTAL_COUNT_CAP}).scalar()
+    return total, total >= TOTAL_COUNT_CAP
+
+
+def matching_conversation_ids(session, user_id: int, query: str,
+                              limit: int = TOTAL_COUNT_CAP) -> Optional[List[int]]:
+    """
+    Ids of a user's conversations with at least one message matching ``query``.
+
+    Returns:
+        list: Up to ``limit`` conversation ids, or None if full-text search
+        is unavailable
+    """
+    match = build_match_query(query)
+    if match is None or not is_enabled(session):
+        return None
+
+    rows = session.execute(text(f"""
+        SELECT DISTINCT m.conversation_id
+        FROM {FTS_TABLE}
+        JOIN messages m ON m.id = {FTS_TABLE}.rowid
+        JOIN conversations c ON c.id = m.conversation_id
+        WHERE {FTS_TABLE} MATCH :match AND c.user_id = :user_id
+        LIMIT :limit
+    """), {'match': match, 'user_id': user_id, 'limit': limit}).all()
+    return [row[0] for row in rows]
@@ -0,0 +1,196 @@
+# suggestions.py
+
+import abc
+import json
+import logging
+import os
+import re
+from typing import Dict, Any, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SUGGESTION_SETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "suggestion_sets.json")
+DEFAULT_RANKER = "chunks"
+SUGGESTION_COUNT = 3
+
+# English source text of every follow-up suggestion, keyed by a stable id.
+# Translations live in suggestion_sets.json (see build_suggestions.py).
+SUGGESTION_TEMPLATES: Dict[str, str] = {
+    "details": "Can you explain in more detail?",
+    "key_points": "What are the key points?",
+    "example": "Can you give me an example?",
+    "what_else": "What else should I know about this?",
+    "how_it_works": "How does this work?",
+    "more_context": "Can you provide more context?",
+    "tell_more": "Tell me more about this topic.",
+    "main_points": "What are the main points?",
+    "simpler": "Can you explain in simpler terms?",
+    "steps": "What are the steps involved?",
+    "figures": "What are the exact figures or values?",
+    "requirements": "Are there any requirements or prerequisites?",
+    "warnings": "Are there any warnings or precautions?",
+    "compare": "How does this compare with the alternatives?",
+    "sources": "Which documents cover this in more depth?",
+}
+
+
+class SuggestionCatalog:
+    """
+    Follow-up suggestions in every supported language, loaded once from disk.
+
+    Lookups never translate: a language or id missing from the file falls
+    back to the English template.
+    """
+
+    def __init__(self, sets: Optional[Dict[str, Dict[str, str]]] = None):
+        self.sets = {'en': dict(SUGGESTION_TEMPLATES)}
+        for language, texts in (sets or {}).items():
+            self.sets.setdefault(language, {}).update(texts)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_SUGGESTION_SETS) -> "SuggestionCatalog":
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return cls(json.load(f))
+        logger.warning(f"Suggestion sets not found at {path}; suggestions will be in English")
+        return cls()
+
+    @property
+    def languages(self) -> List[str]:
+        return sorted(self.sets)
+
+    def text(self, suggestion_id: str, language: str = 'en') -> str:
+        texts = self.sets.get(language) or self.sets['en']
+        return texts.get(suggestion_id) or SUGGESTION_TEMPLATES[suggestion_id]
+
+
+def build_suggestion_sets(translator, languages: Sequence[str]) -> Dict[str, Dict[str, str]]:
+    """
+    Translate every template into ``languages``, one batch per language.
+
+    Args:
+        translator: A translations.TranslationService
+        languages: Target language codes; 'en' is skipped
+
+    Returns:
+        dict: ``{language: {suggestion_id: text}}``
+    """
+    ids = list(SUGGESTION_TEMPLATES)
+    sets = {}
+    for language in languages:
+        if language == 'en':
+            continue
+        texts = translator.translate_many([SUGGESTION_TEMPLATES[i] for i in ids], language, 'en')
+        sets[language] = dict(zip(ids, texts))
+    return sets
+
+
+class SuggestionRanker(abc.ABC):
+    """Orders suggestion ids by how useful they are as a follow-up."""
+
+    name = "base"
+
+    @abc.abstractmethod
+    def rank(self, question: str, answer: str, documents: Sequence[Any]) -> List[str]:
+        """
+        Args:
+            question: The question that was just answered
+            answer: The answer given
+            documents: Chunks retrieved for the question, best first
+
+        Returns:
+            list: Suggestion ids, most relevant first
+        """
+
+
+class KeywordRanker(SuggestionRanker):
+    """The original rule: pick a fixed set by whether the question says "how" or "what"."""
+
+    name = "keywords"
+
+    def rank(self, question: str, answer: str, documents: Sequence[Any]) -> List[str]:
+        if "how" in question.lower():
+            return ["details", "key_points", "example"]
+        if "what" in question.lower():
+            return ["what_else", "how_it_works", "more_context"]
+        return ["tell_more", "main_points", "simpler"]
+
+
+class ChunkCueRanker(SuggestionRanker):
+    """
+    Score suggestions by cues found in the retrieved chunks.
+
+    Each suggestion has a pattern describing content it can follow up on
+    (numbered steps, warnings, figures, examples, ...). Matches are counted
+    per chunk and weighted by the chunk's retrieval rank, so the best chunk
+    counts most. A suggestion whose cue already appears in the question is
+    skipped, since the user asked for exactly that. Generic suggestions have
+    small base scores so three are always returned.
+    """
+
+    name = "chunks"
+
+    CUES = {
+        "steps": re.compile(r"\bsteps?\b|\bfirst(ly)?\b|\bnext\b|\bthen\b|^\s*\d+[.)]\s", re.I | re.M),
+        "warnings": re.compile(r"\bwarning\b|\bcaution\b|\bdanger\b|\bdo not\b|\bnever\b|\bavoid\b", re.I),
+        "figures": re.compile(r"\b\d+(?:[.,]\d+)?\s?(?:%|mm|cm|km|kg|mg|ml|psi|bar|kw|v|a|hz|°[cf]?|hours?|minutes?|days?)\b", re.I),
+        "requirements": re.compile(r"\bmust\b|\brequire[ds]?\b|\brequirements?\b|\bprerequisites?\b|\bmandatory\b", re.I),
+        "example": re.compile(r"\bfor example\b|\bfor instance\b|\be\.g\.|\bsuch as\b", re.I),
+        "compare": re.compile(r"\bcompared?\b|\bversus\b|\bvs\.?\b|\balternatives?\b|\binstead of\b|\bwhereas\b", re.I),
+        "key_points": re.compile(r"^\s*(?:[-•*]|\d+[.)])\s", re.M),
+        "how_it_works": re.compile(r"\bworks?\b|\bmechanism\b|\bprocess\b|\boperates?\b|\bprinciple\b", re.I),
+    }
+
+    # Asking for these in the question means the answer already covers them
+    QUESTION_CUES = {
+        "steps": re.compile(r"\bsteps?\b|\bhow (?:do|to|can)\b", re.I),
+        "example": re.compile(r"\bexamples?\b", re.I),
+        "compare": re.compile(r"\bcompare|\bdifference\b|\bversus\b|\bvs\.?\b", re.I),
+        "warnings": re.compile(r"\bwarnings?\b|\bsafe(?:ty)?\b|\bprecautions?\b", re.I),
+        "how_it_works": re.compile(r"\bhow does\b|\bhow do\b", re.I),
+    }
+
+    BASE_SCORES = {
+        "details": 0.3,
+        "simpler": 0.2,
+        "tell_more": 0.1,
+    }
+
+    # Counting more matches than this per chunk only rewards long chunks
+    MAX_MATCHES_PER_CHUNK = 3
+
+    def rank(self, question: str, answer: str, documents: Sequence[Any]) -> List[str]:
+        scores = dict(self.BASE_SCORES)
+        for position, document in enumerate(documents):
+            text = getattr(document, "page_content", "") or ""
+            weight = 1.0 / (position + 1)
+            for suggestion_id, pattern in self.CUES.items():
+                matches = len(pattern.findall(text))
+                if matches:
+                    scores[suggestion_id] = scores.get(suggestion_id, 0.0) + \
+                        weight * min(matches, self.MAX_MATCHES_PER_CHUNK)
+
+        sources = {(getattr(document, "metadata", None) or {}).get("source") for document in documents}
+        sources.discard(None)
+        if len(sources) > 1:
+            scores["sources"] = 0.5 * (len(sources) - 1)
+
+        for suggestion_id, pattern in self.QUESTION_CUES.items():
+            if pattern.search(question):
+                scores.pop(suggestion_id, None)
+
+        order = list(SUGGESTION_TEMPLATES)
+        return sorted(scores, key=lambda suggestion_id: (-scores[suggestion_id], order.index(suggestion_id)))
+
+
+RANKERS = {
+    KeywordRanker.name: KeywordRanker,
+    ChunkCueRanker.name: ChunkCueRanker,
+}
+
+
+def get_ranker(name: str = DEFAULT_RANKER) -> SuggestionRanker:
+    ranker_class = RANKERS.get(name)
+    if ranker_class is None:
+        raise ValueError(f"Unknown suggestion ranker: {name}")
+    return ranker_class()
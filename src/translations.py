@@ -1,25 +1,278 @@
-from deep_translator import GoogleTranslator
+# translations.py
+
+import abc
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = "google"
+DEFAULT_CACHE_SIZE = 4096
+
+# Google Translate rejects requests longer than 5000 characters
+GOOGLE_MAX_CHARS = 4500
+# Joins batched strings into one request; split back apart after translation
+BATCH_SEPARATOR = "\n\n"
+
+
+class TranslationBackend(abc.ABC):
+    """Translates a batch of strings from one language to another."""
+
+    name = "base"
+
+    @abc.abstractmethod
+    def translate_batch(self, texts: Sequence[str], dest_lang: str, src_lang: str = 'auto') -> List[str]:
+        """
+        Translate ``texts`` in as few round trips as the backend allows.
+
+        Returns:
+            list: One translation per input, in order
+
+        Raises:
+            Exception: Any backend failure; the service falls back to the originals
+        """
+
+
+class GoogleBackend(TranslationBackend):
+    """
+    Google Translate through deep_translator.
+
+    One ``GoogleTranslator`` is kept per language pair. Short strings are
+    joined with a blank line and sent as one request, up to GOOGLE_MAX_CHARS
+    per request; if the reply does not split back into the same number of
+    pieces, that group is translated one string at a time instead.
+    """
+
+    name = "google"
+
+    def __init__(self):
+        self._translators: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    def _translator(self, src_lang: str, dest_lang: str):
+        key = (src_lang, dest_lang)
+        with self._lock:
+            translator = self._translators.get(key)
+            if translator is None:
+                from deep_translator import GoogleTranslator
+                translator = GoogleTranslator(source=src_lang, target=dest_lang)
+                self._translators[key] = translator
+        return translator
+
+    @staticmethod
+    def _groups(texts: Sequence[str]) -> List[List[int]]:
+        groups, current, size = [], [], 0
+        for i, text in enumerate(texts):
+            alone = BATCH_SEPARATOR in text or len(text) > GOOGLE_MAX_CHARS
+            if current and (alone or size + len(text) + len(BATCH_SEPARATOR) > GOOGLE_MAX_CHARS):
+                groups.append(current)
+                current, size = [], 0
+            if alone:
+                groups.append([i])
+                continue
+            current.append(i)
+            size += len(text) + len(BATCH_SEPARATOR)
+        if current:
+            groups.append(current)
+        return groups
+
+    def translate_batch(self, texts: Sequence[str], dest_lang: str, src_lang: str = 'auto') -> List[str]:
+        translator = self._translator(src_lang, dest_lang)
+        results: List[str] = list(texts)
+        for group in self._groups(texts):
+            if len(group) == 1:
+                results[group[0]] = translator.translate(texts[group[0]])
+                continue
+            joined = translator.translate(BATCH_SEPARATOR.join(texts[i] for i in group))
+            pieces = [piece.strip() for piece in (joined or "").split(BATCH_SEPARATOR)]
+            if len(pieces) != len(group):
+                pieces = [translator.translate(texts[i]) for i in group]
+            for i, piece in zip(group, pieces):
+                results[i] = piece
+        return results
+
+
+class OfflineBackend(TranslationBackend):
+    """
+    Local stand-in that never touches the network, for tests and offline use.
+
+    Each string comes back prefixed with the target language, e.g.
+    ``[es] Hello``, so translated output is easy to spot.
+    """
+
+    name = "offline"
+
+    def __init__(self):
+        self.calls = 0
+
+    def translate_batch(self, texts: Sequence[str], dest_lang: str, src_lang: str = 'auto') -> List[str]:
+        self.calls += 1
+        return [f"[{dest_lang}] {text}" for text in texts]
+
+
+BACKENDS = {
+    GoogleBackend.name: GoogleBackend,
+    OfflineBackend.name: OfflineBackend,
+}
+
+
+class TranslationService:
+    """
+    Cached, batched front end to a translation backend.
+
+    Translations are kept in an LRU keyed by ``(text, src_lang, dest_lang)``;
+    only the strings missing from it are sent to the backend, deduplicated
+    and in a single batch. Failed translations return the original text and
+    are not cached.
+    """
+
+    def __init__(self, backend: Optional[TranslationBackend] = None, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.backend = backend or GoogleBackend()
+        self.cache_size = max(0, int(cache_size))
+        self.hits = 0
+        self.misses = 0
+        self.backend_calls = 0
+        self._cache: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cache_get(self, key: Tuple[str, str, str]) -> Optional[str]:
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _cache_put(self, key: Tuple[str, str, str], value: str) -> None:
+        if self.cache_size == 0:
+            return
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def translate_many(self, texts: Sequence[str], dest_lang: str = 'en', src_lang: str = 'auto') -> List[str]:
+        """
+        Translate several strings with at most one backend call.
+
+        Args:
+            texts: Strings to translate; empty or non-string items pass through
+            dest_lang: The target language code
+            src_lang: The source language code (default: 'auto')
+
+        Returns:
+            list: The translations, or the originals where translation failed
+        """
+        results = list(texts)
+        missing: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            if not text or not isinstance(text, str):
+                continue
+            cached = self._cache_get((text, src_lang, dest_lang))
+            if cached is not None:
+                results[i] = cached
+            else:
+                missing.setdefault(text, []).append(i)
+
+        if not missing:
+            return results
+
+        pending = list(missing)
+        try:
+            self.backend_calls += 1
+            translated = self.backend.translate_batch(pending, dest_lang, src_lang)
+        except Exception as e:
+            logger.warning(f"Translation error: {e}")
+            return results
+
+        for text, translation in zip(pending, translated):
+            if not translation:
+                continue
+            self._cache_put((text, src_lang, dest_lang), translation)
+            for i in missing[text]:
+                results[i] = translation
+        return results
+
+    def translate(self, text: str, dest_lang: str = 'en', src_lang: str = 'auto') -> str:
+        """Translate a single string; see ``translate_many``."""
+        if not text or not isinstance(text, str):
+            return text
+        return self.translate_many([text], dest_lang, src_lang)[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'backend': self.backend.name,
+                'size': len(self._cache),
+                'maxsize': self.cache_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'backend_calls': self.backend_calls,
+            }
+
+
+_service: Optional[TranslationService] = None
+_service_lock = threading.Lock()
+
+
+def _load_config(config_path: str = "config.json") -> Dict[str, Any]:
+    if config_path and os.path.exists(config_path):
+        with open(config_path, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def get_translation_service() -> TranslationService:
+    """
+    Return the process-wide translation service.
+
+    The backend is chosen by ``translation_backend`` in config.json
+    (``google`` or ``offline``) and the LRU is sized by ``translation_cache_size``.
+    """
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                config = _load_config()
+                backend_name = config.get("translation_backend", DEFAULT_BACKEND)
+                backend_class = BACKENDS.get(backend_name)
+                if backend_class is None:
+                    raise ValueError(f"Unknown translation backend: {backend_name}")
+                _service = TranslationService(
+                    backend_class(),
+                    cache_size=config.get("translation_cache_size", DEFAULT_CACHE_SIZE)
+                )
+    return _service
+
+
+def set_translation_service(service: TranslationService) -> None:
+    """Replace the process-wide service, e.g. with an OfflineBackend in tests."""
+    global _service
+    with _service_lock:
+        _service = service
+
 
 def translate_text(text, dest_lang='en', src_lang='auto'):
     """
-    Translate text to the specified language using Google Translate.
-    
+    Translate text to the specified language using the configured backend.
+
     Args:
         text (str): The text to translate
         dest_lang (str): The target language code (e.g., 'es' for Spanish)
         src_lang (str): The source language code (default: 'auto' for auto-detection)
-        
+
     Returns:
         str: The translated text or original text if translation fails
     """
-    if not text or not isinstance(text, str):
-        return text
-        
-    try:
-        translator = GoogleTranslator(source=src_lang, target=dest_lang)
-        translation = translator.translate(text)
-        return translation
-    except Exception as e:
-        print(f"Translation error: {e}")
-        # Return the original text if translation fails
-        return text
+    return get_translation_service().translate(text, dest_lang, src_lang)
@@ -0,0 +1,209 @@
+# user_stats.py
+
+"""
+Per-user cache of the conversation statistics behind ``/api/stats``.
+
+An entry keeps one row per conversation of the user (title, archive state,
+message count, token sum, last activity and the id of its newest message), so
+the dashboard figures can be derived without touching the database. Message
+inserts are folded into cached entries as they are committed; any other change
+to a user's conversations drops the entry so it is recomputed on next use.
+
+Every change also bumps a per-user generation. A reader takes the generation
+before running its query and the result is only cached if nothing changed in
+the meantime, so a computation that raced with a write is never stored. Only
+the least recently bumped generations are evicted, and an evicted user never
+matches a reader's token, so eviction can only cost a cache fill.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+EXTENSION_KEY = 'user_stats'
+
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_USERS = 1024
+
+RECENT_ACTIVITY_LIMIT = 5
+
+
+def build_stats(conversations: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Turn per-conversation rows into the ``/api/stats`` payload.
+
+    Args:
+        conversations: Conversation id -> dict with ``title``, ``is_archived``,
+            ``message_count``, ``tokens`` and ``last_activity``
+    """
+    total = len(conversations)
+    archived = sum(1 for conv in conversations.values() if conv['is_archived'])
+    recent = sorted(
+        ((conv_id, conv) for conv_id, conv in conversations.items()
+         if not conv['is_archived'] and conv['message_count']),
+        key=lambda item: item[1]['last_activity'],
+        reverse=True
+    )[:RECENT_ACTIVITY_LIMIT]
+
+    return {
+        'total_conversations': total,
+        'active_conversations': total - archived,
+        'archived_conversations': archived,
+        'total_messages': sum(conv['message_count'] for conv in conversations.values()),
+        'total_tokens': sum(conv['tokens'] for conv in conversations.values()),
+        'recent_activity': [{
+            'id': conv_id,
+            'title': conv['title'],
+            'message_count': conv['message_count'],
+            'last_activity': conv['last_activity'].isoformat()
+        } for conv_id, conv in recent]
+    }
+
+
+class UserStatsCache:
+    """
+    LRU cache of per-user conversation statistics.
+
+    Args:
+        ttl: Seconds an entry is trusted before it is recomputed; bounds drift
+            from writes made by other processes
+        max_users: Number of users kept before the least recently used is evicted
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL_SECONDS, max_users: int = DEFAULT_MAX_USERS):
+        self.ttl = ttl
+        self.max_users = max(0, int(max_users))
+        self.hits = 0
+        self.misses = 0
+        self.incremental_updates = 0
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._generations: "OrderedDict[int, int]" = OrderedDict()
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _bump(self, user_id: int) -> int:
+        self._generations[user_id] = generation = next(self._counter)
+        self._generations.move_to_end(user_id)
+        while len(self._generations) > self.max_users * 4:
+            # Evicted users have no generation, which no reader's token matches
+            self._generations.popitem(last=False)
+        return generation
+
+    def generation(self, user_id: int) -> Optional[int]:
+        """Token to pass to ``store`` together with the stats computed after this call."""
+        with self._lock:
+            generation = self._generations.get(user_id)
+            # Never hand out None: it would match again once the user is evicted
+            return generation if generation is not None else self._bump(user_id)
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Return the cached stats payload for ``user_id``, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or time.monotonic() - entry['created_at'] > self.ttl:
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return build_stats(entry['conversations'])
+
+    def store(self, user_id: int, rows: Iterable[Any], generation: Optional[int]) -> Dict[str, Any]:
+        """
+        Cache freshly queried per-conversation rows and return the stats payload.
+
+        Args:
+            user_id: Owner of the conversations
+            rows: Rows with ``id``, ``title``, ``is_archived``, ``message_count``,
+                ``tokens``, ``last_activity`` and ``last_message_id``
+            generation: Value returned by ``generation`` before the query ran
+        """
+        conversations = {
+            row.id: {
+                'title': row.title,
+                'is_archived': bool(row.is_archived),
+                'message_count': row.message_count or 0,
+                'tokens': row.tokens or 0,
+                'last_activity': row.last_activity,
+                'last_message_id': row.last_message_id or 0,
+            }
+            for row in rows
+        }
+        stats = build_stats(conversations)
+        if self.max_users == 0:
+            return stats
+
+        with self._lock:
+            if generation is None or self._generations.get(user_id) != generation:
+                return stats
+            self._entries[user_id] = {'conversations': conversations, 'created_at': time.monotonic()}
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return stats
+
+    def record_messages(self, user_id: int, conversation_id: int, messages: List[Dict[str, Any]]) -> None:
+        """
+        Fold committed messages of one conversation into the user's entry.
+
+        Args:
+            user_id: Owner of the conversation
+            conversation_id: Conversation the messages were added to
+            messages: Saved messages with ``id``, ``tokens`` and ``created_at``
+        """
+        with self._lock:
+            self._bump(user_id)
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            conv = entry['conversations'].get(conversation_id)
+            if conv is None:
+                # Conversation created after the entry was computed
+                del self._entries[user_id]
+                return
+            for message in messages:
+                if message['id'] <= conv['last_message_id']:
+                    continue  # Already counted by the query that built the entry
+                conv['message_count'] += 1
+                conv['tokens'] += message['tokens'] or 0
+                conv['last_message_id'] = message['id']
+                created_at: datetime = message['created_at']
+                if conv['last_activity'] is None or created_at > conv['last_activity']:
+                    conv['last_activity'] = created_at
+            self.incremental_updates += 1
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._bump(user_id)
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            for user_id in list(self._entries):
+                self._bump(user_id)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'users': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'incremental_updates': self.incremental_updates,
+            }
+
+
+def get_user_stats(app=None) -> UserStatsCache:
+    """Return the app's stats cache, creating it from the app config on first use."""
+    if app is None:
+        from flask import current_app
+        app = current_app._get_current_object()
+    cache = app.extensions.get(EXTENSION_KEY)
+    if cache is None:
+        cache = app.extensions.setdefault(EXTENSION_KEY, UserStatsCache(
+            ttl=app.config.get('USER_STATS_CACHE_TTL', DEFAULT_TTL_SECONDS),
+            max_users=app.config.get('USER_STATS_CACHE_SIZE', DEFAULT_MAX_USERS)
+        ))
+    return cache
@@ -0,0 +1,444 @@
+# vector_index.py
+
+import os
+import pickle
+import time
+from typing import Dict, Any, Optional
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+AUTO = "auto"
+
+# How each vector is stored inside the index: float32 ("none"), float16,
+# 8-bit scalar quantization or product quantization codes. ivf_pq is always
+# "pq". Lossy modes re-rank their candidates against vectors.npy.
+COMPRESSIONS = ("none", "fp16", "sq8", "pq")
+_SCALAR_QUANTIZERS = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+# Vector counts at which "auto" moves to the next index type. Below
+# FLAT_MAX_VECTORS exact search is fast enough and needs no training; HNSW
+# gives the best recall/latency trade-off up to HNSW_MAX_VECTORS, after which
+# its graph memory makes compressed IVF-PQ the better choice.
+FLAT_MAX_VECTORS = 10_000
+HNSW_MAX_VECTORS = 1_000_000
+
+# FAISS warns below 39 training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+# Training on more than this many points per centroid adds time, not quality
+MAX_POINTS_PER_CENTROID = 256
+
+VECTORS_FILENAME = "vectors.npy"
+# Written by LangChain's FAISS.save_local
+INDEX_FILENAME = "index.faiss"
+
+DEFAULT_INDEX_PARAMS = {
+    "nlist": None,            # IVF centroids; None = 4 * sqrt(n)
+    "nprobe": 16,             # IVF lists scanned per query
+    "hnsw_m": 32,             # HNSW neighbours per node
+    "ef_construction": 200,   # HNSW build-time beam width
+    "ef_search": 64,          # HNSW query-time beam width
+    "pq_m": None,             # PQ sub-quantizers; None = largest divisor of dim <= dim / 4
+    "pq_bits": 8,             # Bits per PQ code
+    "compression": "none",    # One of COMPRESSIONS
+    "rerank_factor": 4,       # Candidates fetched per result for exact re-ranking
+}
+
+
+def index_params(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Read ``index_<param>`` overrides from config.json on top of the defaults."""
+    params = dict(DEFAULT_INDEX_PARAMS)
+    for key in params:
+        value = config.get(f"index_{key}")
+        if value is not None:
+            params[key] = value
+    return params
+
+
+def choose_index_type(n_vectors: int, index_type: str = AUTO) -> str:
+    """
+    Resolve ``index_type`` for a corpus of ``n_vectors`` vectors.
+
+    Raises:
+        ValueError: If ``index_type`` is not "auto" or one of INDEX_TYPES
+    """
+    if index_type != AUTO:
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES} or '{AUTO}'")
+        return index_type
+    if n_vectors < FLAT_MAX_VECTORS:
+        return "flat"
+    if n_vectors < HNSW_MAX_VECTORS:
+        return "hnsw"
+    return "ivf_pq"
+
+
+def choose_compression(index_type: str, compression: Optional[str] = None) -> str:
+    """
+    Resolve the compression used by an already resolved ``index_type``.
+
+    Raises:
+        ValueError: If ``compression`` is not one of COMPRESSIONS
+    """
+    compression = compression or "none"
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown index compression '{compression}', expected one of {COMPRESSIONS}")
+    return "pq" if index_type == "ivf_pq" else compression
+
+
+def _nlist(n_vectors: int, requested: Optional[int]) -> int:
+    nlist = requested or int(4 * np.sqrt(n_vectors))
+    # Every centroid needs enough training points to be meaningful
+    return max(1, min(nlist, n_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def _pq_m(dim: int, requested: Optional[int]) -> int:
+    if requested:
+        if dim % requested:
+            raise ValueError(f"index_pq_m={requested} must divide the embedding dimension {dim}")
+        return requested
+    return max(m for m in range(1, dim // 4 + 1) if dim % m == 0)
+
+
+def _pq_bits(n_vectors: int, requested: int) -> int:
+    # Each of the 2**bits PQ centroids needs training points too
+    bits = int(requested)
+    while bits > 1 and n_vectors < MIN_POINTS_PER_CENTROID * (1 << bits):
+        bits -= 1
+    return bits
+
+
+def _training_sample(vectors: np.ndarray, nlist: int, seed: int = 1234) -> np.ndarray:
+    # Also used for codec-only training, with the codebook size as ``nlist``
+    limit = nlist * MAX_POINTS_PER_CENTROID
+    if len(vectors) <= limit:
+        return vectors
+    rows = np.random.default_rng(seed).choice(len(vectors), size=limit, replace=False)
+    return vectors[np.sort(rows)]
+
+
+def build_index(vectors: np.ndarray, index_type: str = AUTO,
+                params: Optional[Dict[str, Any]] = None) -> "faiss.Index":
+    """
+    Build and fill a FAISS index of the requested type.
+
+    All types use L2 distance, like the flat index LangChain creates, so
+    scores stay comparable when the type changes. IVF types and compressed
+    storage are trained on a sample of ``vectors`` before they are added;
+    uncompressed flat and HNSW indexes need no training.
+
+    Args:
+        vectors: ``(n, dim)`` float32 matrix, in vector store order
+        index_type: One of INDEX_TYPES, or "auto" to choose by size
+        params: Overrides for DEFAULT_INDEX_PARAMS
+
+    Returns:
+        faiss.Index: The filled index with its search parameters applied
+    """
+    params = {**DEFAULT_INDEX_PARAMS, **(params or {})}
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_vectors, dim = vectors.shape
+    index_type = choose_index_type(n_vectors, index_type)
+    compression = choose_compression(index_type, params["compression"])
+    if compression == "pq":
+        pq_m, pq_bits = _pq_m(dim, params["pq_m"]), _pq_bits(n_vectors, params["pq_bits"])
+    # Scalar quantizers only learn per-dimension ranges; 256 "centroids" worth is plenty
+    codebook = 1 << pq_bits if compression == "pq" else 256
+
+    if index_type == "hnsw":
+        hnsw_m = int(params["hnsw_m"])
+        if compression == "none":
+            index = faiss.IndexHNSWFlat(dim, hnsw_m)
+        elif compression == "pq":
+            index = faiss.IndexHNSWPQ(dim, pq_m, hnsw_m, pq_bits)
+        else:
+            index = faiss.IndexHNSWSQ(dim, _SCALAR_QUANTIZERS[compression], hnsw_m)
+        index.hnsw.efConstruction = int(params["ef_construction"])
+        if compression != "none":
+            index.train(_training_sample(vectors, codebook))
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        nlist = _nlist(n_vectors, params["nlist"])
+        quantizer = faiss.IndexFlatL2(dim)
+        if compression == "none":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        elif compression == "pq":
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_bits)
+        else:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, _SCALAR_QUANTIZERS[compression])
+        # Keep the quantizer alive as long as the index that refers to it
+        index.own_fields = True
+        quantizer.this.disown()
+        index.train(_training_sample(vectors, nlist))
+    elif compression == "none":
+        index = faiss.IndexFlatL2(dim)
+    else:
+        if compression == "pq":
+            index = faiss.IndexPQ(dim, pq_m, pq_bits)
+        else:
+            index = faiss.IndexScalarQuantizer(dim, _SCALAR_QUANTIZERS[compression])
+        index.train(_training_sample(vectors, codebook))
+
+    if n_vectors:
+        index.add(vectors)
+    configure_search(index, params.get("nprobe"), params.get("ef_search"))
+    return index
+
+
+def configure_search(index: "faiss.Index", nprobe: Optional[int] = None,
+                     ef_search: Optional[int] = None) -> None:
+    """Apply query-time parameters; options that do not apply to ``index`` are ignored."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = min(int(nprobe), ivf.nlist)
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None and ef_search:
+        hnsw.efSearch = int(ef_search)
+
+
+def index_type_of(index: "faiss.Index") -> str:
+    """Name the INDEX_TYPES entry a FAISS index corresponds to."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def compression_of(index: "faiss.Index") -> str:
+    """Name the COMPRESSIONS entry describing how ``index`` stores its vectors."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        for name, qtype in _SCALAR_QUANTIZERS.items():
+            if index.sq.qtype == qtype:
+                return name
+    return "none"
+
+
+def index_matches(index: "faiss.Index", index_type: str = AUTO,
+                  params: Optional[Dict[str, Any]] = None) -> bool:
+    """True if ``index`` is what build_index would produce for its size with these settings."""
+    resolved = choose_index_type(index.ntotal, index_type)
+    compression = choose_compression(resolved, (params or DEFAULT_INDEX_PARAMS).get("compression"))
+    return index_type_of(index) == resolved and compression_of(index) == compression
+
+
+def is_exact(index: "faiss.Index") -> bool:
+    """True for a plain flat index, the only kind that can be edited and read back."""
+    return isinstance(faiss.downcast_index(index), faiss.IndexFlat)
+
+
+def is_lossy(index: "faiss.Index") -> bool:
+    """True if ``index`` scores against compressed codes rather than the original vectors."""
+    return compression_of(index) != "none"
+
+
+def exact_vectors(index: "faiss.Index") -> np.ndarray:
+    """Read every vector back out of a flat index, in id order."""
+    if not is_exact(index):
+        raise ValueError("Only flat indexes hold the original vectors; load them from vectors.npy instead")
+    if index.ntotal == 0:
+        return np.empty((0, index.d), dtype=np.float32)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def read_index(folder: str, mmap: bool = False) -> "faiss.Index":
+    """
+    Read the saved FAISS index from ``folder``.
+
+    With ``mmap`` the vectors, codes, graph and inverted lists are mapped
+    in place (``IO_FLAG_MMAP_IFC``; plain ``IO_FLAG_MMAP`` only maps IVF
+    lists) rather than copied into the heap, so processes serving the same
+    file share its pages. IVF-PQ's precomputed distance table is skipped
+    too: it costs nlist * 256 floats per sub-quantizer in every process and
+    searches are no slower without it at our nprobe.
+    """
+    flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY | faiss.IO_FLAG_SKIP_PRECOMPUTE_TABLE if mmap else 0
+    return faiss.read_index(os.path.join(folder, INDEX_FILENAME), flags)
+
+
+def save_vectors(folder: str, vectors: np.ndarray) -> None:
+    """Write the exact vectors next to the index so it can be rebuilt without re-embedding."""
+    path = os.path.join(folder, VECTORS_FILENAME)
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, np.ascontiguousarray(vectors, dtype=np.float32))
+    os.replace(tmp_path, path)
+
+
+def load_vectors(folder: str, mmap: bool = True) -> Optional[np.ndarray]:
+    """Load vectors.npy from ``folder`` (memory-mapped by default), or None if absent."""
+    path = os.path.join(folder, VECTORS_FILENAME)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r" if mmap else None)
+
+
+def use_exact_index(vector_store, vectors: np.ndarray) -> None:
+    """Swap an approximate index for a flat one built from ``vectors`` so it can be edited."""
+    if is_exact(vector_store.index):
+        return
+    if len(vectors) != vector_store.index.ntotal:
+        raise ValueError(f"{VECTORS_FILENAME} holds {len(vectors)} vectors, index has {vector_store.index.ntotal}")
+    vector_store.index = build_index(np.asarray(vectors), "flat")
+
+
+def apply_index_type(vector_store, index_type: str = AUTO, params: Optional[Dict[str, Any]] = None,
+                     vectors: Optional[np.ndarray] = None) -> str:
+    """
+    Rebuild ``vector_store.index`` as ``index_type`` in place.
+
+    The docstore and id mapping are untouched because vectors are re-added
+    in the same order. If the new index is compressed, ``vectors`` are
+    attached to the store for re-ranking; pass a memory-mapped array (see
+    load_vectors) to keep them out of the process heap.
+
+    Args:
+        vector_store: LangChain FAISS store
+        index_type: One of INDEX_TYPES, or "auto"
+        params: Overrides for DEFAULT_INDEX_PARAMS
+        vectors: Exact vectors in store order; read from the index when it is flat
+
+    Returns:
+        str: The index type that was built
+    """
+    params = {**DEFAULT_INDEX_PARAMS, **(params or {})}
+    if vectors is None:
+        vectors = exact_vectors(vector_store.index)
+    resolved = choose_index_type(len(vectors), index_type)
+    if not index_matches(vector_store.index, resolved, params):
+        started = time.perf_counter()
+        vector_store.index = build_index(np.asarray(vectors), resolved, params)
+        print(f"Built {resolved} index ({choose_compression(resolved, params['compression'])} compression) "
+              f"over {len(vectors)} vectors in {time.perf_counter() - started:.2f}s")
+    attach_rerank_vectors(vector_store, vectors, params["rerank_factor"])
+    return resolved
+
+
+def rerank_search(index: "faiss.Index", vectors: np.ndarray, query: np.ndarray, k: int,
+                  rerank_factor: int = DEFAULT_INDEX_PARAMS["rerank_factor"]):
+    """
+    Search ``index`` for ``k * rerank_factor`` candidates and keep the ``k``
+    nearest by exact L2 distance to ``vectors``.
+
+    Only the candidate rows of ``vectors`` are read, so it can be a
+    memory-mapped vectors.npy.
+
+    Returns:
+        tuple: ``(distances, ids)`` arrays of up to ``k`` entries, nearest first
+    """
+    query = np.asarray(query, dtype=np.float32).reshape(1, -1)
+    _, indices = index.search(query, k * max(1, int(rerank_factor)))
+    candidates = np.sort(indices[0][indices[0] >= 0])
+    distances = ((np.asarray(vectors[candidates]) - query) ** 2).sum(axis=1)
+    best = np.argsort(distances, kind="stable")[:k]
+    return distances[best], candidates[best]
+
+
+class _IndexUnpickler(pickle.Unpickler):
+    # index.pkl names the chunk store's module as it was imported when the
+    # index was saved: "chunk_store" from cli.py, "src.chunk_store" inside
+    # the app. Resolve either to the copy this process uses.
+    def find_class(self, module, name):
+        if module.rpartition(".")[2] == "chunk_store":
+            package = __name__.rpartition(".")[0]
+            module = f"{package}.chunk_store" if package else "chunk_store"
+        return super().find_class(module, name)
+
+
+class RerankingFAISS(FAISS):
+    """
+    LangChain FAISS store that re-ranks compressed search results exactly.
+
+    When the index stores lossy codes (see is_lossy) and the original
+    vectors are attached, each search fetches ``k * rerank_factor``
+    candidates from the index, recomputes their L2 distance against the
+    exact vectors and keeps the best ``k``. Only the candidate rows are read,
+    so a memory-mapped vectors.npy stays mostly on disk and in the shared
+    page cache instead of in every worker's heap. Without attached vectors,
+    or with an uncompressed index, it behaves exactly like ``FAISS``.
+
+    ``lexical_index`` is the keyword index over the same chunks (a
+    SqliteChunkStore) that hybrid retrieval searches next to this one.
+    """
+
+    rerank_vectors: Optional[np.ndarray] = None
+    rerank_factor: int = DEFAULT_INDEX_PARAMS["rerank_factor"]
+    lexical_index = None
+
+    def _reranking(self) -> bool:
+        return self.rerank_vectors is not None and self.rerank_factor > 1 and \
+            len(self.rerank_vectors) == self.index.ntotal and is_lossy(self.index)
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, fetch_k=20, **kwargs):
+        if not self._reranking():
+            return super().similarity_search_with_score_by_vector(
+                embedding, k=k, filter=filter, fetch_k=fetch_k, **kwargs
+            )
+
+        vector = np.array([embedding], dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(vector)
+        distances, ids = rerank_search(
+            self.index, self.rerank_vectors, vector[0], k if filter is None else fetch_k, self.rerank_factor
+        )
+
+        filter_func = self._create_filter_func(filter) if filter is not None else None
+        docs = []
+        for distance, i in zip(distances, ids):
+            doc = self.docstore.search(self.index_to_docstore_id[int(i)])
+            if filter_func is None or filter_func(doc.metadata):
+                docs.append((doc, float(distance)))
+
+        score_threshold = kwargs.get("score_threshold")
+        if score_threshold is not None:
+            docs = [(doc, score) for doc, score in docs if score <= score_threshold]
+        return docs[:k]
+
+    @classmethod
+    def load_local(cls, folder_path: str, embeddings, index_name: str = "index",
+                   *, allow_dangerous_deserialization: bool = False, **kwargs) -> "RerankingFAISS":
+        if not allow_dangerous_deserialization:
+            raise ValueError("index.pkl is a pickle; pass allow_dangerous_deserialization=True for trusted folders")
+        index = faiss.read_index(os.path.join(folder_path, index_name + ".faiss"))
+        with open(os.path.join(folder_path, index_name + ".pkl"), 'rb') as f:
+            docstore, index_to_docstore_id = _IndexUnpickler(f).load()
+        return cls(embeddings, index, docstore, index_to_docstore_id, **kwargs)
+
+    def save_local(self, folder_path: str, index_name: str = "index") -> None:
+        # Written under temporary names and swapped in: serving workers map
+        # index.faiss in place, and rewriting it under them is a SIGBUS
+        super().save_local(folder_path, index_name + ".tmp")
+        for extension in (".faiss", ".pkl"):
+            os.replace(os.path.join(folder_path, index_name + ".tmp" + extension),
+                       os.path.join(folder_path, index_name + extension))
+
+
+def empty_store(embeddings, dim: int, docstore) -> RerankingFAISS:
+    """A RerankingFAISS store with an empty flat index that keeps its chunk texts in ``docstore``."""
+    return RerankingFAISS(embeddings, build_index(np.empty((0, dim), dtype=np.float32), "flat"), docstore, {})
+
+
+def attach_rerank_vectors(vector_store, vectors: Optional[np.ndarray],
+                          rerank_factor: int = DEFAULT_INDEX_PARAMS["rerank_factor"]) -> None:
+    """
+    Give a RerankingFAISS store the exact vectors its compressed index was built from.
+
+    Nothing is kept when the index is uncompressed, so the vectors are only
+    referenced when re-ranking actually needs them.
+    """
+    if not isinstance(vector_store, RerankingFAISS):
+        return
+    keep = vectors is not None and is_lossy(vector_store.index)
+    vector_store.rerank_vectors = vectors if keep else None
+    vector_store.rerank_factor = int(rerank_factor or 1)
@@ -1,98 +1,250 @@
 # voice_input.py
 
-import os
-import tempfile
-import json
+import io
+import subprocess
+import threading
+import time
+import wave
+import numpy as np
 import whisper
 from flask import Flask, request, jsonify
+try:
+    from .worker_pool import get_pool, DeadlineExceeded, PoolSaturatedError
+except ImportError:
+    from worker_pool import get_pool, DeadlineExceeded, PoolSaturatedError
+
+# Whisper models expect 16 kHz mono float32 audio
+SAMPLE_RATE = 16000
+
+DEFAULT_TRANSCRIPTION_WORKERS = 1
+DEFAULT_TRANSCRIPTION_QUEUE = 8
+DEFAULT_TRANSCRIPTION_TIMEOUT = 120
+
+
+class AudioDecodeError(ValueError):
+    """Raised when uploaded audio cannot be decoded; the client sent bad input."""
+
+
+def decode_audio(data, sample_rate=SAMPLE_RATE):
+    """
+    Decode an uploaded audio file from memory into a float32 waveform.
+    
+    16-bit PCM WAV files already at ``sample_rate`` are read directly; any
+    other format is piped through ffmpeg via stdin/stdout, so nothing is
+    written to disk.
+    
+    Args:
+        data (bytes): The raw contents of the audio file
+        sample_rate (int): Target sample rate
+    
+    Returns:
+        numpy.ndarray: Mono waveform scaled to [-1, 1]
+    
+    Raises:
+        AudioDecodeError: If ffmpeg cannot decode the data
+    """
+    if data[:4] == b'RIFF' and data[8:12] == b'WAVE':
+        try:
+            with wave.open(io.BytesIO(data)) as wav:
+                if wav.getsampwidth() == 2 and wav.getframerate() == sample_rate:
+                    pcm = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+                    if wav.getnchannels() > 1:
+                        pcm = pcm.reshape(-1, wav.getnchannels()).mean(axis=1)
+                    return pcm.astype(np.float32) / 32768.0
+        except wave.Error:
+            pass  # Compressed or unusual WAV; let ffmpeg handle it
+    
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0",
+        "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate),
+        "pipe:1"
+    ]
+    try:
+        out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise AudioDecodeError(f"Failed to decode audio: {e.stderr.decode(errors='ignore')}") from e
+    return np.frombuffer(out, dtype=np.int16).astype(np.float32) / 32768.0
+
 
 class VoiceProcessor:
-    def __init__(self, model_size="base"):
+    def __init__(self, model_size="base", workers=DEFAULT_TRANSCRIPTION_WORKERS,
+                 max_queue=DEFAULT_TRANSCRIPTION_QUEUE):
         """
         Initialize the voice processor with a Whisper model.
         
+        Transcriptions run on a bounded "transcription" worker pool, so a
+        burst of uploads queues (and eventually gets rejected) instead of
+        running unbounded copies of the model at once.
+        
         Args:
             model_size (str): Size of the Whisper model to use ('tiny', 'base', 'small', 'medium', 'large')
+            workers (int): Transcriptions run at the same time
+            max_queue (int): Transcriptions allowed to wait for a worker
         """
         self.model = None
         self.model_size = model_size
-        
+        self.pool = get_pool("transcription", max_workers=workers, max_queue=max_queue)
+        self.load_seconds = None
+        self.audio_seconds = 0.0
+        self.transcribe_seconds = 0.0
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+    
     def load_model(self):
         """
         Load the Whisper model if not already loaded.
         """
-        if self.model is None:
-            print(f"Loading Whisper {self.model_size} model...")
-            self.model = whisper.load_model(self.model_size)
-            print("Whisper model loaded.")
+        with self._load_lock:
+            if self.model is None:
+                print(f"Loading Whisper {self.model_size} model...")
+                started = time.perf_counter()
+                self.model = whisper.load_model(self.model_size)
+                self.load_seconds = time.perf_counter() - started
+                print(f"Whisper model loaded in {self.load_seconds:.1f}s.")
+        return self.model
+    
+    def preload(self, background=True):
+        """
+        Load the model ahead of the first request.
         
-    def transcribe_audio(self, audio_file_path):
+        Args:
+            background (bool): Load on a daemon thread so startup is not blocked;
+                requests arriving meanwhile wait for the same load
         """
-        Transcribe audio file to text.
+        if background:
+            threading.Thread(target=self.load_model, name="whisper-preload", daemon=True).start()
+        else:
+            self.load_model()
+    
+    def transcribe_array(self, audio):
+        """
+        Transcribe a 16 kHz mono float32 waveform.
         
         Args:
-            audio_file_path (str): Path to the audio file
-            
+            audio (numpy.ndarray): The waveform, e.g. from decode_audio
+        
         Returns:
             str: Transcribed text
         """
-        if self.model is None:
-            self.load_model()
-            
-        try:
-            result = self.model.transcribe(audio_file_path)
-            return result["text"]
-        except Exception as e:
-            print(f"Error transcribing audio: {e}")
-            return ""
+        model = self.load_model()
+        started = time.perf_counter()
+        # fp16 is only supported on GPU; asking for it on CPU just logs a warning
+        result = model.transcribe(audio, fp16=model.device.type != "cpu")
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self.audio_seconds += len(audio) / SAMPLE_RATE
+            self.transcribe_seconds += elapsed
+        return result["text"].strip()
+    
+    def transcribe_audio(self, audio):
+        """
+        Transcribe audio to text.
+        
+        Args:
+            audio (str or bytes): Path to an audio file, or its raw contents
+        
+        Returns:
+            str: Transcribed text, empty if no speech was recognized
+        
+        Raises:
+            AudioDecodeError: If the audio cannot be decoded
+        """
+        if isinstance(audio, (bytes, bytearray)):
+            audio = decode_audio(bytes(audio))
+        else:
+            try:
+                audio = whisper.load_audio(audio)
+            except RuntimeError as e:
+                # whisper reports ffmpeg failures as RuntimeError
+                raise AudioDecodeError(str(e)) from e
+        return self.transcribe_array(audio)
+    
+    def transcribe(self, audio, timeout=DEFAULT_TRANSCRIPTION_TIMEOUT):
+        """
+        Transcribe on the worker pool and wait for the result.
+        
+        Raises:
+            AudioDecodeError: If the audio cannot be decoded
+            PoolSaturatedError: If too many transcriptions are already queued
+            DeadlineExceeded: If the transcription does not finish within ``timeout``
+        """
+        return self.pool.run(self.transcribe_audio, audio, timeout=timeout)
+    
+    def stats(self):
+        with self._stats_lock:
+            rtf = self.transcribe_seconds / self.audio_seconds if self.audio_seconds else None
+            return {
+                'model': self.model_size,
+                'loaded': self.model is not None,
+                'load_seconds': self.load_seconds,
+                'audio_seconds': round(self.audio_seconds, 2),
+                'real_time_factor': rtf,
+                'pool': self.pool.stats()
+            }
 
 def setup_voice_routes(app, chatbot):
     """
     Set up Flask routes for voice input processing.
     
+    Reads WHISPER_MODEL, WHISPER_PRELOAD, TRANSCRIPTION_WORKERS,
+    TRANSCRIPTION_QUEUE_SIZE and TRANSCRIPTION_TIMEOUT from the app config.
+    
     Args:
         app (Flask): Flask application
         chatbot: Chatbot instance to process transcribed text
     """
-    voice_processor = VoiceProcessor()
+    voice_processor = VoiceProcessor(
+        model_size=app.config.get('WHISPER_MODEL', 'base'),
+        workers=app.config.get('TRANSCRIPTION_WORKERS', DEFAULT_TRANSCRIPTION_WORKERS),
+        max_queue=app.config.get('TRANSCRIPTION_QUEUE_SIZE', DEFAULT_TRANSCRIPTION_QUEUE)
+    )
+    if app.config.get('WHISPER_PRELOAD', False):
+        voice_processor.preload()
+    timeout = app.config.get('TRANSCRIPTION_TIMEOUT', DEFAULT_TRANSCRIPTION_TIMEOUT)
     
     @app.route('/api/voice', methods=['POST'])
     def process_voice():
         if 'audio' not in request.files:
             return jsonify({'error': 'No audio file provided'}), 400
-            
-        audio_file = request.files['audio']
         
-        # Save the uploaded audio file to a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_audio:
-            audio_file.save(temp_audio.name)
-            temp_audio_path = temp_audio.name
-            
+        # Decoded straight from memory; the upload never touches the disk
+        audio_data = request.files['audio'].read()
+        if not audio_data:
+            return jsonify({'error': 'Empty audio file'}), 400
+        
         try:
             # Transcribe the audio
-            transcribed_text = voice_processor.transcribe_audio(temp_audio_path)
+            transcribed_text = voice_processor.transcribe(audio_data, timeout=timeout)
             
             if not transcribed_text:
-                return jsonify({'error': 'Failed to transcribe audio'}), 500
-                
-            # Process the transcribed text with the chatbot
-            answer = chatbot.ask_question(transcribed_text)
-            suggestions = chatbot.get_smart_suggestions(transcribed_text, answer)
+                return jsonify({'error': 'No speech recognized in the audio'}), 400
             
-            # Clean up the temporary file
-            os.unlink(temp_audio_path)
+            # Process the transcribed text with the chatbot
+            documents = []
+            answer = chatbot.ask_question(transcribed_text, documents=documents)
+            suggestions = chatbot.get_smart_suggestions(transcribed_text, answer, documents=documents)
             
             return jsonify({
                 'transcription': transcribed_text,
                 'answer': answer,
                 'suggestions': suggestions
             })
-            
+        
+        except AudioDecodeError as e:
+            return jsonify({'error': str(e)}), 400
+        except PoolSaturatedError:
+            return jsonify({'error': 'Too many voice requests, please try again shortly'}), 503
+        except DeadlineExceeded:
+            return jsonify({'error': 'Transcription timed out'}), 504
         except Exception as e:
-            # Clean up the temporary file in case of error
-            if os.path.exists(temp_audio_path):
-                os.unlink(temp_audio_path)
             return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/voice/stats', methods=['GET'])
+    def voice_stats():
+        return jsonify(voice_processor.stats())
+    
+    return voice_processor
 
 if __name__ == "__main__":
     # For testing purposes
@@ -101,7 +253,7 @@ if __name__ == "__main__":
     class DummyChatbot:
         def ask_question(self, question):
             return f"Answer to: {question}"
-            
+        
         def get_smart_suggestions(self, question, answer):
             return ["Tell me more", "How does this work?", "Can you explain further?"]
     
@@ -109,4 +261,3 @@ if __name__ == "__main__":
     setup_voice_routes(app, dummy_chatbot)
     
     app.run(debug=True)
-
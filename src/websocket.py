@@ -8,6 +8,7 @@ from datetime import datetime
 import logging
 import json
 import time
+from .worker_pool import PoolSaturatedError
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -50,7 +51,7 @@ def setup_websocket(app, chatbot):
         if not current_user.is_authenticated:
             logger.warning("Unauthenticated WebSocket connection attempt")
             return False
-            
+        
         user_id = current_user.get_id()
         active_users[user_id] = {
             'sid': request.sid,
@@ -94,7 +95,8 @@ def setup_websocket(app, chatbot):
             return
         
         # Verify user has access to this conversation
-        from .models import Conversation
+        from .models import Conversation, Message
+        from .pagination import paginate
         conversation = Conversation.query.get(conversation_id)
         if not conversation or (conversation.user_id != user_id and not current_user.is_admin):
             emit('error', {'message': 'Access denied to this conversation'})
@@ -111,19 +113,27 @@ def setup_websocket(app, chatbot):
         
         logger.info(f"User {user_id} joined conversation {conversation_id}")
         
-        # Load conversation history
+        # Load only the most recent messages; clients backfill older ones with
+        # request_conversation_history and the returned cursor
+        recent, next_cursor = paginate(
+            conversation.messages.order_by(None),
+            (Message.created_at, Message.id),
+            current_app.config.get('CHAT_HISTORY_LIMIT', 20)
+        )
         messages = [{
             'id': msg.id,
             'content': msg.content,
             'is_user': msg.is_user,
             'timestamp': msg.created_at.isoformat(),
             'language': msg.language or 'en'
-        } for msg in conversation.messages.order_by(Message.created_at.asc()).all()]
+        } for msg in reversed(recent)]  # Oldest first
         
         emit('conversation_joined', {
             'conversation_id': conversation_id,
             'title': conversation.title,
             'messages': messages,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
             'participants': [{
                 'id': user_id,
                 'username': current_user.username,
@@ -176,13 +186,14 @@ def setup_websocket(app, chatbot):
         if not conversation_id:
             emit('error', {'message': 'No conversation_id provided'})
             return
-            
+        
         if not message:
             emit('error', {'message': 'Message cannot be empty'})
             return
         
         # Verify user has access to this conversation
-        from .models import Conversation, Message, db
+        from .models import Conversation
+        from .message_writer import save_message
         conversation = Conversation.query.get(conversation_id)
         if not conversation or (conversation.user_id != user_id and not current_user.is_admin):
             emit('error', {'message': 'Access denied to this conversation'})
@@ -194,22 +205,12 @@ def setup_websocket(app, chatbot):
             active_users[user_id]['last_active'] = datetime.utcnow()
         
         try:
-            # Save user message to database
-            user_msg = Message(
-                conversation_id=conversation_id,
-                content=message,
-                is_user=True,
-                language=language
-            )
-            db.session.add(user_msg)
-            
-            # Update conversation's updated_at timestamp
-            conversation.updated_at = datetime.utcnow()
-            db.session.commit()
+            # Save user message to database (also updates the conversation's updated_at)
+            user_msg = save_message(conversation_id, message, is_user=True, language=language)
             
             # Emit the user message to the conversation room
             message_data = {
-                'id': user_msg.id,
+                'id': user_msg['id'],
                 'conversation_id': conversation_id,
                 'sender': 'user',
                 'user_id': user_id,
@@ -217,7 +218,7 @@ def setup_websocket(app, chatbot):
                 'content': message,
                 'is_user': True,
                 'language': language,
-                'timestamp': user_msg.created_at.isoformat(),
+                'timestamp': user_msg['created_at'],
                 'status': 'delivered'
             }
             
@@ -235,29 +236,23 @@ def setup_websocket(app, chatbot):
                     )
                     
                     # Save bot response to database
-                    bot_msg = Message(
-                        conversation_id=conversation_id,
-                        content=bot_response,
-                        is_user=False,
-                        language=language
-                    )
-                    db.session.add(bot_msg)
-                    db.session.commit()
+                    with app.app_context():
+                        bot_msg = save_message(conversation_id, bot_response, is_user=False, language=language)
                     
                     # Emit the bot response to the conversation room
                     bot_message_data = {
-                        'id': bot_msg.id,
+                        'id': bot_msg['id'],
                         'conversation_id': conversation_id,
                         'sender': 'bot',
                         'content': bot_response,
                         'is_user': False,
                         'language': language,
-                        'timestamp': bot_msg.created_at.isoformat(),
+                        'timestamp': bot_msg['created_at'],
                         'status': 'delivered'
                     }
                     
                     socketio.emit('message', bot_message_data, room=conversation_id)
-                    
+                
                 except Exception as e:
                     logger.error(f"Error processing bot response: {str(e)}")
                     socketio.emit('error', {
@@ -267,14 +262,14 @@ def setup_websocket(app, chatbot):
             
             # Process bot response in background
             socketio.start_background_task(process_bot_response)
-            
+        
         except Exception as e:
             logger.error(f"Error processing message: {str(e)}")
             emit('error', {
                 'message': 'Error processing your message',
                 'details': str(e)
             }, room=request.sid)
-            
+    
     @socketio.on('typing')
     @authenticated_only
     def handle_typing(data):
@@ -300,7 +295,15 @@ def setup_websocket(app, chatbot):
     @socketio.on('ask')
     @authenticated_only
     def handle_ask(data):
-        """Handle direct questions to the chatbot."""
+        """
+        Handle direct questions to the chatbot.
+        
+        With ``stream: true`` the answer is also sent incrementally as
+        ``ask_token`` events before the final ``ask_response``. If the
+        streamed answer turns out to be out of scope, an ``ask_replace``
+        event carrying the text that is stored follows the tokens; clients
+        replace what they rendered from ``ask_token`` with it.
+        """
         try:
             user_id = current_user.get_id()
             question = data.get('question', '').strip()
@@ -315,6 +318,7 @@ def setup_websocket(app, chatbot):
             
             # Create a new conversation if none exists
             from .models import Conversation, Message, db
+            from .message_writer import save_message
             
             try:
                 if not conversation_id:
@@ -324,7 +328,8 @@ def setup_websocket(app, chatbot):
                         title=f"Chat {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}"
                     )
                     db.session.add(conversation)
-                    db.session.flush()  # Get the conversation ID
+                    # Commit right away so the message writer's connection can see it
+                    db.session.commit()
                     conversation_id = conversation.id
                     logger.info(f"Created new conversation: {conversation_id}")
                 else:
@@ -335,140 +340,136 @@ def setup_websocket(app, chatbot):
                     logger.info(f"Using existing conversation: {conversation_id}")
                 
                 # Save user question
-                user_msg = Message(
-                    conversation_id=conversation_id,
-                    content=question,
-                    is_user=True,
-                    language=language
-                )
-                db.session.add(user_msg)
-                db.session.commit()
+                save_message(conversation_id, question, is_user=True, language=language)
+                
+                stream = bool(data.get('stream', False))
+                sid = request.sid
+                
+                def stream_response(conversation_history):
+                    # Forward each piece of the answer as it is generated; the
+                    # complete text is only stored once generation has finished.
+                    parts = []
+                    for index, token in enumerate(chatbot.stream_answer(
+                        question=question,
+                        language=language,
+                        conversation_history=conversation_history
+                    )):
+                        parts.append(token)
+                        socketio.emit('ask_token', {
+                            'conversation_id': conversation_id,
+                            'token': token,
+                            'index': index
+                        }, room=sid)
+                    
+                    bot_response = "".join(parts)
+                    if chatbot.is_out_of_scope(bot_response):
+                        bot_response = chatbot.OUT_OF_SCOPE_ANSWER
+                        socketio.emit('ask_replace', {
+                            'conversation_id': conversation_id,
+                            'response': bot_response
+                        }, room=sid)
+                    return bot_response
                 
                 # Process the question with the chatbot in a background task
                 def process_question():
-                    import time
                     start_time = time.time()
                     
-                    try:
-                        logger.info(f"[DEBUG] Starting to process question in conversation {conversation_id}")
-                        
-                        # Log the input parameters
-                        logger.info(f"[DEBUG] Question: {question}")
-                        logger.info(f"[DEBUG] User ID: {user_id}")
-                        logger.info(f"[DEBUG] Language: {language}")
-                        
-                        # Get conversation history for context
-                        from .models import Message
+                    with app.app_context():
                         try:
-                            history_messages = Message.query.filter_by(
-                                conversation_id=conversation_id,
-                                is_user=True
-                            ).order_by(Message.created_at.desc()).limit(5).all()
-                            logger.info(f"[DEBUG] Retrieved {len(history_messages)} history messages")
+                            logger.info(f"[DEBUG] Starting to process question in conversation {conversation_id}")
                             
-                            # Format conversation history
-                            conversation_history = [
-                                {
-                                    'content': msg.content,
-                                    'is_user': msg.is_user,
-                                    'created_at': msg.created_at.isoformat()
-                                }
-                                for msg in reversed(history_messages)  # Oldest first
-                            ]
-                        except Exception as e:
-                            logger.error(f"[ERROR] Error getting conversation history: {str(e)}", exc_info=True)
-                            conversation_history = []
-                        
-                        # Get response from chatbot with timeout
-                        from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
-                        
-                        def get_chatbot_response():
-                            return chatbot.ask_question(
-                                question=question,
-                                language=language,
-                                conversation_history=conversation_history
-                            )
-                        
-                        # Run with timeout
-                        with ThreadPoolExecutor(max_workers=1) as executor:
-                            future = executor.submit(get_chatbot_response)
+                            # Log the input parameters
+                            logger.info(f"[DEBUG] Question: {question}")
+                            logger.info(f"[DEBUG] User ID: {user_id}")
+                            logger.info(f"[DEBUG] Language: {language}")
+                            logger.info(f"[DEBUG] Streaming: {stream}")
+                            
+                            # Get conversation history for context
                             try:
-                                bot_response = future.result(timeout=45)  # 45 second timeout
-                                logger.info(f"[DEBUG] Successfully got bot response in {time.time() - start_time:.2f} seconds")
-                                
-                                if not bot_response:
-                                    logger.warning("[WARNING] Empty response from chatbot.get_response")
-                                    bot_response = "I'm sorry, I couldn't generate a response. Please try again."
-                                
-                                return bot_response
-                                
-                            except FutureTimeoutError:
-                                error_msg = "The request timed out. Please try again with a different question."
-                                logger.error(f"[ERROR] {error_msg}")
-                                return error_msg
+                                history_messages = Message.query.filter_by(
+                                    conversation_id=conversation_id,
+                                    is_user=True
+                                ).order_by(Message.created_at.desc()).limit(5).all()
+                                logger.info(f"[DEBUG] Retrieved {len(history_messages)} history messages")
                                 
+                                # Format conversation history
+                                conversation_history = [
+                                    {
+                                        'content': msg.content,
+                                        'is_user': msg.is_user,
+                                        'created_at': msg.created_at.isoformat()
+                                    }
+                                    for msg in reversed(history_messages)  # Oldest first
+                                ]
                             except Exception as e:
-                                error_msg = f"Error getting response from chatbot: {str(e)}"
-                                logger.error(f"[ERROR] {error_msg}", exc_info=True)
-                                return error_msg
+                                logger.error(f"[ERROR] Error getting conversation history: {str(e)}", exc_info=True)
+                                conversation_history = []
+                            
+                            if stream:
+                                # Streaming holds an LLM pool worker for the whole generation;
+                                # it gets the same llm_timeout deadline as ask_question
+                                try:
+                                    bot_response = chatbot.llm_pool.run(
+                                        stream_response, conversation_history, timeout=chatbot.answer_timeout
+                                    )
+                                except TimeoutError:
+                                    bot_response = "The request timed out. Please try again with a different question."
+                                    logger.error(f"[ERROR] {bot_response}")
+                                except PoolSaturatedError:
+                                    logger.error("[ERROR] LLM pool is saturated, rejecting question")
+                                    bot_response = chatbot.BUSY_ANSWER
+                            else:
+                                # ask_question runs on the shared LLM pool with its own deadline
+                                bot_response = chatbot.ask_question(
+                                    question=question,
+                                    language=language,
+                                    conversation_history=conversation_history
+                                )
+                            logger.info(f"[DEBUG] Got bot response in {time.time() - start_time:.2f} seconds")
+                            
+                            if not bot_response:
+                                logger.warning("[WARNING] Empty response from chatbot")
+                                bot_response = "I'm sorry, I couldn't generate a response. Please try again."
                         
-                    except Exception as e:
-                        error_msg = f"Unexpected error in process_question: {str(e)}"
-                        logger.error(f"[CRITICAL] {error_msg}", exc_info=True)
-                        return error_msg
+                        except Exception as e:
+                            bot_response = f"Unexpected error in process_question: {str(e)}"
+                            logger.error(f"[CRITICAL] {bot_response}", exc_info=True)
                         
-                        logger.info(f"[DEBUG] Bot response length: {len(bot_response) if bot_response else 0} characters")
+                        logger.info(f"[DEBUG] Bot response length: {len(bot_response)} characters")
                         
                         # Save bot response
                         logger.info("[DEBUG] Saving bot response to database...")
-                        with current_app.app_context():
-                            try:
-                                bot_msg = Message(
-                                    conversation_id=conversation_id,
-                                    content=bot_response,
-                                    is_user=False,
-                                    language=language
-                                )
-                                db.session.add(bot_msg)
-                                db.session.commit()
-                                logger.info("[DEBUG] Successfully saved bot response to database")
-                                
-                                # Emit the response
-                                response_data = {
-                                    'conversation_id': conversation_id,
-                                    'response': bot_response,
-                                    'timestamp': datetime.utcnow().isoformat()
-                                }
-                                logger.info(f"[DEBUG] Sending ask_response event with data: {response_data}")
-                                
-                                socketio.emit('ask_response', 
-                                    response_data,
-                                    room=request.sid,
-                                    callback=lambda: logger.info("[DEBUG] ask_response event emitted successfully")
-                                )
-                                logger.info("[DEBUG] ask_response event sent")
-                                
-                                
-                            except Exception as e:
-                                logger.error(f"Error in process_question db operations: {str(e)}")
-                                socketio.emit('error', {
-                                    'message': 'Error saving bot response',
-                                    'details': str(e)
-                                }, room=request.sid)
+                        try:
+                            bot_msg = save_message(conversation_id, bot_response, is_user=False, language=language)
+                            logger.info("[DEBUG] Successfully saved bot response to database")
+                            
+                            # Emit the response
+                            response_data = {
+                                'conversation_id': conversation_id,
+                                'message_id': bot_msg['id'],
+                                'response': bot_response,
+                                'streamed': stream,
+                                'timestamp': datetime.utcnow().isoformat()
+                            }
+                            logger.info(f"[DEBUG] Sending ask_response event with data: {response_data}")
+                            
+                            socketio.emit('ask_response', response_data, room=sid)
+                            logger.info("[DEBUG] ask_response event sent")
                         
-                    except Exception as e:
-                        logger.error(f"Error processing question: {str(e)}", exc_info=True)
-                        socketio.emit('error', {
-                            'message': 'Error processing your question',
-                            'details': str(e)
-                        }, room=request.sid)
+                        except Exception as e:
+                            db.session.rollback()
+                            logger.error(f"Error in process_question db operations: {str(e)}")
+                            socketio.emit('error', {
+                                'message': 'Error saving bot response',
+                                'details': str(e)
+                            }, room=sid)
                 
                 # Process in background
                 socketio.start_background_task(process_question)
                 
                 # Return the conversation ID to the client
                 return {'status': 'processing', 'conversation_id': conversation_id}
-                
+            
             except Exception as e:
                 logger.error(f"Error in handle_ask (inner): {str(e)}", exc_info=True)
                 emit('error', {
@@ -476,7 +477,7 @@ def setup_websocket(app, chatbot):
                     'details': str(e)
                 }, room=request.sid)
                 return {'status': 'error', 'message': str(e)}
-                
+        
         except Exception as e:
             logger.error(f"Error in handle_ask (outer): {str(e)}", exc_info=True)
             emit('error', {
@@ -518,23 +519,29 @@ def setup_websocket(app, chatbot):
         """Handle request for conversation history."""
         conversation_id = data.get('conversation_id')
         limit = min(int(data.get('limit', 50)), 100)  # Max 100 messages
+        cursor = data.get('cursor')  # next_cursor from the previous page, for older messages
         
         if not conversation_id:
             emit('error', {'message': 'No conversation_id provided'})
             return
         
         from .models import Conversation, Message
+        from .pagination import paginate, InvalidCursor
         conversation = Conversation.query.get(conversation_id)
         
         if not conversation or conversation.user_id != current_user.id:
             emit('error', {'message': 'Access denied to this conversation'})
             return
         
-        # Get messages with pagination
-        messages = Message.query.filter_by(conversation_id=conversation_id)\
-            .order_by(Message.created_at.desc())\
-            .limit(limit)\
-            .all()
+        # Get messages with keyset pagination, newest first
+        try:
+            messages, next_cursor = paginate(
+                Message.query.filter_by(conversation_id=conversation_id),
+                (Message.created_at, Message.id), limit, cursor
+            )
+        except InvalidCursor as e:
+            emit('error', {'message': str(e)})
+            return
         
         # Format messages
         formatted_messages = [{
@@ -549,7 +556,8 @@ def setup_websocket(app, chatbot):
         emit('conversation_history', {
             'conversation_id': conversation_id,
             'messages': formatted_messages,
-            'has_more': len(messages) >= limit
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
         })
     
     @socketio.on('disconnect')
@@ -590,10 +598,25 @@ def create_test_app():
         return User(user_id)
     
     # Dummy chatbot for testing
+    from .worker_pool import get_pool
+    
     class DummyChatbot:
+        BUSY_ANSWER = "I'm sorry, I'm handling too many questions right now. Please try again in a moment."
+        OUT_OF_SCOPE_ANSWER = "Sorry, I couldn't find relevant information in the documents."
+        answer_timeout = 30
+        llm_pool = get_pool("llm")
+        
         def ask_question(self, question, language='en', conversation_history=None):
             return f"Answer to: {question} (Language: {language})"
-            
+        
+        def stream_answer(self, question, language='en', conversation_history=None):
+            for word in self.ask_question(question, language, conversation_history).split(' '):
+                yield word + ' '
+        
+        @staticmethod
+        def is_out_of_scope(answer):
+            return not answer
+        
         def get_smart_suggestions(self, previous_question, context, language='en'):
             return [
                 f"Tell me more about {previous_question.split()[0]} (Language: {language})",
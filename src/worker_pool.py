@@ -0,0 +1,198 @@
+# worker_pool.py
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_QUEUE = 16
+
+_pools: Dict[str, "BoundedWorkerPool"] = {}
+_pools_lock = threading.Lock()
+_task_state = threading.local()
+
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when a pool already has ``max_workers + max_queue`` tasks outstanding."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a task does not finish, or start, before its deadline."""
+
+
+def cancelled() -> bool:
+    """
+    True if the task running on the current pool thread has been cancelled.
+
+    Long-running tasks (e.g. token streaming) should check this between steps
+    and stop early; it is always False outside a pool thread.
+    """
+    event = getattr(_task_state, "cancel_event", None)
+    return event is not None and event.is_set()
+
+
+class BoundedWorkerPool:
+    """
+    Thread pool with a hard cap on queued work, per-task deadlines and metrics.
+
+    At most ``max_workers`` tasks run at once and at most ``max_queue`` more
+    wait for a thread; further submissions fail fast with PoolSaturatedError
+    instead of piling up. A task whose deadline passes while it is still
+    queued is never started, and a timed-out running task is asked to stop
+    through ``cancelled()``.
+    """
+
+    def __init__(self, name: str, max_workers: int = DEFAULT_MAX_WORKERS,
+                 max_queue: int = DEFAULT_MAX_QUEUE):
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._counters = {
+            'submitted': 0,
+            'rejected': 0,
+            'completed': 0,
+            'failed': 0,
+            'timed_out': 0,
+            'cancelled': 0,
+        }
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+        self._started = 0
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+    def submit(self, fn: Callable[..., Any], *args, deadline: Optional[float] = None, **kwargs) -> Future:
+        """
+        Queue ``fn(*args, **kwargs)`` and return its Future.
+
+        Args:
+            fn: Callable to run on a pool thread
+            deadline: Optional ``time.monotonic()`` value after which the task
+                is not started
+
+        Returns:
+            Future: Resolves to the task's result; it carries a ``cancel_event``
+            that ``cancel()`` sets
+
+        Raises:
+            PoolSaturatedError: If the pool and its queue are full
+        """
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise PoolSaturatedError(f"{self.name} pool is saturated")
+
+        enqueued_at = time.monotonic()
+        cancel_event = threading.Event()
+
+        def run():
+            started_at = time.monotonic()
+            wait = started_at - enqueued_at
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._started += 1
+                self._queue_wait_total += wait
+                self._queue_wait_max = max(self._queue_wait_max, wait)
+            try:
+                if cancel_event.is_set():
+                    raise DeadlineExceeded(f"{self.name} task cancelled before it started")
+                if deadline is not None and started_at >= deadline:
+                    raise DeadlineExceeded(f"{self.name} task deadline passed after {wait:.1f}s in the queue")
+                _task_state.cancel_event = cancel_event
+                return fn(*args, **kwargs)
+            finally:
+                _task_state.cancel_event = None
+                with self._lock:
+                    self._running -= 1
+
+        def done(future: Future) -> None:
+            self._slots.release()
+            if future.cancelled():
+                with self._lock:
+                    self._queued -= 1
+                    self._counters['cancelled'] += 1
+            elif future.exception() is not None:
+                self._count('failed')
+            else:
+                self._count('completed')
+
+        with self._lock:
+            self._queued += 1
+            self._counters['submitted'] += 1
+        future = self._executor.submit(run)
+        future.cancel_event = cancel_event
+        future.add_done_callback(done)
+        return future
+
+    def cancel(self, future: Future) -> None:
+        """Cancel a queued task, or ask a running one to stop at its next check."""
+        future.cancel_event.set()
+        future.cancel()
+
+    def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run ``fn`` on the pool and wait for its result.
+
+        Args:
+            fn: Callable to run on a pool thread
+            timeout: Seconds allowed for queueing and running together
+
+        Raises:
+            PoolSaturatedError: If the pool and its queue are full
+            DeadlineExceeded: If the task did not finish within ``timeout``
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        future = self.submit(fn, *args, deadline=deadline, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self.cancel(future)
+            self._count('timed_out')
+            raise DeadlineExceeded(f"{self.name} task did not finish within {timeout}s")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'running': self._running,
+                'queued': self._queued,
+                **self._counters,
+                'queue_wait_avg': self._queue_wait_total / self._started if self._started else 0.0,
+                'queue_wait_max': self._queue_wait_max,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def get_pool(name: str, max_workers: int = DEFAULT_MAX_WORKERS,
+             max_queue: int = DEFAULT_MAX_QUEUE) -> BoundedWorkerPool:
+    """
+    Return the process-wide pool called ``name``, creating it on first use.
+
+    The sizes only apply when the pool is created; later callers share it.
+    """
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                pool = BoundedWorkerPool(name, max_workers, max_queue)
+                _pools[name] = pool
+    return pool
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Report the metrics of every pool created in this process."""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {name: pool.stats() for name, pool in pools}